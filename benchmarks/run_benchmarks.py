@@ -0,0 +1,312 @@
+"""
+Benchmarks for the recommendation API on synthetic graphs.
+
+For every size a seeded graph is generated (see synthetic_graph.py) and a
+fresh worker process measures:
+  - load: CSV load, snapshot compile, snapshot load and full API startup time
+  - memory: peak RSS after loading and at the end of the run
+  - function: latency percentiles and throughput of the scoring functions
+  - asgi: the same for /recommend/, /hotels/{id} and /experiences/ through the
+    ASGI app (requires httpx); non-2xx responses are counted per status code
+    under 'errors' and left out of the latencies
+
+Results are written as JSON together with the git commit, so runs from two
+commits can be compared with --compare.
+
+Usage:
+    python run_benchmarks.py --sizes 1000,10000,100000 --output results.json
+    python run_benchmarks.py --sizes 1000000 --requests 100
+    python run_benchmarks.py --compare old.json new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+REPO_PATH = os.path.join(BENCH_PATH, '..')
+API_PATH = os.path.join(REPO_PATH, 'review_analyzer')
+
+DEFAULT_SIZES = '1000,10000,100000'
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def latency_summary(latencies, elapsed):
+    """Percentiles in milliseconds and throughput in requests per second"""
+    if not len(latencies):
+        return {'requests': 0}
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p90_ms': float(np.percentile(latencies, 90)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(latencies.max()),
+        'throughput_rps': len(latencies) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def timed_calls(fn, calls):
+    latencies = []
+    started = time.perf_counter()
+    for args in calls:
+        call_started = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - call_started)
+    return latency_summary(latencies, time.perf_counter() - started)
+
+
+async def timed_requests(send, calls, concurrency):
+    """
+    Run send(*args) -> response for every call with at most `concurrency` in flight.
+    Only successful responses are timed; the others are counted per status code.
+    """
+    latencies = []
+    errors = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(args):
+        async with semaphore:
+            call_started = time.perf_counter()
+            response = await send(*args)
+            elapsed = time.perf_counter() - call_started
+        # A broken endpoint answers fast; timing its errors would look like a speedup
+        if response.is_success:
+            latencies.append(elapsed)
+        else:
+            errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(args) for args in calls))
+    summary = latency_summary(latencies, time.perf_counter() - started)
+    summary['errors'] = dict(sorted(errors.items()))
+    return summary
+
+
+def make_requests(api, count, seed):
+    """Random preference sets; half personalized, a third location-filtered"""
+    rng = random.Random(seed)
+    state = api.graph_state
+    model = state.collaborative_model
+    experience_ids = list(state.index.experience_by_id)
+    location_ids = list(state.index.location_by_id)
+    emails = [state.G.nodes[user].get('email') for user in model.users
+              if model.user_row[user] < model.stayed.shape[0]]
+    requests = []
+    for _ in range(count):
+        preferences = [(exp_id, rng.randint(1, 5))
+                       for exp_id in rng.sample(experience_ids, rng.randint(1, min(4, len(experience_ids))))]
+        email = rng.choice(emails) if emails and rng.random() < 0.5 else None
+        location_id = rng.choice(location_ids) if rng.random() < 0.33 else None
+        requests.append((preferences, email, location_id))
+    return requests
+
+
+def run_worker(data_path, request_count, concurrency, seed):
+    """Measure one graph; runs in its own process so peak memory is per size"""
+    sys.path.insert(0, API_PATH)
+    from graph_loader import load_graph
+    from graph_snapshot import compile_snapshot, load_snapshot
+
+    result = {'load': {}, 'memory': {}}
+    started = time.perf_counter()
+    G, _ = load_graph(data_path, verbose=False)
+    result['load']['csv_seconds'] = time.perf_counter() - started
+    result['graph'] = {'nodes': G.number_of_nodes(), 'edges': G.number_of_edges()}
+
+    snapshot_path = tempfile.mkdtemp(prefix='graph_snapshot_')
+    started = time.perf_counter()
+    compile_snapshot(data_path, snapshot_path, G)
+    result['load']['snapshot_compile_seconds'] = time.perf_counter() - started
+    del G
+
+    started = time.perf_counter()
+    snapshot = load_snapshot(snapshot_path, data_path)
+    G = snapshot.to_graph()
+    snapshot.to_index(G)
+    result['load']['snapshot_load_seconds'] = time.perf_counter() - started
+    del G, snapshot
+
+    # Full API startup from the snapshot: graph, index, collaborative matrices and PageRank
+    os.environ['GRAPH_DATA_PATH'] = data_path
+    os.environ['GRAPH_SNAPSHOT_PATH'] = snapshot_path
+    os.environ.setdefault('SCORING_QUEUE_DEPTH', str(max(concurrency * 2, 32)))
+    started = time.perf_counter()
+    import api
+    result['load']['api_startup_seconds'] = time.perf_counter() - started
+    result['memory']['after_load_mb'] = peak_rss_mb()
+
+    requests = make_requests(api, request_count, seed)
+    G, index, pagerank_store, collaborative_model, experience_pagerank, hotel_features = api.graph_state
+    hotel_ids = list(index.hotel_by_id)
+    rng = random.Random(seed)
+    hotel_calls = [(rng.choice(hotel_ids),) for _ in range(request_count)]
+
+    result['function'] = {
+        'recommend_hotels_for_experiences': timed_calls(
+            lambda prefs, email, location_id: api.recommend_hotels_for_experiences(
+                G, prefs, email, location_id,
+                pagerank_store=pagerank_store,
+                index=index,
+                collaborative_model=collaborative_model,
+                experience_pagerank=experience_pagerank if api.use_personalized_pagerank else None,
+                hotel_features=hotel_features
+            ),
+            requests
+        ),
+        'score_recommendations': timed_calls(api.score_recommendations, requests),
+        'collaborative_scores': timed_calls(
+            lambda prefs, email, location_id: api.RecommendationContext(
+                G, pagerank_store, index, collaborative_model, hotel_features=hotel_features
+            ).collaborative_scores(email, index.nodes_by_type['Hotel']),
+            [request for request in requests if request[1]] or requests[:1]
+        ),
+    }
+
+    try:
+        import httpx
+    except ImportError:
+        result['asgi'] = {'skipped': 'httpx is not installed'}
+    else:
+        result['asgi'] = asyncio.run(run_asgi(api, httpx, requests, hotel_calls, concurrency))
+        result['asgi']['cache'] = api.recommendation_cache.stats()
+
+    result['memory']['peak_mb'] = peak_rss_mb()
+    return result
+
+
+async def run_asgi(api, httpx, requests, hotel_calls, concurrency):
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+        async def recommend(prefs, email, location_id):
+            body = {'experience_preferences': [
+                {'experience_id': exp_id, 'importance': importance} for exp_id, importance in prefs
+            ]}
+            if email:
+                body['user_email'] = email
+            if location_id:
+                body['location_id'] = location_id
+            return await client.post('/recommend/', json=body)
+
+        async def hotel(hotel_id):
+            return await client.get(f'/hotels/{hotel_id}')
+
+        async def experiences():
+            return await client.get('/experiences/')
+
+        return {
+            '/recommend/': await timed_requests(recommend, requests, concurrency),
+            '/hotels/{id}': await timed_requests(hotel, hotel_calls, concurrency),
+            '/experiences/': await timed_requests(experiences, [()] * len(hotel_calls), concurrency),
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_PATH, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_size(size, args):
+    from synthetic_graph import generate_graph_csvs, is_generated
+
+    data_path = os.path.join(args.workdir, f'graph_{size}_{args.seed}')
+    if not is_generated(data_path, size, args.seed):
+        started = time.perf_counter()
+        generate_graph_csvs(data_path, size, args.seed)
+        print(f"Generated {size} users/hotels in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', data_path,
+         '--requests', str(args.requests), '--concurrency', str(args.concurrency), '--seed', str(args.seed)],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        return {'size': size, 'error': completed.stderr.strip().splitlines()[-1:]}
+    # The API prints load messages, the result is the last line
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['size'] = size
+    return result
+
+
+def compare(old_path, new_path):
+    """Print the relative change of every numeric metric between two result files"""
+    with open(old_path, encoding='utf-8') as f:
+        old = {r['size']: r for r in json.load(f)['results']}
+    with open(new_path, encoding='utf-8') as f:
+        new = {r['size']: r for r in json.load(f)['results']}
+
+    def flatten(value, prefix=''):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                yield from flatten(item, f'{prefix}{key}.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield prefix[:-1], value
+
+    for size in sorted(set(old) & set(new)):
+        old_metrics = dict(flatten(old[size]))
+        for name, value in flatten(new[size]):
+            if name in old_metrics and old_metrics[name] and name != 'size':
+                change = (value - old_metrics[name]) / old_metrics[name] * 100
+                print(f"{size:>8} {name:<70} {old_metrics[name]:>12.3f} -> {value:>12.3f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation API on synthetic graphs")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="comma separated user/hotel counts")
+    parser.add_argument('--requests', type=int, default=200, help="requests per measured endpoint")
+    parser.add_argument('--concurrency', type=int, default=8, help="in-flight ASGI requests")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'recommender_benchmarks'))
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--worker', metavar='DATA_PATH', help=argparse.SUPPRESS)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.requests, args.concurrency, args.seed)))
+        return
+
+    sys.path.insert(0, BENCH_PATH)
+    results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        print(f"Benchmarking size {size}", file=sys.stderr)
+        results.append(run_size(size, args))
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Recall/latency trade-off of the MinHash/LSH similar-user index.
+
+Compares the top-k similar users found through SimilarUserIndex with the exact
+scan over every user, for a few (num_perm, band_rows) settings, on a synthetic
+graph (see synthetic_graph.py).
+
+Usage: python similar_users_recall.py --size 100000 --configs 8x1,16x1,24x1
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import numpy as np
+
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_PATH, '..', 'review_analyzer'))
+
+from synthetic_graph import generate_graph_csvs, is_generated
+from graph_loader import load_graph
+from graph_index import GraphIndex
+from collaborative import CollaborativeModel
+
+
+def user_history(model, row):
+    """Same history get_user_history() builds: stay ratings, no liked experiences"""
+    ratings, _, _ = model._matrices()
+    start, end = ratings.indptr[row], ratings.indptr[row + 1]
+    return {model.hotels[col]: rating for col, rating in zip(ratings.indices[start:end], ratings.data[start:end])}
+
+
+def measure(model, queries, k):
+    latencies, results = [], []
+    for history in queries:
+        started = time.perf_counter()
+        rows, _ = model.top_similar_users(history, set(), k=k)
+        latencies.append(time.perf_counter() - started)
+        results.append(set(rows.tolist()))
+    return np.asarray(latencies) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure LSH similar-user recall against the exact scan")
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--configs', default='8x1,16x1,24x1,32x2', help="num_perm x band_rows settings")
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'recommender_benchmarks'))
+    args = parser.parse_args()
+
+    data_path = os.path.join(args.workdir, f'graph_{args.size}_{args.seed}')
+    if not is_generated(data_path, args.size, args.seed):
+        generate_graph_csvs(data_path, args.size, args.seed)
+    G, _ = load_graph(data_path, verbose=False)
+    model = CollaborativeModel.from_graph(G, GraphIndex.from_graph(G))
+    del G
+
+    rng = random.Random(args.seed)
+    rows = [row for row in rng.sample(range(len(model.users)), min(args.queries * 2, len(model.users)))
+            if model.stayed[row].nnz][:args.queries]
+    queries = [user_history(model, row) for row in rows]
+
+    exact_ms, exact = measure(model, queries, args.k)
+    print(f"{'index':<10} {'build s':>8} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p95 ms':>8} {'candidates':>11}")
+    print(f"{'exact':<10} {'':>8} {1.0:>9.3f} {np.percentile(exact_ms, 50):>8.2f} "
+          f"{np.percentile(exact_ms, 95):>8.2f} {len(model.users):>11}")
+
+    for config in args.configs.split(','):
+        num_perm, band_rows = (int(value) for value in config.split('x'))
+        started = time.perf_counter()
+        index = model.build_similar_user_index(num_perm=num_perm, band_rows=band_rows)
+        build_seconds = time.perf_counter() - started
+        lsh_ms, found = measure(model, queries, args.k)
+        hits = sum(len(a & b) for a, b in zip(exact, found))
+        total = sum(len(a) for a in exact)
+        candidates = np.mean([len(index.candidates(list(2 * model.hotel_col[h] for h in history)))
+                              for history in queries])
+        print(f"{config:<10} {build_seconds:>8.2f} {hits / max(total, 1):>9.3f} "
+              f"{np.percentile(lsh_ms, 50):>8.2f} {np.percentile(lsh_ms, 95):>8.2f} {candidates:>11.0f}")
+        model.similar_user_index = None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Seeded generator for graph_nodes_edges-shaped CSV files.
+
+Writes the same eight files, columns and encoding the API loads, with
+`size` users and `size` hotels. Hotel popularity follows a power law so
+users share stays and collaborative filtering has neighbours to find.
+
+Usage: python synthetic_graph.py <output_dir> [--size 10000] [--seed 42]
+"""
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+
+ENCODING = 'iso-8859-9'
+
+# Id ranges of the exported graph, so synthetic ids look like the real ones
+HOTEL_ID_BASE = 1970324837383878
+EXPERIENCE_ID_BASE = 3377699720527893
+LOCATION_ID_BASE = 1125899907247362
+USER_ID_BASE = 3659174697238678
+
+EXPERIENCE_COUNT = 20
+
+
+def _write(df, output_dir, filename):
+    df.to_csv(os.path.join(output_dir, filename), index=False, encoding=ENCODING)
+
+
+def _unique_pairs(sources, targets, *columns):
+    """Drop repeated (source, target) pairs, keeping the first one"""
+    _, first = np.unique(np.stack([sources, targets]), axis=1, return_index=True)
+    first.sort()
+    return (sources[first], targets[first]) + tuple(column[first] for column in columns)
+
+
+def generate_graph_csvs(output_dir, size, seed=42):
+    """Write a synthetic graph with `size` users and `size` hotels to output_dir"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+
+    hotel_count = user_count = size
+    location_count = max(20, size // 50)
+
+    hotel_ids = HOTEL_ID_BASE + np.arange(hotel_count)
+    experience_ids = EXPERIENCE_ID_BASE + np.arange(EXPERIENCE_COUNT)
+    location_ids = LOCATION_ID_BASE + np.arange(location_count)
+    user_ids = USER_ID_BASE + np.arange(user_count)
+
+    hotel_numbers = np.arange(hotel_count)
+    _write(pd.DataFrame({
+        'id': hotel_ids,
+        'name': [f'Hotel {i}' for i in hotel_numbers],
+        'rating': np.round(rng.uniform(6.0, 9.9, hotel_count), 1),
+        'hotel_id': hotel_numbers + 1,
+    }), output_dir, 'hotel_nodes_2.csv')
+    _write(pd.DataFrame({
+        'id': hotel_ids,
+        'name': [f'Hotel {i}' for i in hotel_numbers],
+        'rating': np.round(rng.uniform(6.0, 9.9, hotel_count), 1),
+    }), output_dir, 'hotel_nodes.csv')
+    _write(pd.DataFrame({
+        'id': experience_ids,
+        'name': [f'Experience {i}' for i in range(EXPERIENCE_COUNT)],
+        'description': [f'Synthetic experience {i}' for i in range(EXPERIENCE_COUNT)],
+        'experience_id': np.arange(EXPERIENCE_COUNT) + 1,
+    }), output_dir, 'experience_nodes.csv')
+    _write(pd.DataFrame({
+        'id': location_ids,
+        'name': [f'Location {i}' for i in range(location_count)],
+        'location_id': np.arange(location_count) + 1,
+    }), output_dir, 'location_nodes.csv')
+    _write(pd.DataFrame({
+        'id': user_ids,
+        'name': [f'USER {i}' for i in range(user_count)],
+        'email': [f'user{i}@example.com' for i in range(user_count)],
+    }), output_dir, 'user_nodes.csv')
+
+    # Every hotel offers 1-4 experiences and sits in one location
+    per_hotel = rng.integers(1, 5, hotel_count)
+    sources = np.repeat(hotel_ids, per_hotel)
+    targets = rng.choice(experience_ids, len(sources))
+    ratings = np.round(rng.uniform(4.0, 10.0, len(sources)), 1)
+    sources, targets, ratings = _unique_pairs(sources, targets, ratings)
+    _write(pd.DataFrame({'source': sources, 'target': targets, 'rating': ratings}),
+           output_dir, 'has_experience_edges.csv')
+    _write(pd.DataFrame({'source': hotel_ids, 'target': rng.choice(location_ids, hotel_count)}),
+           output_dir, 'located_in_edges.csv')
+
+    # Users stay at 1-3 hotels drawn from a power-law popularity and like 0-3 experiences
+    popularity = 1.0 / np.arange(1, hotel_count + 1) ** 0.8
+    popularity /= popularity.sum()
+    per_user = rng.integers(1, 4, user_count)
+    sources = np.repeat(user_ids, per_user)
+    targets = rng.choice(hotel_ids, len(sources), p=popularity)
+    ratings = rng.integers(1, 11, len(sources))
+    sources, targets, ratings = _unique_pairs(sources, targets, ratings)
+    _write(pd.DataFrame({'source': sources, 'target': targets, 'rating': ratings}),
+           output_dir, 'stayed_at_edges.csv')
+
+    per_user = rng.integers(0, 4, user_count)
+    sources = np.repeat(user_ids, per_user)
+    targets = rng.choice(experience_ids, len(sources))
+    sources, targets = _unique_pairs(sources, targets)
+    _write(pd.DataFrame({'source': sources, 'target': targets}), output_dir, 'likes_edges.csv')
+
+    with open(os.path.join(output_dir, 'synthetic.json'), 'w', encoding='utf-8') as f:
+        json.dump({'size': size, 'seed': seed, 'locations': location_count,
+                   'experiences': EXPERIENCE_COUNT}, f)
+    return output_dir
+
+
+def is_generated(output_dir, size, seed):
+    """True when output_dir already holds the graph for this size and seed"""
+    try:
+        with open(os.path.join(output_dir, 'synthetic.json'), encoding='utf-8') as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return info.get('size') == size and info.get('seed') == seed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic graph CSV files")
+    parser.add_argument('output_dir')
+    parser.add_argument('--size', type=int, default=10000, help="number of users and of hotels")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    generate_graph_csvs(args.output_dir, args.size, args.seed)
+    print(f"Synthetic graph with {args.size} users/hotels written to {args.output_dir}")
@@ -1,13 +1,30 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, conint
 from typing import List, Tuple
-import networkx as nx
-import pandas as pd
 import os
+import time
 import numpy as np
 from collections import defaultdict
+from datetime import date
 from decimal import Decimal
+from graph_loader import load_graph
+from graph_snapshot import load_snapshot, compile_snapshot
+from shared_graph import GraphState, SnapshotWatcher, attach_shared_graph, open_shared_graph
+from pagerank_store import PageRankStore, graph_version
+from graph_index import GraphIndex
+from collaborative import CollaborativeModel
+from personalized_pagerank import ExperiencePageRank
+from hotel_features import HotelFeatures, top_k_order
+from result_cache import ResultCache
+from graph_writer import GraphLock, GraphWriter, graph_reading
+from scoring_pool import ScoringPool, ScoringPoolBusy, ScoringTimeout
+from metrics import MetricsRegistry, StageTimer
+from search_index import SearchIndex
+from review_store import ReviewStore
+from hotel_matching import link_hotels
 
 app = FastAPI(title="Hotel Recommendation API")
 
@@ -20,49 +37,105 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Metrics exposed on /metrics
+metrics = MetricsRegistry()
+request_latency = metrics.histogram(
+    'http_request_duration_seconds', 'Handler latency', ['handler', 'method', 'status'])
+stage_latency = metrics.histogram(
+    'recommender_stage_duration_seconds', 'Latency of each recommendation stage', ['stage'])
+candidate_hotels_total = metrics.counter(
+    'recommender_candidate_hotels_total', 'Candidate hotels scored')
+similar_users_total = metrics.counter(
+    'recommender_similar_users_total', 'Similar users used for collaborative scores')
+graph_load_seconds = metrics.gauge(
+    'graph_load_seconds', 'Time spent building each startup structure', ['structure'])
+graph_size = metrics.gauge('graph_size', 'Nodes and edges in the graph', ['kind'])
+cache_stat = metrics.gauge('recommendation_cache', 'Recommendation result cache statistics', ['stat'])
+pool_stat = metrics.gauge('scoring_pool', 'Scoring pool statistics', ['stat'])
+
+# SIMILAR_USER_INDEX=lsh finds similar users through MinHash/LSH instead of scanning every user
+similar_user_index = os.environ.get('SIMILAR_USER_INDEX', 'exact').lower()
+
+def build_similar_user_index(collaborative_model):
+    if similar_user_index != 'lsh':
+        return
+    build_started = time.perf_counter()
+    collaborative_model.build_similar_user_index(
+        num_perm=int(os.environ.get('LSH_NUM_PERM', 24)),
+        band_rows=int(os.environ.get('LSH_BAND_ROWS', 1))
+    )
+    graph_load_seconds.set(time.perf_counter() - build_started, structure='similar_user_index')
+
 # Load data once at startup
 try:
-    # Create an empty graph
-    G = nx.Graph()
-    
     # Fix data file paths
     base_path = os.path.dirname(os.path.abspath(__file__))
-    data_path = os.path.join(base_path, '..', 'graph_nodes_edges')
+    data_path = os.environ.get('GRAPH_DATA_PATH', os.path.join(base_path, '..', 'graph_nodes_edges'))
+    snapshot_path = os.environ.get('GRAPH_SNAPSHOT_PATH', os.path.join(base_path, '..', 'graph_snapshot'))
+    # With GRAPH_SHARED=1 every worker maps the same read-only snapshot instead of building its own graph
+    shared_graph = os.environ.get('GRAPH_SHARED', '').lower() in ('1', 'true', 'yes')
+    # Rank by importance-weighted personalized PageRank of the requested experiences instead of global PageRank
+    use_personalized_pagerank = os.environ.get('PERSONALIZED_PAGERANK', '').lower() in ('1', 'true', 'yes')
     
-    # Load all nodes
-    node_types = {
-        'Hotel': ('hotel_nodes_2.csv', 'hotel_id'),
-        'Experience': ('experience_nodes.csv', 'experience_id'),
-        'Location': ('location_nodes.csv', 'location_id'),
-        'User': ('user_nodes.csv', None)
-    }
+    load_started = time.perf_counter()
+    if shared_graph:
+        shared_snapshot_path, graph_state = attach_shared_graph(snapshot_path, data_path)
+        graph_load_seconds.set(time.perf_counter() - load_started, structure='shared')
+        build_similar_user_index(graph_state.collaborative_model)
+    else:
+        # Prefer the compiled binary snapshot; fall back to the CSVs if it is missing or stale
+        snapshot = load_snapshot(snapshot_path, data_path)
+        if snapshot is not None:
+            G = snapshot.to_graph()
+            G.graph['version'] = 0
+            # Id/email lookups and hotel relations come precomputed with the snapshot
+            graph_index = snapshot.to_index(G)
+            experience_pagerank = snapshot.to_experience_pagerank()
+        else:
+            # Load all nodes and edges in bulk
+            G, load_stats = load_graph(data_path)
+            G.graph['version'] = 0
+            # Id/email lookups and hotel relations, so endpoints never scan the graph
+            graph_index = GraphIndex.from_graph(G)
+        graph_load_seconds.set(time.perf_counter() - load_started,
+                               structure='snapshot' if snapshot is not None else 'csv')
 
-    for node_type, (filename, id_field) in node_types.items():
-        df = pd.read_csv(os.path.join(data_path, filename), encoding='iso-8859-9')
-        for _, row in df.iterrows():
-            node_data = {'type': node_type}
-            for col in df.columns:
-                if pd.notna(row[col]):
-                    node_data[col] = row[col]
-            G.add_node(row['id'], **node_data)
-
-    # Load all edges
-    edge_types = {
-        'has_experience': 'has_experience_edges.csv',
-        'likes': 'likes_edges.csv',
-        'located_in': 'located_in_edges.csv',
-        'stayed_at': 'stayed_at_edges.csv'
-    }
+        # Rating/like matrices for collaborative filtering
+        build_started = time.perf_counter()
+        collaborative_model = CollaborativeModel.from_graph(G, graph_index)
+        graph_load_seconds.set(time.perf_counter() - build_started, structure='collaborative')
+        build_similar_user_index(collaborative_model)
 
-    for edge_type, filename in edge_types.items():
-        edge_df = pd.read_csv(os.path.join(data_path, filename), encoding='iso-8859-9')
-        for _, row in edge_df.iterrows():
-            G.add_edge(
-                row['source'],
-                row['target'],
-                relationship_type=edge_type.upper(),
-                rating=row.get('rating', 0)
-            )
+        # Scoring threads and the PageRank refresh read G under this lock, GraphWriter writes under it
+        graph_lock = GraphLock()
+
+        # Weighted PageRank is computed once here and reused by every request
+        build_started = time.perf_counter()
+        pagerank_store = PageRankStore(G, graph_lock=graph_lock)
+        graph_load_seconds.set(time.perf_counter() - build_started, structure='pagerank')
+
+        if snapshot is None:
+            # Normally computed offline with the snapshot
+            build_started = time.perf_counter()
+            experience_pagerank = ExperiencePageRank.from_graph(G, graph_index)
+            graph_load_seconds.set(time.perf_counter() - build_started, structure='personalized_pagerank')
+            try:
+                compile_snapshot(data_path, snapshot_path, G, graph_index,
+                                 pagerank_scores=pagerank_store.current()[0],
+                                 collaborative_model=collaborative_model,
+                                 experience_pagerank=experience_pagerank)
+            except OSError as e:
+                # A read-only deployment can still serve from the CSVs
+                print(f"Snapshot write error: {str(e)}")
+
+        # Hotel x experience ratings and per-hotel arrays for vectorized scoring
+        build_started = time.perf_counter()
+        hotel_features = HotelFeatures.from_graph(G, graph_index)
+        graph_load_seconds.set(time.perf_counter() - build_started, structure='hotel_features')
+
+        # Requests read the graph through this one tuple, so a reload swaps it atomically
+        graph_state = GraphState(G, graph_index, pagerank_store, collaborative_model, experience_pagerank,
+                                 hotel_features)
 
 except Exception as e:
     print(f"Data loading error: {str(e)}")
@@ -77,6 +150,7 @@ class RecommendationRequest(BaseModel):
     experience_preferences: List[ExperiencePreference]
     user_email: str = None
     location_id: int = None  # Optional location filter
+    limit: conint(gt=0) = None  # Only the best `limit` hotels
 
 class ExperienceRating(BaseModel):
     rating: float
@@ -98,8 +172,129 @@ class HotelRecommendation(BaseModel):
             float: lambda v: round(v, 2)
         }
 
+class NewUser(BaseModel):
+    name: str
+    email: str
+
+class NewHotel(BaseModel):
+    hotel_id: int
+    name: str
+    rating: float = 0
+    location_id: int = None
+
+class StayedAtEdge(BaseModel):
+    user_email: str
+    hotel_id: int
+    rating: float
+
+class LikesEdge(BaseModel):
+    user_email: str
+    experience_id: int
+
+class HasExperienceEdge(BaseModel):
+    experience_id: int
+    rating: float
+
+class BatchRecommendationResult(BaseModel):
+    status_code: int
+    recommendations: List[HotelRecommendation] = None
+    error: str = None
+
+# Upper bound on the number of preference sets in one /recommend/batch call
+MAX_BATCH_SIZE = 1000
+
+# Formatted results of anonymous /recommend/ calls, dropped when the graph changes
+recommendation_cache = ResultCache(
+    maxsize=int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('RECOMMENDATION_CACHE_TTL', 300))
+)
+
+# Scoring runs on this pool so a slow request never blocks the event loop
+scoring_pool = ScoringPool(
+    kind=os.environ.get('SCORING_POOL', 'thread'),
+    max_workers=int(os.environ.get('SCORING_WORKERS', 4)),
+    max_queue=int(os.environ.get('SCORING_QUEUE_DEPTH', 32)),
+    timeout=float(os.environ.get('SCORING_TIMEOUT', 10))
+)
+
+def on_graph_change(version):
+    recommendation_cache.invalidate()
+    # Forked scoring processes hold a copy of the old graph
+    scoring_pool.restart()
+
+if shared_graph:
+    def swap_graph_state(path):
+        """Attach to a newly compiled snapshot and swap it in for all following requests"""
+        global graph_state
+        version = graph_version(graph_state.G) + 1
+        state = open_shared_graph(path, version)
+        build_similar_user_index(state.collaborative_model)
+        graph_state = state
+        on_graph_change(version)
+        print(f"Switched to graph snapshot {path}")
+
+    # Shared snapshots are read-only; new data arrives by compiling a new snapshot
+    graph_writer = None
+    snapshot_watcher = SnapshotWatcher(
+        snapshot_path, shared_snapshot_path, swap_graph_state,
+        interval=float(os.environ.get('GRAPH_RELOAD_INTERVAL', 5))
+    )
+    snapshot_watcher.start()
+else:
+    # Incremental writes keep the index, collaborative matrices, hotel features and PageRank in sync.
+    # Accepted writes go to a log that every worker replays, at startup and then every few seconds
+    graph_writer = GraphWriter(
+        G, graph_index, pagerank_store, collaborative_model,
+        hotel_features=hotel_features,
+        on_change=on_graph_change,
+        log_path=os.environ.get('GRAPH_WRITE_LOG', os.path.join(base_path, '..', 'graph_writes.jsonl')),
+        flush_interval=float(os.environ.get('GRAPH_WRITE_FLUSH_INTERVAL', 0.5)),
+        lock=graph_lock
+    )
+    replayed = graph_writer.replay()
+    graph_writer.flush()
+    if replayed:
+        print(f"Replayed {replayed} graph writes")
+    graph_writer.follow(interval=float(os.environ.get('GRAPH_WRITE_POLL_INTERVAL', 1)))
+
+# Forked scoring processes work on their own copy of the graph and need no lock
+scoring_graph_lock = graph_writer.lock if graph_writer is not None and scoring_pool.kind == 'thread' else None
+
+def service_unavailable(e):
+    return HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '1'})
+
+def debug_timing_requested(request):
+    return request.headers.get('x-debug-timing', '').lower() in ('1', 'true', 'yes')
+
+def record_timer(timer):
+    """Feed one request's stage timings and counts into the metrics"""
+    for stage, seconds in timer.stages.items():
+        stage_latency.observe(seconds, stage=stage)
+    candidate_hotels_total.inc(timer.counts.get('candidate_hotels', 0))
+    similar_users_total.inc(timer.counts.get('similar_users', 0))
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+
+    endpoint = request.scope.get('endpoint')
+    request_latency.observe(
+        elapsed,
+        handler=endpoint.__name__ if endpoint is not None else 'unmatched',
+        method=request.method,
+        status=response.status_code
+    )
+    if debug_timing_requested(request):
+        total = f"total;dur={elapsed * 1000:.3f}"
+        stages = response.headers.get('server-timing')
+        response.headers['Server-Timing'] = f"{stages}, {total}" if stages else total
+    return response
+
 @app.get("/")
 async def root():
+    G = graph_state.G
     return {
         "message": "Welcome to Hotel Recommendation API",
         "status": "active",
@@ -108,114 +303,410 @@ async def root():
     }
 
 @app.post("/recommend/", response_model=List[HotelRecommendation])
-async def recommend_hotels(request: RecommendationRequest):
+async def recommend_hotels(request: RecommendationRequest, http_request: Request, response: Response):
+    timer = StageTimer()
     try:
         experience_preferences = [
             (pref.experience_id, pref.importance) 
             for pref in request.experience_preferences
         ]
         
+        async def compute():
+            recommendations, stage_timer = await scoring_pool.run(
+                score_recommendations,
+                experience_preferences,
+                request.user_email,
+                request.location_id,
+                request.limit
+            )
+            timer.merge(stage_timer)
+            record_timer(stage_timer)
+            
+            if isinstance(recommendations, str):
+                raise HTTPException(status_code=404, detail=recommendations)
+            
+            return recommendations
+        
+        # Personalized results depend on the user's history, so only anonymous calls are cached
+        if request.user_email:
+            recommendations = await compute()
+        else:
+            cache_key = recommendation_cache_key(experience_preferences, request.location_id, request.limit)
+            recommendations = await recommendation_cache.get_or_compute(
+                cache_key, graph_version(graph_state.G), compute
+            )
+        
+        if debug_timing_requested(http_request):
+            # Cache hits and coalesced calls have no stages of their own
+            response.headers['Server-Timing'] = timer.server_timing() or 'cache;desc="hit"'
+        return recommendations
+
+    except (ScoringPoolBusy, ScoringTimeout) as e:
+        raise service_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/recommend/batch", response_model=List[BatchRecommendationResult])
+async def recommend_hotels_batch(requests: List[RecommendationRequest], http_request: Request,
+                                 response: Response):
+    """Score many preference sets at once; results come back in request order"""
+    if len(requests) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large, at most {MAX_BATCH_SIZE} requests are allowed"
+        )
+
+    batch = [
+        (
+            [(pref.experience_id, pref.importance) for pref in request.experience_preferences],
+            request.user_email,
+            request.location_id,
+            request.limit
+        )
+        for request in requests
+    ]
+
+    # The whole batch is one job on the scoring pool
+    try:
+        results, stage_timers = await scoring_pool.run(score_batch, batch)
+    except (ScoringPoolBusy, ScoringTimeout) as e:
+        raise service_unavailable(e)
+
+    batch_timer = StageTimer()
+    for stage_timer in stage_timers:
+        record_timer(stage_timer)
+        batch_timer.merge(stage_timer)
+    if debug_timing_requested(http_request):
+        response.headers['Server-Timing'] = batch_timer.server_timing()
+    return results
+
+def score_recommendations(experience_preferences, user_email, location_id, limit=None):
+    """Score and format one request; runs on the scoring pool. Returns (result, StageTimer)"""
+    G, graph_index, pagerank_store, collaborative_model, experience_pagerank, hotel_features = graph_state
+    # Writes wait until scoring is done instead of changing the graph under it
+    with graph_reading(scoring_graph_lock):
+        timer = StageTimer()
         recommendations = recommend_hotels_for_experiences(
             G, 
             experience_preferences, 
-            request.user_email,
-            request.location_id
+            user_email,
+            location_id,
+            pagerank_store=pagerank_store,
+            index=graph_index,
+            collaborative_model=collaborative_model,
+            experience_pagerank=experience_pagerank if use_personalized_pagerank else None,
+            hotel_features=hotel_features,
+            limit=limit,
+            timer=timer
         )
-        
+    
+        # Not-found messages are passed back as strings and turned into a 404 by the handler
         if isinstance(recommendations, str):
-            raise HTTPException(status_code=404, detail=recommendations)
-        
-        # Find the highest pagerank score
-        max_pagerank = max(hotel['pagerank_score'] for hotel in recommendations)
+            return recommendations, timer
+    
+        with timer.stage('format'):
+            formatted_recommendations = format_recommendations(recommendations, G, graph_index)
+        return formatted_recommendations, timer
+
+def score_batch(batch):
+    """
+    Score a list of (experience_preferences, user_email, location_id, limit); runs on the scoring pool.
+    Returns (results, [StageTimer per request])
+    """
+    # PageRank, user histories and similar users are resolved once for the whole batch
+    G, graph_index, pagerank_store, collaborative_model, experience_pagerank, hotel_features = graph_state
+    # Writes wait until scoring is done instead of changing the graph under it
+    with graph_reading(scoring_graph_lock):
+        shared_timer = StageTimer()
+        with shared_timer.stage('pagerank'):
+            context = RecommendationContext(
+                G, pagerank_store, graph_index, collaborative_model,
+                experience_pagerank if use_personalized_pagerank else None,
+                hotel_features
+            )
+
+        results = []
+        timers = [shared_timer]
+        for experience_preferences, user_email, location_id, limit in batch:
+            timer = StageTimer()
+            timers.append(timer)
+            try:
+                recommendations = recommend_hotels_for_experiences(
+                    G,
+                    experience_preferences,
+                    user_email,
+                    location_id,
+                    context=context,
+                    limit=limit,
+                    timer=timer
+                )
+                if isinstance(recommendations, str):
+                    results.append(BatchRecommendationResult(status_code=404, error=recommendations))
+                else:
+                    with timer.stage('format'):
+                        formatted_recommendations = format_recommendations(recommendations, G, graph_index)
+                    results.append(BatchRecommendationResult(
+                        status_code=200,
+                        recommendations=formatted_recommendations
+                    ))
+            except Exception as e:
+                results.append(BatchRecommendationResult(status_code=500, error=str(e)))
+
+        return results, timers
+
+def apply_graph_write(method, *args):
+    """Run a GraphWriter method and map its errors to HTTP responses"""
+    if graph_writer is None:
+        raise HTTPException(
+            status_code=409,
+            detail="Graph is served read-only from a shared snapshot; compile a new snapshot to change it"
+        )
+    try:
+        return getattr(graph_writer, method)(*args)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/users/", status_code=201)
+async def create_user(user: NewUser):
+    """Add a new User node"""
+    node, version = await run_in_threadpool(apply_graph_write, 'add_user', user.name, user.email)
+    return {'node_id': node, 'graph_version': version}
+
+@app.post("/hotels/", status_code=201)
+async def create_hotel(hotel: NewHotel):
+    """Add a new Hotel node, optionally LOCATED_IN an existing location"""
+    node, version = await run_in_threadpool(
+        apply_graph_write,
+        'add_hotel', hotel.hotel_id, hotel.name, hotel.rating, hotel.location_id
+    )
+    return {'node_id': node, 'graph_version': version}
+
+@app.post("/stays/")
+async def add_stay(stay: StayedAtEdge):
+    """Add or update a user's STAYED_AT rating for a hotel"""
+    version = await run_in_threadpool(apply_graph_write, 'add_stay', stay.user_email, stay.hotel_id, stay.rating)
+    return {'graph_version': version}
+
+@app.post("/likes/")
+async def add_like(like: LikesEdge):
+    """Add a LIKES edge between a user and an experience"""
+    version = await run_in_threadpool(apply_graph_write, 'add_like', like.user_email, like.experience_id)
+    return {'graph_version': version}
+
+@app.post("/hotels/{hotel_id}/experiences")
+async def add_hotel_experience(hotel_id: int, experience: HasExperienceEdge):
+    """Add or update a hotel's HAS_EXPERIENCE rating"""
+    version = await run_in_threadpool(
+        apply_graph_write,
+        'add_hotel_experience', hotel_id, experience.experience_id, experience.rating
+    )
+    return {'graph_version': version}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text-format metrics for this worker"""
+    G = graph_state.G
+    graph_size.set(G.number_of_nodes(), kind='nodes')
+    graph_size.set(G.number_of_edges(), kind='edges')
+    for stat, value in recommendation_cache.stats().items():
+        cache_stat.set(value, stat=stat)
+    for stat, value in scoring_pool.stats().items():
+        if stat != 'kind':
+            pool_stat.set(value, stat=stat)
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss statistics of the recommendation result cache"""
+    return recommendation_cache.stats()
+
+def recommendation_cache_key(experience_preferences, location_id, limit=None):
+    """Cache key that ignores the order of the experience preferences"""
+    exp_ids = [exp_id for exp_id, _ in experience_preferences]
+    if len(set(exp_ids)) == len(exp_ids):
+        # With a repeated experience the first importance wins, so order matters there
+        experience_preferences = sorted(experience_preferences)
+    return (tuple(experience_preferences), location_id or None, limit)
+
+def format_recommendations(recommendations, G, graph_index):
+    """Convert scored hotels into HotelRecommendation responses"""
+    formatted_recommendations = []
+    for hotel in recommendations:
+        hotel_node = hotel['node_id']
         
-        # Format results
-        formatted_recommendations = []
-        for hotel in recommendations:
-            hotel_node = hotel['node_id']
-            
-            # Find the location the hotel is connected to
-            location_name = ''
-            for neighbor in G.neighbors(hotel_node):
-                if (G.nodes[neighbor].get('type') == 'Location' and 
-                    G[hotel_node][neighbor].get('relationship_type') == 'LOCATED_IN'):
-                    location_name = G.nodes[neighbor].get('name', '')
-                    break
-            
-            formatted_recommendations.append(HotelRecommendation(
-                hotel_id=G.nodes[hotel_node].get('hotel_id'),
-                name=hotel['name'],
-                location=location_name,  # Use the found location name
-                rating=round(float(hotel['final_score']), 2)
-            ))
+        # Find the location the hotel is connected to
+        location_name = ''
+        location_node = graph_index.hotel_location.get(hotel_node)
+        if location_node is not None:
+            location_name = G.nodes[location_node].get('name', '')
         
-        return formatted_recommendations
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        formatted_recommendations.append(HotelRecommendation(
+            hotel_id=G.nodes[hotel_node].get('hotel_id'),
+            name=hotel['name'],
+            location=location_name,  # Use the found location name
+            rating=round(float(hotel['final_score']), 2)
+        ))
+    
+    return formatted_recommendations
 
 @app.get("/experiences/")
 async def get_experiences():
     """List all experiences"""
+    G, graph_index = graph_state.G, graph_state.index
     experiences = []
-    for node in G.nodes(data=True):
-        if node[1].get('type') == 'Experience':
-            experiences.append({
-                'id': node[1].get('experience_id'),
-                'name': node[1].get('name'),
-                'description': node[1].get('description')
-            })
+    for node in graph_index.nodes_by_type['Experience']:
+        data = G.nodes[node]
+        experiences.append({
+            'id': data.get('experience_id'),
+            'name': data.get('name'),
+            'description': data.get('description')
+        })
     return experiences
 
 @app.get("/locations/")
 async def get_locations():
     """List all locations"""
+    G, graph_index = graph_state.G, graph_state.index
     locations = []
-    for node in G.nodes(data=True):
-        if node[1].get('type') == 'Location':
-            locations.append({
-                'id': node[1].get('location_id'),
-                'name': node[1].get('name'),
-                'description': node[1].get('description')
-            })
+    for node in graph_index.nodes_by_type['Location']:
+        data = G.nodes[node]
+        locations.append({
+            'id': data.get('location_id'),
+            'name': data.get('name'),
+            'description': data.get('description')
+        })
     return locations
 
+# Built offline with search_index.py; opened on the first search and reopened when it is updated
+search_index_path = os.environ.get('SEARCH_INDEX_PATH', os.path.join(base_path, '..', 'search_index'))
+search_index = None
+# (graph version, {hotel key: hotel node, None when unlinked}) linking review files to graph hotels
+search_hotel_nodes = (None, {})
+
+def current_search_index():
+    global search_index
+    if search_index is None:
+        try:
+            search_index = SearchIndex(search_index_path)
+        except FileNotFoundError:
+            return None
+    search_index.reopen()
+    return search_index
+
+def hotel_nodes_by_key(G, graph_index, keys):
+    global search_hotel_nodes
+    version, nodes = search_hotel_nodes
+    if version != graph_version(G):
+        nodes = {}
+    missing = [key for key in keys if key not in nodes]
+    if missing:
+        hotels = [
+            (G.nodes[node]['hotel_id'], G.nodes[node].get('name') or '')
+            for node in graph_index.nodes_by_type['Hotel'] if G.nodes[node].get('hotel_id') is not None
+        ]
+        linked, unlinked = link_hotels(missing, hotels)
+        nodes = dict(nodes)
+        for key in missing:
+            nodes[key] = graph_index.hotel_by_id.get(linked[key]) if key in linked else None
+        if unlinked:
+            print(f"Search index hotels not in the graph, left out of search results: {', '.join(unlinked)}")
+        search_hotel_nodes = (graph_version(G), nodes)
+    return nodes
+
+# Declared before /hotels/{hotel_id} so "search" is not taken for a hotel id
+@app.get("/hotels/search")
+async def search_hotels(q: str, location_id: int = None, limit: conint(gt=0, le=100) = 10):
+    """Hotels whose reviews best match the query, ranked by BM25"""
+    index = current_search_index()
+    if index is None:
+        raise service_unavailable("Search index not built")
+    G, graph_index = graph_state.G, graph_state.index
+    nodes = hotel_nodes_by_key(G, graph_index, index.hotels)
+
+    # Only hotels linked to the graph are searched, so every result has a hotel_id
+    hotels = {key for key, node in nodes.items() if node is not None}
+    if location_id is not None:
+        location_node = graph_index.location_by_id.get(location_id)
+        if location_node is None:
+            raise HTTPException(status_code=404, detail="Location not found")
+        location_hotels = set(graph_index.location_hotels.get(location_node, ()))
+        hotels = {key for key in hotels if nodes[key] in location_hotels}
+
+    results = []
+    for key, name, score, source, review_id in index.search(q, limit, hotels):
+        data = G.nodes[nodes[key]]
+        results.append({
+            'hotel_id': data.get('hotel_id'),
+            'name': data.get('name', name),
+            'score': round(score, 4),
+            'review': {'source': source, 'review_id': review_id}
+        })
+    return results
+
 @app.get("/hotels/{hotel_id}")
 async def get_hotel_details(hotel_id: int):
     """Get details of a specific hotel"""
-    for node in G.nodes(data=True):
-        if (node[1].get('type') == 'Hotel' and 
-            node[1].get('hotel_id') == hotel_id):
-            return {
-                'id': hotel_id,
-                'name': node[1].get('name'),
-                'rating': node[1].get('rating'),
-                'experiences': [
-                    {
-                        'name': G.nodes[exp]['name'],
-                        'rating': G[node[0]][exp]['rating']
-                    }
-                    for exp in G.neighbors(node[0])
-                    if G.nodes[exp]['type'] == 'Experience'
-                ]
+    G, graph_index = graph_state.G, graph_state.index
+    hotel_node = graph_index.hotel_by_id.get(hotel_id)
+    if hotel_node is None:
+        raise HTTPException(status_code=404, detail="Hotel not found")
+
+    data = G.nodes[hotel_node]
+    return {
+        'id': hotel_id,
+        'name': data.get('name'),
+        'rating': data.get('rating'),
+        'experiences': [
+            {
+                'name': G.nodes[exp]['name'],
+                'rating': G[hotel_node][exp]['rating']
             }
-    raise HTTPException(status_code=404, detail="Hotel not found")
+            # Writes run on another thread; list() copies the neighbours in one step
+            for exp in list(G.neighbors(hotel_node))
+            if G.nodes[exp]['type'] == 'Experience'
+        ]
+    }
 
-def calculate_weighted_pagerank(G):
-    """Calculate weighted PageRank on the graph"""
-    # Calculate PageRank using edge weights
-    edge_weights = {(u, v): data.get('rating', 1.0) 
-                   for u, v, data in G.edges(data=True)}
-    
-    return nx.pagerank(G, weight='rating')
+# Reviews imported with import_reviews.py
+review_store = ReviewStore(os.environ.get('REVIEW_STORE_PATH', os.path.join(base_path, '..', 'review_store')))
+
+@app.get("/hotels/{hotel_id}/reviews")
+async def get_hotel_reviews(hotel_id: int, min_rating: float = None, since: date = None,
+                            limit: conint(gt=0, le=500) = 50):
+    """Reviews of a hotel from the review store, newest first"""
+    if hotel_id not in graph_state.index.hotel_by_id:
+        raise HTTPException(status_code=404, detail="Hotel not found")
+    filters = [('hotel_id', '==', hotel_id)]
+    if min_rating is not None:
+        filters.append(('rating', '>=', min_rating))
+    if since is not None:
+        filters.append(('date', '>=', since.isoformat()))
+    columns = ['review_id', 'date', 'rating', 'original_text', 'translated_text', 'compound']
+    table = review_store.scan(columns, filters)
 
-def get_user_history(G, user_email):
+    # Newest first; reviews without a date go last
+    undated = np.isnat(table['date'])
+    days = np.where(undated, 0, table['date'].astype(np.int64))
+    order = np.lexsort((-days, undated))[:limit]
+    reviews = []
+    for i in order:
+        reviews.append({
+            'review_id': table['review_id'][i],
+            'date': None if np.isnat(table['date'][i]) else str(table['date'][i]),
+            'rating': None if np.isnan(table['rating'][i]) else float(table['rating'][i]),
+            'original_text': table['original_text'][i],
+            'translated_text': table['translated_text'][i],
+            'compound': None if np.isnan(table['compound'][i]) else float(table['compound'][i]),
+        })
+    return reviews
+
+def get_user_history(G, user_email, index=None):
     """Get user's hotel and experience history"""
-    user_node = None
-    for node in G.nodes():
-        if (G.nodes[node].get('type') == 'User' and 
-            G.nodes[node].get('email') == user_email):
-            user_node = node
-            break
+    if index is None:
+        index = GraphIndex.from_graph(G)
+    user_node = index.user_by_email.get(user_email)
     
     if not user_node:
         return None, None
@@ -225,170 +716,196 @@ def get_user_history(G, user_email):
     # User's liked experiences
     liked_experiences = set()
     
-    for neighbor in G.neighbors(user_node):
+    # Copy the adjacency first; writes may add edges while this runs on a scoring thread
+    for neighbor, edge in list(G[user_node].items()):
         if G.nodes[neighbor].get('type') == 'Hotel':
-            hotel_ratings[neighbor] = G[user_node][neighbor].get('rating', 0)
+            hotel_ratings[neighbor] = edge.get('rating', 0)
         elif G.nodes[neighbor].get('type') == 'Experience':
-            if G[user_node][neighbor].get('rating', 0) >= 4:
+            if edge.get('rating', 0) >= 4:
                 liked_experiences.add(neighbor)
     
     return hotel_ratings, liked_experiences
 
-def calculate_collaborative_score(G, hotel_node, user_hotel_ratings, user_liked_experiences):
-    """Calculate collaborative filtering score"""
-    if not user_hotel_ratings:
-        return 0
-    
-    similar_users = []
-    for user in G.nodes():
-        if G.nodes[user].get('type') == 'User':
-            similarity_score = 0
-            
-            # Hotel ratings similarity
-            user_ratings = {}
-            for hotel in G.neighbors(user):
-                if G.nodes[hotel].get('type') == 'Hotel':
-                    if G[user][hotel].get('relationship_type') == 'STAYED_AT':
-                        user_ratings[hotel] = G[user][hotel].get('rating', 0)
-            
-            common_hotels = set(user_ratings.keys()) & set(user_hotel_ratings.keys())
-            if common_hotels:
-                ratings_similarity = sum(abs(user_ratings[h] - user_hotel_ratings[h]) 
-                                      for h in common_hotels) / len(common_hotels)
-                similarity_score += ratings_similarity
-            
-            # Experience preferences similarity
-            user_likes = set()
-            for exp in G.neighbors(user):
-                if G.nodes[exp].get('type') == 'Experience':
-                    if G[user][exp].get('relationship_type') == 'LIKES':
-                        user_likes.add(exp)
-            
-            common_experiences = len(user_likes & user_liked_experiences)
-            if common_experiences:
-                similarity_score += common_experiences * 0.5
-            
-            if similarity_score > 0:
-                similar_users.append((user, similarity_score))
-    
-    if not similar_users:
-        return 0
-    
-    similar_users.sort(key=lambda x: x[1], reverse=True)
-    similar_users = similar_users[:5]  # Top 5 most similar users
-    
-    weighted_score = 0
-    total_weight = 0
-    
-    for user, similarity in similar_users:
-        if G.has_edge(user, hotel_node):
-            if G[user][hotel_node].get('relationship_type') == 'STAYED_AT':
-                rating = G[user][hotel_node].get('rating', 0)
-                weighted_score += rating * similarity
-                total_weight += similarity
-    
-    return weighted_score / total_weight if total_weight > 0 else 0
+class RecommendationContext:
+    """
+    Graph-wide structures shared by all requests scored against the same graph.
+
+    PageRank is read once, and user histories and similar users are memoized
+    per email, so a batch only pays for them once per distinct user. With an
+    experience_pagerank, hotels are ranked by the personalized PageRank of the
+    requested experiences instead of global PageRank.
+    """
+
+    def __init__(self, G, pagerank_store=None, index=None, collaborative_model=None,
+                 experience_pagerank=None, hotel_features=None):
+        self.G = G
+        self.index = index if index is not None else GraphIndex.from_graph(G)
+        if pagerank_store is None:
+            pagerank_store = PageRankStore(G, background=False)
+        self.pagerank_scores, self.normalized_pagerank_scores = pagerank_store.current()
+        self.collaborative_model = collaborative_model
+        self.experience_pagerank = experience_pagerank
+        if hotel_features is None:
+            hotel_features = HotelFeatures.from_graph(G, self.index)
+        self.hotel_features = hotel_features
+        self._user_history = {}
+        self._similar_users = {}
+
+    def user_history(self, user_email):
+        if user_email not in self._user_history:
+            self._user_history[user_email] = get_user_history(self.G, user_email, self.index)
+        return self._user_history[user_email]
+
+    def collaborative_scores(self, user_email, hotel_nodes):
+        """Calculate collaborative filtering scores for all candidate hotels at once"""
+        user_hotel_ratings, user_liked_experiences = (
+            self.user_history(user_email) if user_email else (None, None)
+        )
+        if not user_hotel_ratings:
+            return dict.fromkeys(hotel_nodes, 0)
+
+        if self.collaborative_model is None:
+            self.collaborative_model = CollaborativeModel.from_graph(self.G, self.index)
+        
+        # Top 5 most similar users are found once per user, not once per hotel
+        if user_email not in self._similar_users:
+            self._similar_users[user_email] = self.collaborative_model.top_similar_users(
+                user_hotel_ratings, user_liked_experiences, k=5
+            )
+        similar_users, similarities = self._similar_users[user_email]
+        return self.collaborative_model.hotel_scores(hotel_nodes, similar_users, similarities)
+
+    def similar_user_count(self, user_email):
+        similar_users, _ = self._similar_users.get(user_email, ((), ()))
+        return len(similar_users)
 
-def recommend_hotels_for_experiences(G, experience_preferences, user_email=None, location_id=None):
+def recommend_hotels_for_experiences(G, experience_preferences, user_email=None, location_id=None,
+                                     pagerank_store=None, index=None, collaborative_model=None,
+                                     experience_pagerank=None, hotel_features=None, context=None,
+                                     limit=None, timer=None):
     """
     experience_preferences: [(experience_id, importance_score), ...]
     importance_score: importance score given by customer to this experience (1-5)
     user_email: User's email for personalization
     location_id: Filter hotels by specific location
+    pagerank_store: Cached PageRank for G; computed on the fly when omitted
+    index: GraphIndex for G; built on the fly when omitted
+    collaborative_model: CollaborativeModel for G; built on the fly when omitted
+    experience_pagerank: ExperiencePageRank for G; global PageRank is used when omitted
+    hotel_features: HotelFeatures for G; built on the fly when omitted
+    context: RecommendationContext shared between calls; replaces the five above
+    limit: Only return the best `limit` hotels
+    timer: StageTimer that receives per-stage durations and counts
     """
-    experience_nodes = []
-    for exp_id, _ in experience_preferences:
-        for node in G.nodes():
-            if (G.nodes[node].get('type') == 'Experience' and 
-                G.nodes[node].get('experience_id') == exp_id):
-                experience_nodes.append(node)
-                break
+    if timer is None:
+        timer = StageTimer()
+    if context is None:
+        with timer.stage('pagerank'):
+            context = RecommendationContext(G, pagerank_store, index, collaborative_model,
+                                            experience_pagerank, hotel_features)
+    index = context.index
+
+    with timer.stage('resolve'):
+        # A repeated experience counts once per occurrence, always with its first importance
+        first_importance = {}
+        for exp_id, importance in experience_preferences:
+            first_importance.setdefault(exp_id, importance)
+        experience_nodes = []
+        selected_experiences = []
+        for exp_id, _ in experience_preferences:
+            exp_node = index.experience_by_id.get(exp_id)
+            if exp_node is not None:
+                experience_nodes.append(exp_node)
+                selected_experiences.append((exp_node, first_importance[exp_id]))
+        
+        if not experience_nodes:
+            return "Experiences not found"
+
+        # Location node'unu bul
+        location_node = None
+        if location_id:
+            location_node = index.location_by_id.get(location_id)
+            if not location_node:
+                return "Location not found"
+
+    pagerank_scores = context.pagerank_scores
+    features = context.hotel_features
+
+    if user_email:
+        with timer.stage('user_history'):
+            context.user_history(user_email)
     
-    if not experience_nodes:
-        return "Experiences not found"
-
-    # Location node'unu bul
-    location_node = None
-    if location_id:
-        for node in G.nodes():
-            if (G.nodes[node].get('type') == 'Location' and 
-                G.nodes[node].get('location_id') == location_id):
-                location_node = node
-                break
-        if not location_node:
-            return "Location not found"
-
-    pagerank_scores = calculate_weighted_pagerank(G)
-    user_hotel_ratings, user_liked_experiences = get_user_history(G, user_email) if user_email else (None, None)
+    # Candidate hotels come straight from the feature arrays, already location-filtered, in graph order
+    with timer.stage('candidates'):
+        candidate_positions = features.candidates(experience_nodes, location_node)
+        candidate_hotels = features.hotels[candidate_positions].tolist()
+    timer.count('candidate_hotels', len(candidate_hotels))
+
+    if context.experience_pagerank is not None:
+        with timer.stage('personalized_pagerank'):
+            normalized_pagerank = context.experience_pagerank.score_array(
+                dict(selected_experiences),
+                features.experience_pagerank_columns(context.experience_pagerank)[candidate_positions]
+            )
+    else:
+        normalized_pagerank = features.pagerank_array(context.normalized_pagerank_scores)[candidate_positions]
+
+    with timer.stage('collaborative'):
+        collaborative_scores = context.collaborative_scores(user_email, candidate_hotels)
+    timer.count('similar_users', context.similar_user_count(user_email))
     
+    with timer.stage('scoring'):
+        hotels_data = score_candidate_hotels(
+            G, features, candidate_positions, candidate_hotels, selected_experiences,
+            pagerank_scores, normalized_pagerank, collaborative_scores, limit
+        )
+    return hotels_data
+
+def score_candidate_hotels(G, features, candidate_positions, candidate_hotels, selected_experiences,
+                           pagerank_scores, normalized_pagerank, collaborative_scores, limit=None):
+    """
+    Weighted final score for every candidate hotel, best first.
+
+    selected_experiences: [(experience_node, importance), ...] in request order
+    normalized_pagerank: array aligned with candidate_hotels
+    limit: only the best `limit` hotels are returned
+    """
+    collaborative = np.fromiter(
+        (collaborative_scores[node] for node in candidate_hotels), dtype=np.float64, count=len(candidate_hotels)
+    )
+    final_scores, experience_counts, avg_ratings, ratings = features.score(
+        candidate_positions, selected_experiences, normalized_pagerank, collaborative
+    )
+
+    # Hotels without any of the selected experiences are not recommended
+    matched = np.flatnonzero(experience_counts > 0)
+    order = matched[top_k_order(final_scores[matched], limit)]
+
+    # (rating, importance) of the selected experiences each hotel has, in request order
+    experience_ratings = [[] for _ in range(len(order))]
+    for (_, importance), column in zip(selected_experiences, ratings[:, order]):
+        linked = np.flatnonzero(~np.isnan(column))
+        for i, rating in zip(linked.tolist(), column[linked].tolist()):
+            experience_ratings[i].append((rating, importance))
+
     hotels_data = []
-    for node in G.nodes():
-        if G.nodes[node].get('type') == 'Hotel':
-            # Location filtresi uygula
-            if location_node:
-                is_in_location = False
-                for neighbor in G.neighbors(node):
-                    if (neighbor == location_node and 
-                        G[node][neighbor].get('relationship_type') == 'LOCATED_IN'):
-                        is_in_location = True
-                        break
-                if not is_in_location:
-                    continue
-
-            if any(G.has_edge(node, exp_node) for exp_node in experience_nodes):
-                collaborative_score = calculate_collaborative_score(G, node, user_hotel_ratings, user_liked_experiences)
-                
-                hotel_data = {
-                    'node_id': node,
-                    'name': G.nodes[node].get('name'),
-                    'hotel_rating': G.nodes[node].get('rating', 0),
-                    'pagerank_score': pagerank_scores[node],
-                    'collaborative_score': collaborative_score,
-                    'experience_count': 0,
-                    'avg_experience_rating': 0.0,
-                    'selected_experiences_ratings': []
-                }
-                
-                total_rating = 0
-                num_selected_experiences = 0
-                
-                for exp_node in experience_nodes:
-                    if G.has_edge(node, exp_node):
-                        exp_rating = G[node][exp_node].get('rating', 0)
-                        exp_importance = next(score for id, score in experience_preferences 
-                                           if G.nodes[exp_node].get('experience_id') == id)
-                        hotel_data['selected_experiences_ratings'].append(
-                            (exp_rating, exp_importance)
-                        )
-                        total_rating += exp_rating
-                        num_selected_experiences += 1
-                
-                if num_selected_experiences > 0:
-                    hotel_data['experience_count'] = num_selected_experiences
-                    hotel_data['avg_experience_rating'] = total_rating / num_selected_experiences
-                    
-                    # Calculate final score
-                    selected_exp_score = 0
-                    if hotel_data['selected_experiences_ratings']:
-                        weighted_ratings = [rating * (importance/5) 
-                                         for rating, importance in hotel_data['selected_experiences_ratings']]
-                        selected_exp_score = sum(weighted_ratings) / len(weighted_ratings)
-                    
-                    normalized_pagerank = (hotel_data['pagerank_score'] / max(pagerank_scores.values())) * 10
-                    
-                    hotel_data['final_score'] = (
-                        hotel_data['avg_experience_rating'] * 0.25 +
-                        selected_exp_score * 0.35 +
-                        normalized_pagerank * 0.15 +
-                        hotel_data['hotel_rating'] * 0.1 +
-                        hotel_data['collaborative_score'] * 0.15
-                    )
-                    
-                    hotels_data.append(hotel_data)
-    
-    # Sort by final score
-    sorted_hotels = sorted(hotels_data, key=lambda x: x['final_score'], reverse=True)
-    return sorted_hotels
+    for i, final_score, count, avg_rating, selected_ratings in zip(
+            order.tolist(), final_scores[order].tolist(), experience_counts[order].tolist(),
+            avg_ratings[order].tolist(), experience_ratings):
+        node = candidate_hotels[i]
+        data = G.nodes[node]
+        hotels_data.append({
+            'node_id': node,
+            'name': data.get('name'),
+            'hotel_rating': data.get('rating', 0),
+            'pagerank_score': pagerank_scores.get(node, 0.0),
+            'collaborative_score': collaborative_scores[node],
+            'experience_count': count,
+            'avg_experience_rating': avg_rating,
+            'selected_experiences_ratings': selected_ratings,
+            'final_score': final_score
+        })
+    return hotels_data
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,217 @@
+import threading
+import numpy as np
+from scipy import sparse
+from similar_users import SimilarUserIndex, user_tokens
+
+
+def _resized(matrix, shape):
+    """Copy of a CSR matrix grown to shape, so readers of the old one are unaffected"""
+    if matrix.shape == shape:
+        return matrix.copy()
+    grown = matrix.copy()
+    grown.resize(shape)
+    return grown
+
+
+class CollaborativeModel:
+    """
+    Sparse user x hotel (STAYED_AT ratings) and user x experience (LIKES)
+    matrices used for collaborative filtering.
+
+    Rows follow the graph node order of User nodes, so ties between equally
+    similar users are broken the same way as the original per-user scan.
+    Updates only append rows/columns and swap in new matrices, so a request
+    that is already scoring keeps working on a consistent set of matrices.
+    """
+
+    def __init__(self, users, hotels, experiences, ratings, stayed, likes, version=None, positions=None):
+        self._lock = threading.Lock()
+        if positions is None:
+            self.users = list(users)
+            self.hotels = list(hotels)
+            self.experiences = list(experiences)
+            positions = tuple({node: i for i, node in enumerate(nodes)}
+                              for nodes in (self.users, self.hotels, self.experiences))
+        else:
+            # Prebuilt (user_row, hotel_col, experience_col) lookups; such a model is read-only
+            self.users, self.hotels, self.experiences = users, hotels, experiences
+        self.user_row, self.hotel_col, self.experience_col = positions
+        # ratings holds the STAYED_AT rating, stayed marks that the edge exists
+        # (a rating of 0 must still count as a stay)
+        self.ratings = ratings.tocsr()
+        self.stayed = stayed.tocsr()
+        self.likes = likes.tocsr()
+        self.version = version
+        # Optional approximate neighbour index; None means every user is compared
+        self.similar_user_index = None
+
+    def _matrices(self):
+        with self._lock:
+            return self.ratings, self.stayed, self.likes
+
+    @classmethod
+    def from_graph(cls, G, index):
+        """Build the matrices from the STAYED_AT and LIKES edges of G"""
+        users = index.nodes_by_type['User']
+        hotels = index.nodes_by_type['Hotel']
+        experiences = index.nodes_by_type['Experience']
+        hotel_col = {hotel: i for i, hotel in enumerate(hotels)}
+        experience_col = {exp: i for i, exp in enumerate(experiences)}
+
+        stay_rows, stay_cols, stay_ratings = [], [], []
+        like_rows, like_cols = [], []
+        for row, user in enumerate(users):
+            for neighbor, edge in G[user].items():
+                relationship = edge.get('relationship_type')
+                if relationship == 'STAYED_AT' and neighbor in hotel_col:
+                    stay_rows.append(row)
+                    stay_cols.append(hotel_col[neighbor])
+                    stay_ratings.append(edge.get('rating', 0))
+                elif relationship == 'LIKES' and neighbor in experience_col:
+                    like_rows.append(row)
+                    like_cols.append(experience_col[neighbor])
+
+        shape = (len(users), len(hotels))
+        ratings = sparse.csr_matrix(
+            (np.asarray(stay_ratings, dtype=np.float64), (stay_rows, stay_cols)), shape=shape)
+        stayed = sparse.csr_matrix(
+            (np.ones(len(stay_rows)), (stay_rows, stay_cols)), shape=shape)
+        likes = sparse.csr_matrix(
+            (np.ones(len(like_rows)), (like_rows, like_cols)),
+            shape=(len(users), len(experiences)))
+        return cls(users, hotels, experiences, ratings, stayed, likes,
+                   version=G.graph.get('version', 0))
+
+    def build_similar_user_index(self, **options):
+        """Index every user's stayed-at hotels and liked experiences with MinHash/LSH"""
+        ratings, stayed, likes = self._matrices()
+        tokens = sparse.hstack([stayed, likes]).tocsr()
+        # Same token ids as user_tokens(): hotels even, experiences odd
+        tokens.indices = np.where(tokens.indices < stayed.shape[1], 2 * tokens.indices,
+                                  2 * (tokens.indices - stayed.shape[1]) + 1)
+        index = SimilarUserIndex(**options)
+        index.build(tokens)
+        self.similar_user_index = index
+        return index
+
+    def _user_tokens(self, rows):
+        return [user_tokens(self.stayed[row].indices, self.likes[row].indices) for row in rows]
+
+    def apply_updates(self, users=(), hotels=(), experiences=(), stays=(), likes=(), version=None):
+        """
+        Add new users/hotels/experiences and STAYED_AT (user, hotel, rating) or
+        LIKES (user, experience) edges without rebuilding from the graph
+        """
+        with self._lock:
+            for user in users:
+                if user not in self.user_row:
+                    self.user_row[user] = len(self.users)
+                    self.users.append(user)
+            for hotel in hotels:
+                if hotel not in self.hotel_col:
+                    self.hotel_col[hotel] = len(self.hotels)
+                    self.hotels.append(hotel)
+            for exp in experiences:
+                if exp not in self.experience_col:
+                    self.experience_col[exp] = len(self.experiences)
+                    self.experiences.append(exp)
+
+            shape = (len(self.users), len(self.hotels))
+            ratings = _resized(self.ratings, shape)
+            stayed = _resized(self.stayed, shape)
+            liked = _resized(self.likes, (len(self.users), len(self.experiences)))
+
+            # Last rating wins for a repeated stay, like a repeated add_edge
+            stay_ratings = {(self.user_row[u], self.hotel_col[h]): r for u, h, r in stays}
+            if stay_ratings:
+                rows, cols = zip(*stay_ratings)
+                mask = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=shape)
+                values = sparse.csr_matrix(
+                    (np.asarray(list(stay_ratings.values()), dtype=np.float64), (rows, cols)), shape=shape)
+                ratings = ratings - ratings.multiply(mask) + values
+                stayed = stayed - stayed.multiply(mask) + mask
+
+            like_cells = {(self.user_row[u], self.experience_col[e]) for u, e in likes}
+            if like_cells:
+                rows, cols = zip(*like_cells)
+                liked = liked.maximum(sparse.csr_matrix(
+                    (np.ones(len(rows)), (rows, cols)), shape=liked.shape))
+
+            self.ratings, self.stayed, self.likes = ratings.tocsr(), stayed.tocsr(), liked.tocsr()
+            if version is not None:
+                self.version = version
+
+            if self.similar_user_index is not None:
+                rows = sorted({row for row, _ in stay_ratings} | {row for row, _ in like_cells})
+                self.similar_user_index.update(rows, self._user_tokens(rows), user_count=len(self.users))
+
+    def similarities(self, user_hotel_ratings, user_liked_experiences, rows=None):
+        """
+        Similarity of every user (or of the given user rows) to the given history:
+        mean absolute rating difference over common hotels + 0.5 per common liked experience
+        """
+        ratings, stayed_matrix, likes = self._matrices()
+        if rows is not None:
+            ratings, stayed_matrix, likes = ratings[rows], stayed_matrix[rows], likes[rows]
+        similarity = np.zeros(ratings.shape[0])
+
+        # Columns added after the matrices were read are skipped until the next call
+        common = [(self.hotel_col[h], r) for h, r in user_hotel_ratings.items()
+                  if self.hotel_col.get(h, ratings.shape[1]) < ratings.shape[1]]
+        if common:
+            cols = [col for col, _ in common]
+            target = np.array([rating for _, rating in common], dtype=np.float64)
+            stayed = stayed_matrix[:, cols].toarray()
+            diff = np.abs(ratings[:, cols].toarray() - target) * stayed
+            common_count = stayed.sum(axis=1)
+            np.divide(diff.sum(axis=1), common_count, out=similarity, where=common_count > 0)
+
+        liked_cols = [self.experience_col[e] for e in (user_liked_experiences or ())
+                      if self.experience_col.get(e, likes.shape[1]) < likes.shape[1]]
+        if liked_cols:
+            common_likes = np.asarray(likes[:, liked_cols].sum(axis=1)).ravel()
+            similarity += common_likes * 0.5
+
+        return similarity
+
+    def top_similar_users(self, user_hotel_ratings, user_liked_experiences, k=5):
+        """Row indexes and similarities of the k most similar users with a positive score"""
+        if self.similar_user_index is not None:
+            # Only users in the query's LSH buckets are scored, then reranked exactly
+            ratings, _, likes = self._matrices()
+            tokens = user_tokens(
+                [self.hotel_col[h] for h in user_hotel_ratings
+                 if self.hotel_col.get(h, ratings.shape[1]) < ratings.shape[1]],
+                [self.experience_col[e] for e in (user_liked_experiences or ())
+                 if self.experience_col.get(e, likes.shape[1]) < likes.shape[1]]
+            )
+            rows = self.similar_user_index.candidates(tokens)
+            rows = rows[rows < ratings.shape[0]]
+            similarity = self.similarities(user_hotel_ratings, user_liked_experiences, rows)
+            positive = similarity > 0
+            rows, similarity = rows[positive], similarity[positive]
+            order = np.argsort(-similarity, kind='stable')[:k]
+            return rows[order], similarity[order]
+
+        similarity = self.similarities(user_hotel_ratings, user_liked_experiences)
+        candidates = np.flatnonzero(similarity > 0)
+        # Stable sort keeps graph order between equal similarities
+        order = np.argsort(-similarity[candidates], kind='stable')[:k]
+        rows = candidates[order]
+        return rows, similarity[rows]
+
+    def hotel_scores(self, hotel_nodes, rows, weights):
+        """Similarity-weighted average STAYED_AT rating of the given users for each hotel"""
+        scores = dict.fromkeys(hotel_nodes, 0)
+        if len(rows) == 0:
+            return scores
+
+        ratings, stayed, _ = self._matrices()
+        known = [h for h in hotel_nodes if self.hotel_col.get(h, ratings.shape[1]) < ratings.shape[1]]
+        cols = [self.hotel_col[h] for h in known]
+        weighted = weights @ ratings[rows][:, cols].toarray()
+        total = weights @ stayed[rows][:, cols].toarray()
+        for hotel, score, weight in zip(known, weighted, total):
+            if weight > 0:
+                scores[hotel] = score / weight
+        return scores
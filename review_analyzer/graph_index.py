@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+
+class GraphIndex:
+    """
+    Secondary indexes over the recommendation graph.
+
+    Maps every domain id (hotel_id, experience_id, location_id) and user email
+    to its graph node, and keeps the hotel <-> location and experience -> hotel
+    relations so endpoints never have to scan G.nodes(). Hotel lists are kept
+    in graph node order, which keeps the ranking ties identical to a full scan.
+    """
+
+    def __init__(self):
+        self.nodes_by_type = defaultdict(list)
+        self.hotel_by_id = {}
+        self.experience_by_id = {}
+        self.location_by_id = {}
+        self.user_by_email = {}
+        # Position of every hotel in graph node order
+        self.hotel_position = {}
+        self.hotel_location = {}
+        self.location_hotels = defaultdict(list)
+        self.experience_hotels = defaultdict(list)
+        self.version = None
+
+    @classmethod
+    def from_graph(cls, G):
+        """Build all indexes with a single pass over the graph"""
+        index = cls()
+        for node, data in G.nodes(data=True):
+            index.add_node(node, data)
+        for hotel in index.nodes_by_type['Hotel']:
+            for neighbor in G.neighbors(hotel):
+                index.add_hotel_edge(G, hotel, neighbor)
+        index.version = G.graph.get('version', 0)
+        return index
+
+    def add_node(self, node, data):
+        """Register a node; the first node seen for an id wins, like a scan would"""
+        node_type = data.get('type')
+        self.nodes_by_type[node_type].append(node)
+        if node_type == 'Hotel':
+            self.hotel_position[node] = len(self.hotel_position)
+            if data.get('hotel_id') is not None:
+                self.hotel_by_id.setdefault(data['hotel_id'], node)
+        elif node_type == 'Experience':
+            if data.get('experience_id') is not None:
+                self.experience_by_id.setdefault(data['experience_id'], node)
+        elif node_type == 'Location':
+            if data.get('location_id') is not None:
+                self.location_by_id.setdefault(data['location_id'], node)
+        elif node_type == 'User':
+            if data.get('email') is not None:
+                self.user_by_email.setdefault(data['email'], node)
+
+    def add_hotel_edge(self, G, hotel, neighbor):
+        """Index the edge between a hotel and one of its neighbors"""
+        neighbor_type = G.nodes[neighbor].get('type')
+        if neighbor_type == 'Experience':
+            self.experience_hotels[neighbor].append(hotel)
+        elif (neighbor_type == 'Location' and
+              G[hotel][neighbor].get('relationship_type') == 'LOCATED_IN'):
+            self.hotel_location.setdefault(hotel, neighbor)
+            self.location_hotels[neighbor].append(hotel)
+
+    def hotels_for_experiences(self, experience_nodes, location_node=None):
+        """Hotels linked to any of the experiences, optionally within a location, in graph order"""
+        candidates = set()
+        for exp_node in experience_nodes:
+            candidates.update(self.experience_hotels.get(exp_node, ()))
+        if location_node is not None:
+            candidates.intersection_update(self.location_hotels.get(location_node, ()))
+        return sorted(candidates, key=self.hotel_position.__getitem__)
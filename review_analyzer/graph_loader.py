@@ -0,0 +1,114 @@
+import os
+import time
+import networkx as nx
+import pandas as pd
+
+DEFAULT_ENCODING = 'iso-8859-9'
+
+# Node type -> (file, column dtypes). Columns not listed are still loaded as attributes.
+NODE_FILES = {
+    'Hotel': ('hotel_nodes_2.csv', {'id': 'int64', 'name': str, 'rating': 'float64', 'hotel_id': 'int64'}),
+    'Experience': ('experience_nodes.csv', {'id': 'int64', 'name': str, 'description': str,
+                                            'experience_id': 'int64'}),
+    'Location': ('location_nodes.csv', {'id': 'int64', 'name': str, 'location_id': 'int64'}),
+    'User': ('user_nodes.csv', {'id': 'int64', 'name': str, 'email': str}),
+}
+
+# Edge type -> file. relationship_type is the upper-cased edge type.
+EDGE_FILES = {
+    'has_experience': 'has_experience_edges.csv',
+    'likes': 'likes_edges.csv',
+    'located_in': 'located_in_edges.csv',
+    'stayed_at': 'stayed_at_edges.csv',
+}
+
+EDGE_DTYPES = {'source': 'int64', 'target': 'int64', 'rating': 'float64'}
+
+
+class GraphDataError(Exception):
+    """Raised when a graph CSV file is missing or malformed"""
+
+
+def read_graph_csv(path, dtypes, required_columns, encoding=DEFAULT_ENCODING):
+    """Read one node/edge file with explicit dtypes, failing with the file name on bad input"""
+    filename = os.path.basename(path)
+    if not os.path.exists(path):
+        raise GraphDataError(f"{filename}: file not found at {path}")
+
+    try:
+        header = pd.read_csv(path, encoding=encoding, nrows=0).columns
+        missing = [col for col in required_columns if col not in header]
+        if missing:
+            raise GraphDataError(f"{filename}: missing required column(s) {', '.join(missing)}")
+        return pd.read_csv(
+            path,
+            encoding=encoding,
+            dtype={col: dtype for col, dtype in dtypes.items() if col in header}
+        )
+    except GraphDataError:
+        raise
+    except ValueError as e:
+        # Covers parser errors, bad encodings and non-numeric/empty id columns
+        raise GraphDataError(f"{filename}: {str(e)}") from e
+
+
+def _file_stats(filename, rows, df, started):
+    return {
+        'file': filename,
+        'rows': rows,
+        'seconds': time.perf_counter() - started,
+        'memory_mb': df.memory_usage(deep=True).sum() / 1024 ** 2,
+    }
+
+
+def load_nodes(G, path, node_type, dtypes, encoding=DEFAULT_ENCODING):
+    """Add all nodes of one file to G in bulk and return load stats"""
+    started = time.perf_counter()
+    df = read_graph_csv(path, dtypes, ['id'], encoding)
+
+    records = df.to_dict('records')
+    # Only columns that actually contain missing values need a per-cell check
+    nullable = [col for col in df.columns if df[col].isna().any()]
+    for record in records:
+        record['type'] = node_type
+        for col in nullable:
+            if pd.isna(record[col]):
+                del record[col]
+
+    G.add_nodes_from(zip(df['id'].tolist(), records))
+    return _file_stats(os.path.basename(path), len(df), df, started)
+
+
+def load_edges(G, path, edge_type, encoding=DEFAULT_ENCODING):
+    """Add all edges of one file to G in bulk and return load stats"""
+    started = time.perf_counter()
+    df = read_graph_csv(path, EDGE_DTYPES, ['source', 'target'], encoding)
+
+    if 'rating' in df.columns:
+        edge_data = ({'rating': rating} for rating in df['rating'].tolist())
+    else:
+        edge_data = ({'rating': 0} for _ in range(len(df)))
+
+    G.add_edges_from(
+        zip(df['source'].tolist(), df['target'].tolist(), edge_data),
+        relationship_type=edge_type.upper()
+    )
+    return _file_stats(os.path.basename(path), len(df), df, started)
+
+
+def load_graph(data_path, encoding=DEFAULT_ENCODING, verbose=True):
+    """Build the recommendation graph from the CSV files in data_path"""
+    G = nx.Graph()
+    stats = []
+
+    for node_type, (filename, dtypes) in NODE_FILES.items():
+        stats.append(load_nodes(G, os.path.join(data_path, filename), node_type, dtypes, encoding))
+
+    for edge_type, filename in EDGE_FILES.items():
+        stats.append(load_edges(G, os.path.join(data_path, filename), edge_type, encoding))
+
+    if verbose:
+        for stat in stats:
+            print(f"Loaded {stat['file']}: {stat['rows']} rows in {stat['seconds'] * 1000:.1f} ms "
+                  f"({stat['memory_mb']:.2f} MB)")
+    return G, stats
@@ -0,0 +1,433 @@
+"""
+Binary snapshot of the recommendation graph.
+
+The compile step turns the CSVs in graph_nodes_edges/ into a directory of .npy
+arrays that the API can memory-map at startup instead of reparsing every CSV:
+
+    <snapshot_root>/CURRENT            name of the active snapshot directory
+    <snapshot_root>/<digest>/          one directory per set of source checksums
+        manifest.json                  format, source checksums, type/attribute names
+        node_ids.npy, node_types.npy   node arrays in graph order
+        node_order.npy                 argsort of node_ids, for id lookups by binary search
+        type<i>.nodes/order            node ids of each type in graph order
+        attr<i>.*.npy                  typed attribute columns with presence masks
+        adj_indptr/indices/rel/rating  CSR adjacency (both directions, graph order)
+        edge_src/dst/rel/rating        edges in insertion order, used to rebuild G
+        index.*.npy                    precomputed GraphIndex tables
+        pagerank.*.npy                 weighted PageRank, raw and normalized, in node order
+        collaborative.*.npy            CSR user x hotel/experience matrices
+        ppr.matrix.npy                 personalized PageRank, experiences x hotels
+
+Usage: python graph_snapshot.py [data_path] [snapshot_root]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+import networkx as nx
+from graph_index import GraphIndex
+from collaborative import CollaborativeModel
+from pagerank_store import normalize_scores
+from personalized_pagerank import ExperiencePageRank
+from graph_loader import NODE_FILES, EDGE_FILES, EDGE_DTYPES, DEFAULT_ENCODING, load_graph, read_graph_csv
+
+SNAPSHOT_FORMAT = 3
+CURRENT_FILE = 'CURRENT'
+
+ID_INDEXES = ('hotel_by_id', 'experience_by_id', 'location_by_id')
+COLLABORATIVE_MATRICES = ('ratings', 'stayed', 'likes')
+GROUP_INDEXES = ('location_hotels', 'experience_hotels')
+
+
+def source_files():
+    return [filename for filename, _ in NODE_FILES.values()] + list(EDGE_FILES.values())
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_checksums(data_path):
+    """sha256, size and mtime of every source CSV"""
+    checksums = {}
+    for filename in source_files():
+        path = os.path.join(data_path, filename)
+        stat = os.stat(path)
+        checksums[filename] = {
+            'sha256': file_checksum(path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        }
+    return checksums
+
+
+def sources_unchanged(data_path, recorded):
+    """True when the CSVs still match the checksums recorded in a snapshot"""
+    if set(recorded) != set(source_files()):
+        return False
+    for filename, info in recorded.items():
+        path = os.path.join(data_path, filename)
+        if not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size != info['size']:
+            return False
+        # Only hash files whose mtime moved; an untouched file is trusted as is
+        if stat.st_mtime_ns != info['mtime_ns'] and file_checksum(path) != info['sha256']:
+            return False
+    return True
+
+
+def _encode_strings(values):
+    """Pack strings into a UTF-8 blob plus byte offsets, so single values can be decoded in place"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def _decode_strings(blob, offsets):
+    data = blob.tobytes()
+    offsets = offsets.tolist()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def _column_kind(values):
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values):
+        return 'int'
+    if all(isinstance(v, (int, float, np.integer, np.floating)) for v in values):
+        return 'float'
+    if all(isinstance(v, str) for v in values):
+        return 'str'
+    raise ValueError(f"Unsupported attribute values: {values[:3]}")
+
+
+def _group_arrays(groups):
+    """Encode {key_node: [nodes]} as key nodes + CSR indptr/values"""
+    keys = list(groups)
+    indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(groups[key]) for key in keys])
+    values = [node for key in keys for node in groups[key]]
+    return np.array(keys, dtype=np.int64), indptr, np.array(values, dtype=np.int64)
+
+
+def _key_order(keys):
+    """Sorter for np.searchsorted over an unsorted key array"""
+    return np.argsort(keys, kind='stable')
+
+
+def _edge_insertion_order(G, data_path, position, encoding):
+    """
+    Edges in the order they were first added while loading the CSVs.
+
+    Rebuilding G in this order reproduces networkx's neighbor order exactly.
+    Attributes are taken from G, so duplicate rows keep last-wins values.
+    """
+    sources, targets = [], []
+    for filename in EDGE_FILES.values():
+        df = read_graph_csv(os.path.join(data_path, filename), EDGE_DTYPES, ['source', 'target'], encoding)
+        sources.extend(position[node] for node in df['source'].tolist())
+        targets.extend(position[node] for node in df['target'].tolist())
+
+    src = np.array(sources, dtype=np.int64)
+    dst = np.array(targets, dtype=np.int64)
+    pair = np.minimum(src, dst) * len(position) + np.maximum(src, dst)
+    _, first = np.unique(pair, return_index=True)
+    first.sort()
+    return src[first], dst[first]
+
+
+def compile_snapshot(data_path, snapshot_root, G=None, index=None, encoding=DEFAULT_ENCODING,
+                     pagerank_scores=None, collaborative_model=None, experience_pagerank=None):
+    """
+    Write a snapshot of the CSVs in data_path and make it the CURRENT one.
+    G, index and the derived structures are built when not given.
+    """
+    checksums = source_checksums(data_path)
+    if G is None:
+        G, _ = load_graph(data_path, encoding, verbose=False)
+    if index is None:
+        index = GraphIndex.from_graph(G)
+    if pagerank_scores is None:
+        pagerank_scores = nx.pagerank(G, weight='rating')
+    if collaborative_model is None:
+        collaborative_model = CollaborativeModel.from_graph(G, index)
+    if experience_pagerank is None:
+        experience_pagerank = ExperiencePageRank.from_graph(G, index)
+
+    nodes = list(G.nodes())
+    position = {node: i for i, node in enumerate(nodes)}
+    arrays = {'node_ids': np.array(nodes, dtype=np.int64)}
+    arrays['node_order'] = _key_order(arrays['node_ids'])
+
+    # Node types and typed attribute columns
+    node_types = [t for t in index.nodes_by_type if t is not None]
+    type_code = {t: i for i, t in enumerate(node_types)}
+    arrays['node_types'] = np.array(
+        [type_code.get(data.get('type'), -1) for _, data in G.nodes(data=True)], dtype=np.int8)
+    for code, node_type in enumerate(node_types):
+        arrays[f'type{code}.nodes'] = np.array(index.nodes_by_type[node_type], dtype=np.int64)
+        arrays[f'type{code}.order'] = _key_order(arrays[f'type{code}.nodes'])
+
+    attribute_names = []
+    for _, data in G.nodes(data=True):
+        for name in data:
+            if name != 'type' and name not in attribute_names:
+                attribute_names.append(name)
+
+    attributes = []
+    for i, name in enumerate(attribute_names):
+        mask = np.array([name in data for _, data in G.nodes(data=True)], dtype=bool)
+        present = [data[name] for _, data in G.nodes(data=True) if name in data]
+        kind = _column_kind(present)
+        arrays[f'attr{i}.mask'] = mask
+        if kind == 'str':
+            values = [data.get(name, '') for _, data in G.nodes(data=True)]
+            arrays[f'attr{i}.blob'], arrays[f'attr{i}.offsets'] = _encode_strings(values)
+        else:
+            dtype = np.int64 if kind == 'int' else np.float64
+            arrays[f'attr{i}.values'] = np.array(
+                [data.get(name, 0) for _, data in G.nodes(data=True)], dtype=dtype)
+        attributes.append([name, kind])
+
+    # CSR adjacency in networkx neighbor order
+    relationship_types = sorted({d.get('relationship_type') for _, _, d in G.edges(data=True)})
+    rel_code = {rel: i for i, rel in enumerate(relationship_types)}
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    indices, rels, ratings = [], [], []
+    for i, node in enumerate(nodes):
+        for neighbor, edge in G[node].items():
+            indices.append(position[neighbor])
+            rels.append(rel_code[edge.get('relationship_type')])
+            ratings.append(edge.get('rating', 0))
+        indptr[i + 1] = len(indices)
+    arrays['adj_indptr'] = indptr
+    arrays['adj_indices'] = np.array(indices, dtype=np.int64)
+    arrays['adj_rel'] = np.array(rels, dtype=np.int8)
+    arrays['adj_rating'] = np.array(ratings, dtype=np.float64)
+
+    # Edge list in insertion order, used to rebuild G with identical neighbor order
+    src, dst = _edge_insertion_order(G, data_path, position, encoding)
+    arrays['edge_src'] = src
+    arrays['edge_dst'] = dst
+    arrays['edge_rel'] = np.array(
+        [rel_code[G[nodes[u]][nodes[v]].get('relationship_type')] for u, v in zip(src, dst)], dtype=np.int8)
+    arrays['edge_rating'] = np.array(
+        [G[nodes[u]][nodes[v]].get('rating', 0) for u, v in zip(src, dst)], dtype=np.float64)
+
+    # Precomputed indexes, keyed and valued by ids so they can be searched in place
+    for name in ID_INDEXES + ('hotel_location',):
+        mapping = getattr(index, name)
+        arrays[f'index.{name}.keys'] = np.array(list(mapping), dtype=np.int64)
+        arrays[f'index.{name}.nodes'] = np.array(list(mapping.values()), dtype=np.int64)
+    emails = list(index.user_by_email)
+    arrays['index.user_by_email.blob'], arrays['index.user_by_email.offsets'] = _encode_strings(emails)
+    arrays['index.user_by_email.nodes'] = np.array(list(index.user_by_email.values()), dtype=np.int64)
+    arrays['index.user_by_email.order'] = np.array(
+        sorted(range(len(emails)), key=emails.__getitem__), dtype=np.int64)
+    for name in GROUP_INDEXES:
+        keys, group_indptr, values = _group_arrays(getattr(index, name))
+        arrays[f'index.{name}.keys'] = keys
+        arrays[f'index.{name}.indptr'] = group_indptr
+        arrays[f'index.{name}.nodes'] = values
+    for name in ID_INDEXES + ('hotel_location',) + GROUP_INDEXES:
+        arrays[f'index.{name}.order'] = _key_order(arrays[f'index.{name}.keys'])
+
+    # Derived structures, so readers never recompute them
+    arrays['pagerank.scores'] = np.array([pagerank_scores.get(node, 0.0) for node in nodes], dtype=np.float64)
+    normalized = normalize_scores(pagerank_scores)
+    arrays['pagerank.normalized'] = np.array([normalized.get(node, 0.0) for node in nodes], dtype=np.float64)
+    for name in COLLABORATIVE_MATRICES:
+        matrix = getattr(collaborative_model, name)
+        arrays[f'collaborative.{name}.data'] = matrix.data
+        arrays[f'collaborative.{name}.indices'] = matrix.indices
+        arrays[f'collaborative.{name}.indptr'] = matrix.indptr
+    arrays['ppr.matrix'] = np.asarray(experience_pagerank.matrix, dtype=np.float32)
+
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'created': time.time(),
+        'sources': checksums,
+        'nodes': len(nodes),
+        'edges': int(len(src)),
+        'node_types': node_types,
+        'relationship_types': relationship_types,
+        'attributes': attributes,
+        'collaborative_shapes': {
+            name: list(getattr(collaborative_model, name).shape) for name in COLLABORATIVE_MATRICES
+        },
+        'arrays': sorted(arrays),
+    }
+
+    # Directory name depends only on the sources and format, so identical inputs share a snapshot
+    digest = hashlib.sha256(json.dumps(
+        {'format': SNAPSHOT_FORMAT, 'sources': {f: c['sha256'] for f, c in checksums.items()}},
+        sort_keys=True
+    ).encode()).hexdigest()[:16]
+    os.makedirs(snapshot_root, exist_ok=True)
+    tmp_dir = os.path.join(snapshot_root, f'.{digest}.tmp-{os.getpid()}')
+    os.makedirs(tmp_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    final_dir = os.path.join(snapshot_root, digest)
+    try:
+        os.rename(tmp_dir, final_dir)
+    except OSError:
+        # Another process already wrote the same snapshot
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # Switch CURRENT atomically so readers see either the old or the new snapshot
+    current_tmp = os.path.join(snapshot_root, f'.{CURRENT_FILE}.tmp-{os.getpid()}')
+    with open(current_tmp, 'w', encoding='utf-8') as f:
+        f.write(digest)
+    os.replace(current_tmp, os.path.join(snapshot_root, CURRENT_FILE))
+    return final_dir
+
+
+class GraphSnapshot:
+    """A compiled snapshot whose arrays are memory-mapped read-only"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format in {path}")
+        # Plain ndarray views of the maps; indexing an np.memmap is several times slower
+        self.arrays = {
+            name: np.asarray(np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+            for name in self.manifest['arrays']
+        }
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def node_ids(self):
+        return self.arrays['node_ids'].tolist()
+
+    def to_graph(self):
+        """Rebuild the networkx graph with the same node, neighbor and attribute order"""
+        manifest = self.manifest
+        arrays = self.arrays
+        n = manifest['nodes']
+        records = [{} for _ in range(n)]
+        for i, (name, kind) in enumerate(manifest['attributes']):
+            present = np.flatnonzero(arrays[f'attr{i}.mask']).tolist()
+            if kind == 'str':
+                values = _decode_strings(arrays[f'attr{i}.blob'], arrays[f'attr{i}.offsets'])
+            else:
+                values = arrays[f'attr{i}.values'].tolist()
+            for p in present:
+                records[p][name] = values[p]
+
+        node_types = manifest['node_types']
+        for record, code in zip(records, arrays['node_types'].tolist()):
+            if code >= 0:
+                record['type'] = node_types[code]
+
+        ids = arrays['node_ids']
+        relationship_types = manifest['relationship_types']
+        G = nx.Graph()
+        G.add_nodes_from(zip(ids.tolist(), records))
+        G.add_edges_from(
+            (u, v, {'relationship_type': relationship_types[rel], 'rating': rating})
+            for u, v, rel, rating in zip(
+                ids[arrays['edge_src']].tolist(),
+                ids[arrays['edge_dst']].tolist(),
+                arrays['edge_rel'].tolist(),
+                arrays['edge_rating'].tolist()
+            )
+        )
+        return G
+
+    def to_index(self, G):
+        """Restore the precomputed GraphIndex for the graph returned by to_graph()"""
+        arrays = self.arrays
+        index = GraphIndex()
+
+        for code, node_type in enumerate(self.manifest['node_types']):
+            index.nodes_by_type[node_type] = arrays[f'type{code}.nodes'].tolist()
+        index.hotel_position = {hotel: i for i, hotel in enumerate(index.nodes_by_type['Hotel'])}
+
+        for name in ID_INDEXES + ('hotel_location',):
+            setattr(index, name, dict(zip(
+                arrays[f'index.{name}.keys'].tolist(),
+                arrays[f'index.{name}.nodes'].tolist()
+            )))
+        index.user_by_email = dict(zip(
+            _decode_strings(arrays['index.user_by_email.blob'], arrays['index.user_by_email.offsets']),
+            arrays['index.user_by_email.nodes'].tolist()
+        ))
+        for name in GROUP_INDEXES:
+            keys = arrays[f'index.{name}.keys'].tolist()
+            indptr = arrays[f'index.{name}.indptr'].tolist()
+            values = arrays[f'index.{name}.nodes'].tolist()
+            groups = getattr(index, name)
+            for i, key in enumerate(keys):
+                groups[key] = values[indptr[i]:indptr[i + 1]]
+
+        index.version = G.graph.get('version', 0)
+        return index
+
+    def to_experience_pagerank(self):
+        """ExperiencePageRank over the memory-mapped matrix"""
+        node_types = self.manifest['node_types']
+        experiences, hotels = (self.arrays[f'type{node_types.index(t)}.nodes'].tolist()
+                               for t in ('Experience', 'Hotel'))
+        return ExperiencePageRank(experiences, hotels, self.arrays['ppr.matrix'])
+
+
+def current_snapshot_path(snapshot_root):
+    """Directory of the CURRENT snapshot, or None if there is none"""
+    try:
+        with open(os.path.join(snapshot_root, CURRENT_FILE), encoding='utf-8') as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(snapshot_root, name)
+    return path if os.path.isdir(path) else None
+
+
+def load_snapshot(snapshot_root, data_path):
+    """
+    Open the CURRENT snapshot if it still matches the CSVs in data_path.
+
+    Returns None when there is no usable snapshot, so the caller can fall back
+    to rebuilding the graph from the CSVs.
+    """
+    path = current_snapshot_path(snapshot_root)
+    if path is None:
+        return None
+    try:
+        snapshot = GraphSnapshot(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Snapshot error: {str(e)}")
+        return None
+    if not sources_unchanged(data_path, snapshot.manifest['sources']):
+        print("Snapshot is out of date with the CSV files, rebuilding graph")
+        return None
+    return snapshot
+
+
+if __name__ == "__main__":
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Compile graph CSVs into a binary snapshot")
+    parser.add_argument('data_path', nargs='?', default=os.path.join(base_path, '..', 'graph_nodes_edges'))
+    parser.add_argument('snapshot_root', nargs='?', default=os.path.join(base_path, '..', 'graph_snapshot'))
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    path = compile_snapshot(args.data_path, args.snapshot_root)
+    print(f"Snapshot written to {path} in {time.perf_counter() - started:.2f} s")
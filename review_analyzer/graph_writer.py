@@ -0,0 +1,298 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pagerank_store import bump_graph_version, graph_version
+
+
+class GraphLock:
+    """
+    Readers-writer lock for the live graph.
+
+    Scoring threads and the PageRank refresh read the graph together; a write
+    waits until they are done and runs alone. Waiting writers go first, so a
+    steady stream of reads cannot hold writes back. Not reentrant.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class GraphWriter:
+    """
+    Applies incremental changes to the live graph.
+
+    Every write updates G, the GraphIndex and the hotel feature arrays under
+    the write side of `lock` and bumps the graph version. The costlier steps
+    (collaborative matrices, PageRank refresh, on_change) are batched: they
+    run once per flush_interval for all writes since the last flush, so new
+    feedback shows up in rankings within about a second without a restart.
+
+    With a log_path every accepted write is also appended to a JSON lines
+    write-ahead log. replay() applies the entries this process has not seen
+    yet, at startup and from follow(), so every worker sharing the log ends
+    up with the same graph and a restart keeps the writes. A write first
+    replays the log under an exclusive file lock, so all workers apply the
+    writes in log order and validate them against the same graph.
+    Lookups that fail raise LookupError, conflicting writes raise ValueError.
+    """
+
+    def __init__(self, G, index, pagerank_store, collaborative_model, hotel_features=None, on_change=None,
+                 log_path=None, flush_interval=0.5, lock=None):
+        self.G = G
+        self.index = index
+        self.pagerank_store = pagerank_store
+        self.collaborative_model = collaborative_model
+        self.hotel_features = hotel_features
+        self.on_change = on_change
+        self.log_path = log_path
+        self.flush_interval = flush_interval
+        self.lock = lock or GraphLock()
+        # Serializes writes and log replay within this process
+        self._apply_lock = threading.Lock()
+        self._log_offset = 0
+        # _flush_lock guards the pending updates, _flush_run_lock keeps flushes in order
+        self._flush_lock = threading.Lock()
+        self._flush_run_lock = threading.Lock()
+        self._flush_timer = None
+        self._pending = self._no_updates()
+        self._dirty = False
+        self._thread = None
+        self._next_node_id = max((node for node in G if isinstance(node, int)), default=0) + 1
+
+    @staticmethod
+    def _no_updates():
+        return {'users': [], 'hotels': [], 'stays': [], 'likes': []}
+
+    def _new_node_id(self):
+        node = self._next_node_id
+        self._next_node_id += 1
+        return node
+
+    def _node(self, mapping, key, label):
+        node = mapping.get(key)
+        if node is None:
+            raise LookupError(f"{label} not found")
+        return node
+
+    def _commit(self, **updates):
+        """Bump the version and queue the collaborative updates of one applied write"""
+        version = bump_graph_version(self.G)
+        self.index.version = version
+        with self._flush_lock:
+            for name, values in updates.items():
+                self._pending[name].extend(values)
+            self._dirty = True
+        return version
+
+    # Each _add_* applies one write under the write lock; the public methods log it too
+
+    def _add_user(self, name, email):
+        if email in self.index.user_by_email:
+            raise ValueError("User with this email already exists")
+        node = self._new_node_id()
+        data = {'id': node, 'name': name, 'email': email, 'type': 'User'}
+        self.G.add_node(node, **data)
+        self.index.add_node(node, data)
+        return node, self._commit(users=[node])
+
+    def _add_hotel(self, hotel_id, name, rating, location_id=None):
+        if hotel_id in self.index.hotel_by_id:
+            raise ValueError("Hotel with this hotel_id already exists")
+        location_node = None
+        if location_id is not None:
+            location_node = self._node(self.index.location_by_id, location_id, "Location")
+
+        node = self._new_node_id()
+        data = {'id': node, 'name': name, 'rating': rating, 'hotel_id': hotel_id, 'type': 'Hotel'}
+        self.G.add_node(node, **data)
+        self.index.add_node(node, data)
+        if location_node is not None:
+            self.G.add_edge(node, location_node, relationship_type='LOCATED_IN', rating=0)
+            self.index.add_hotel_edge(self.G, node, location_node)
+        if self.hotel_features is not None:
+            self.hotel_features.add_hotel(node, rating, location_node)
+        return node, self._commit(hotels=[node])
+
+    def _add_stay(self, user_email, hotel_id, rating):
+        user = self._node(self.index.user_by_email, user_email, "User")
+        hotel = self._node(self.index.hotel_by_id, hotel_id, "Hotel")
+        self.G.add_edge(user, hotel, relationship_type='STAYED_AT', rating=rating)
+        return self._commit(stays=[(user, hotel, rating)])
+
+    def _add_like(self, user_email, experience_id):
+        user = self._node(self.index.user_by_email, user_email, "User")
+        experience = self._node(self.index.experience_by_id, experience_id, "Experience")
+        self.G.add_edge(user, experience, relationship_type='LIKES', rating=0)
+        return self._commit(likes=[(user, experience)])
+
+    def _add_hotel_experience(self, hotel_id, experience_id, rating):
+        hotel = self._node(self.index.hotel_by_id, hotel_id, "Hotel")
+        experience = self._node(self.index.experience_by_id, experience_id, "Experience")
+        is_new = not self.G.has_edge(hotel, experience)
+        self.G.add_edge(hotel, experience, relationship_type='HAS_EXPERIENCE', rating=rating)
+        if is_new:
+            self.index.add_hotel_edge(self.G, hotel, experience)
+        if self.hotel_features is not None:
+            self.hotel_features.set_rating(hotel, experience, rating)
+        return self._commit()
+
+    def _apply(self, op, args):
+        with self.lock.write():
+            return getattr(self, '_' + op)(*args)
+
+    @contextmanager
+    def _log_locked(self):
+        """The log opened for appending, under an exclusive lock shared with the other workers"""
+        if self.log_path is None:
+            yield None
+            return
+        with open(self.log_path, 'a', encoding='utf-8') as log:
+            fcntl.flock(log, fcntl.LOCK_EX)
+            try:
+                yield log
+            finally:
+                fcntl.flock(log, fcntl.LOCK_UN)
+
+    def _replay(self):
+        """Apply the complete log lines after _log_offset; returns how many were applied"""
+        if self.log_path is None or not os.path.exists(self.log_path):
+            return 0
+        applied = 0
+        with open(self.log_path, 'rb') as log:
+            log.seek(self._log_offset)
+            for line in log:
+                # Yarım satır henüz yazılmakta olan bir kayıttır; bir sonraki turda okunur
+                if not line.endswith(b'\n'):
+                    break
+                self._log_offset += len(line)
+                entry = json.loads(line)
+                try:
+                    self._apply(entry['op'], entry['args'])
+                    applied += 1
+                except (LookupError, ValueError) as e:
+                    # Yazıldığı sırada geçerliydi; aynı sırayla uygulandığı için buraya düşmemeli
+                    print(f"Graph write log entry skipped: {entry} ({str(e)})")
+        return applied
+
+    def _write(self, op, *args):
+        with self._apply_lock:
+            with self._log_locked() as log:
+                # Diğer işçilerin yazmaları önce uygulanır, doğrulama hepsinde aynı grafa karşı yapılır
+                self._replay()
+                result = self._apply(op, args)
+                if log is not None:
+                    log.write(json.dumps({'op': op, 'args': list(args)}, ensure_ascii=False) + '\n')
+                    log.flush()
+                    os.fsync(log.fileno())
+                    self._log_offset = log.tell()
+        self._schedule_flush()
+        return result
+
+    def add_user(self, name, email):
+        return self._write('add_user', name, email)
+
+    def add_hotel(self, hotel_id, name, rating, location_id=None):
+        return self._write('add_hotel', hotel_id, name, rating, location_id)
+
+    def add_stay(self, user_email, hotel_id, rating):
+        """Add or update a STAYED_AT edge"""
+        return self._write('add_stay', user_email, hotel_id, rating)
+
+    def add_like(self, user_email, experience_id):
+        """Add a LIKES edge"""
+        return self._write('add_like', user_email, experience_id)
+
+    def add_hotel_experience(self, hotel_id, experience_id, rating):
+        """Add or update a HAS_EXPERIENCE edge"""
+        return self._write('add_hotel_experience', hotel_id, experience_id, rating)
+
+    def replay(self):
+        """Apply the writes other workers logged since the last call; returns how many were applied"""
+        with self._apply_lock:
+            applied = self._replay()
+        if applied:
+            self._schedule_flush()
+        return applied
+
+    def _schedule_flush(self):
+        if not self.flush_interval:
+            self.flush()
+            return
+        with self._flush_lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        """Bring the collaborative matrices, PageRank and on_change up to date with all writes so far"""
+        with self._flush_run_lock:
+            with self._flush_lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                if not self._dirty:
+                    return None
+                pending, self._pending = self._pending, self._no_updates()
+                self._dirty = False
+                version = graph_version(self.G)
+            # One matrix copy for the whole batch; writes go on meanwhile
+            self.collaborative_model.apply_updates(**pending, version=version)
+        self.pagerank_store.schedule_refresh()
+        if self.on_change is not None:
+            self.on_change(version)
+        return version
+
+    def _follow(self, interval):
+        while True:
+            try:
+                self.replay()
+            except Exception as e:
+                print(f"Graph write log replay error: {str(e)}")
+            time.sleep(interval)
+
+    def follow(self, interval=1.0):
+        """Replay the log every interval seconds in a background thread"""
+        if self.log_path is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._follow, args=(interval,), daemon=True)
+            self._thread.start()
+
+
+def graph_reading(lock):
+    """lock.read(), or nothing when the graph is not written to"""
+    return lock.read() if lock is not None else nullcontext()
@@ -0,0 +1,170 @@
+import threading
+import numpy as np
+
+
+class HotelFeatures:
+    """
+    Column arrays over every hotel for vectorized scoring.
+
+    Hotels are numbered by their position in graph order (GraphIndex.hotel_position).
+    The hotel x experience ratings are kept column-wise: for every experience
+    the positions of the hotels linked to it, ascending, and the edge ratings.
+    Hotel ratings and LOCATED_IN membership sit alongside, so a request scores
+    all candidates with a handful of NumPy operations.
+
+    Updates build new arrays and swap them in as one tuple, so a request that
+    is already scoring keeps a consistent view.
+    """
+
+    def __init__(self, hotels, experiences, columns, hotel_ratings, locations, hotel_position):
+        self._lock = threading.Lock()
+        self.hotel_position = hotel_position
+        self.experience_col = {exp: i for i, exp in enumerate(experiences)}
+        self.location_row = {loc: i for i, loc in enumerate(locations)}
+        # (hotels, column hotel positions, column ratings, hotel ratings, location hotel positions)
+        self._state = (
+            np.asarray(hotels),
+            [np.asarray(positions, dtype=np.int64) for positions, _ in columns],
+            [np.asarray(ratings, dtype=np.float64) for _, ratings in columns],
+            np.asarray(hotel_ratings, dtype=np.float64),
+            [np.asarray(positions, dtype=np.int64) for positions in locations.values()],
+        )
+        # Per-hotel arrays derived from the current PageRank scores / personalized PageRank matrix
+        self._pagerank = (None, None)
+        self._experience_pagerank = (None, None)
+
+    @classmethod
+    def from_graph(cls, G, index):
+        hotels = list(index.nodes_by_type['Hotel'])
+        position = index.hotel_position
+        columns = []
+        for exp in index.nodes_by_type['Experience']:
+            linked = index.experience_hotels.get(exp, [])
+            columns.append(([position[hotel] for hotel in linked],
+                            [G[hotel][exp].get('rating', 0) for hotel in linked]))
+        hotel_ratings = [G.nodes[hotel].get('rating', 0) for hotel in hotels]
+        locations = {loc: [position[hotel] for hotel in linked]
+                     for loc, linked in index.location_hotels.items()}
+        return cls(hotels, index.nodes_by_type['Experience'], columns, hotel_ratings, locations, position)
+
+    @property
+    def hotels(self):
+        return self._state[0]
+
+    def add_hotel(self, hotel, rating, location=None):
+        """Append a new hotel; its position must be the next one in hotel_position"""
+        with self._lock:
+            hotels, col_hotels, col_ratings, hotel_ratings, location_hotels = self._state
+            p = len(hotels)
+            location_hotels = list(location_hotels)
+            if location is not None:
+                if location not in self.location_row:
+                    self.location_row[location] = len(location_hotels)
+                    location_hotels.append(np.empty(0, dtype=np.int64))
+                row = self.location_row[location]
+                location_hotels[row] = np.append(location_hotels[row], p)
+            self._state = (np.append(hotels, hotel), col_hotels, col_ratings,
+                           np.append(hotel_ratings, float(rating or 0)), location_hotels)
+
+    def set_rating(self, hotel, exp, rating):
+        """Add or update the rating of a hotel -> experience edge"""
+        with self._lock:
+            hotels, col_hotels, col_ratings, hotel_ratings, location_hotels = self._state
+            col = self.experience_col[exp]
+            p = self.hotel_position[hotel]
+            positions, ratings = col_hotels[col], col_ratings[col].copy()
+            i = int(np.searchsorted(positions, p))
+            if i < len(positions) and positions[i] == p:
+                ratings[i] = rating
+            else:
+                positions, ratings = np.insert(positions, i, p), np.insert(ratings, i, rating)
+            col_hotels, col_ratings = list(col_hotels), list(col_ratings)
+            col_hotels[col], col_ratings[col] = positions, ratings
+            self._state = (hotels, col_hotels, col_ratings, hotel_ratings, location_hotels)
+
+    def pagerank_array(self, normalized_scores):
+        """Normalized PageRank of every hotel, cached per score dict (one per PageRank version)"""
+        hotels = self.hotels
+        cached_scores, array = self._pagerank
+        if cached_scores is not normalized_scores or len(array) != len(hotels):
+            array = np.fromiter((normalized_scores.get(hotel, 0.0) for hotel in hotels.tolist()),
+                                dtype=np.float64, count=len(hotels))
+            self._pagerank = (normalized_scores, array)
+        return array
+
+    def experience_pagerank_columns(self, experience_pagerank):
+        """ExperiencePageRank matrix column of every hotel, cached per matrix"""
+        hotels = self.hotels
+        cached_matrix, columns = self._experience_pagerank
+        if cached_matrix is not experience_pagerank or len(columns) != len(hotels):
+            columns = experience_pagerank.columns(hotels.tolist())
+            self._experience_pagerank = (experience_pagerank, columns)
+        return columns
+
+    def candidates(self, experience_nodes, location_node=None):
+        """Positions of hotels linked to any of the experiences, optionally within a location, ascending"""
+        _, col_hotels, _, _, location_hotels = self._state
+        groups = [col_hotels[self.experience_col[exp]] for exp in experience_nodes if exp in self.experience_col]
+        positions = np.unique(np.concatenate(groups)) if groups else np.empty(0, dtype=np.int64)
+        if location_node is not None:
+            row = self.location_row.get(location_node)
+            positions = (np.intersect1d(positions, location_hotels[row], assume_unique=False)
+                         if row is not None else positions[:0])
+        return positions
+
+    def score(self, positions, selected, normalized_pagerank, collaborative):
+        """
+        Weighted final score of the hotels at `positions` (ascending).
+
+        selected: [(experience_node, importance), ...] in request order, repeats included
+        normalized_pagerank, collaborative: arrays aligned with positions
+        Returns (final_score, experience_count, avg_experience_rating, per-experience ratings),
+        where the ratings array has one row per selected experience and NaN where there is no edge.
+        Additions happen in the same order as the per-hotel loop, so results are bit-identical.
+        """
+        _, col_hotels, col_ratings, hotel_ratings, _ = self._state
+        n = len(positions)
+        total = np.zeros(n)
+        weighted = np.zeros(n)
+        count = np.zeros(n, dtype=np.int64)
+        ratings = np.full((len(selected), n), np.nan)
+        for i, (exp, importance) in enumerate(selected):
+            col = self.experience_col.get(exp)
+            if col is None:
+                continue
+            hit = np.searchsorted(positions, col_hotels[col])
+            linked = hit < n
+            linked[linked] = positions[hit[linked]] == col_hotels[col][linked]
+            rows, values = hit[linked], col_ratings[col][linked]
+            total[rows] += values
+            weighted[rows] += values * (importance / 5)
+            count[rows] += 1
+            ratings[i, rows] = values
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = total / count
+            selected_score = weighted / count
+        final = (
+            avg * 0.25 +
+            selected_score * 0.35 +
+            normalized_pagerank * 0.15 +
+            hotel_ratings[positions] * 0.1 +
+            collaborative * 0.15
+        )
+        return final, count, avg, ratings
+
+
+def top_k_order(scores, k=None):
+    """
+    Indexes of the k highest scores, highest first; equal scores keep their
+    original order, exactly like a stable sort in reverse.
+    """
+    if k is None or k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    threshold = scores[np.argpartition(-scores, k - 1)[:k]].min()
+    above = np.flatnonzero(scores > threshold)
+    ties = np.flatnonzero(scores == threshold)[:k - len(above)]
+    chosen = np.sort(np.concatenate([above, ties]))
+    return chosen[np.argsort(-scores[chosen], kind='stable')]
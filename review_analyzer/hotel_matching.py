@@ -0,0 +1,78 @@
+"""
+Link review files to hotel ids.
+
+Review files, harvested places and spreadsheet rows name their hotel in
+many ways ('aska_lara.txt', 'Aska Lara Resort & Spa'). Every name is turned
+into a hotel key (sentiment.name_key) and linked to a hotel_id of
+hotel_list.xlsx / the graph by, in order:
+
+1. ALIASES, for keys that share too little with the hotel's name,
+2. the exact key of a hotel name,
+3. word prefixes: after dropping GENERIC_WORDS, the key and the hotel name
+   start with the same two or more words (or are equal), and no other hotel
+   does. 'delphin_imperial_hotel' -> 'Delphin Imperial',
+   'aska_lara' -> 'Aska Lara Resort & Spa'.
+
+Keys that none of these link are returned, so callers can report them.
+"""
+import os
+import pandas as pd
+from sentiment import name_key
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+HOTEL_LIST_PATH = os.path.join(BASE_PATH, '..', 'hotel_list.xlsx')
+
+# Dosya adı otel adından çok farklı olan oteller
+ALIASES = {
+    'lara_barut_collection': 164,           # Barut Lara Collection
+    'limak_lara_deluxe_hotel_resort': 185,  # Limak Lara De Luxe Resort
+    'modern_saraylar_luxury_hotel': 8448,   # Modern Saraylar Hotel (Nonalcohol)
+    'xafira_deluxe_resort': 5630,           # Alan Xafira Deluxe Resort & Spa
+}
+GENERIC_WORDS = frozenset({'hotel', 'hotels', 'resort', 'spa', 'and', 'the'})
+MIN_PREFIX_WORDS = 2
+
+
+def read_hotel_list(path=HOTEL_LIST_PATH):
+    """[(hotel_id, name)] of hotel_list.xlsx"""
+    table = pd.read_excel(path)
+    return [(int(hotel_id), str(name)) for hotel_id, name in zip(table['hotel_id'], table['name'])]
+
+
+def significant_words(key):
+    return [word for word in key.split('_') if word and word not in GENERIC_WORDS]
+
+
+def prefix_match(words, other):
+    if words == other:
+        return bool(words)
+    shared = min(len(words), len(other))
+    return shared >= MIN_PREFIX_WORDS and words[:shared] == other[:shared]
+
+
+def link_hotels(keys, hotels, aliases=ALIASES):
+    """
+    Link hotel keys to the hotels [(hotel_id, name)].
+    Returns ({key: hotel_id} of the linked keys, sorted list of the keys left unlinked).
+    """
+    known = {hotel_id for hotel_id, _ in hotels}
+    exact = {}
+    for hotel_id, name in hotels:
+        exact.setdefault(name_key(name), hotel_id)
+    hotel_words = [(hotel_id, significant_words(name_key(name))) for hotel_id, name in hotels]
+
+    linked, unlinked = {}, []
+    for key in set(keys):
+        if key in aliases and aliases[key] in known:
+            linked[key] = aliases[key]
+        elif key in exact:
+            linked[key] = exact[key]
+        else:
+            words = significant_words(key)
+            candidates = {hotel_id for hotel_id, other in hotel_words if prefix_match(words, other)}
+            # Birden fazla otele uyan anahtar tahmin edilmez
+            if len(candidates) == 1:
+                linked[key] = candidates.pop()
+            else:
+                unlinked.append(key)
+    return linked, sorted(unlinked)
@@ -0,0 +1,219 @@
+"""
+Import the existing review files into the review store.
+
+- comments1/ and translated_comments/: numbered reviews, joined on hotel and
+  review number into original_text / translated_text
+- final_results/: English reviews per category, review ids '<category>#<n>'
+- sentiment_scores/<hotel>.npz: scores of the reviews above, when present
+- harvested_reviews/*.jsonl: reviews from review_harvester.py, ids '<author>@<time>'
+- hotel_reviews.xlsx, results_with_reviews.xlsx, yeni.xlsx, google_reviews_100.xlsx
+
+hotel_id comes from hotel_list.xlsx, linked with hotel_matching (aliases,
+exact name, word prefixes), and place_id from hotel_place_ids.xlsx by that
+hotel_id; reviews are partitioned by the key of the hotel_list name. Reviews
+whose hotel cannot be linked are listed and left out, unless
+--allow-unlinked imports them without a hotel_id. Reviews without an id of
+their own get the first 16 hex digits of the SHA-256 of their text. The
+store skips review ids it already has, so importing again only adds what is
+new.
+
+Usage: python import_reviews.py --store ../review_store
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+import pandas as pd
+from hotel_matching import link_hotels, read_hotel_list
+from review_store import SCHEMA, ReviewStore
+from sentiment import SCORE_COLUMNS, hotel_key, load_table, name_key, split_reviews
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BASE_PATH, '..')
+# hotel_reviews.xlsx, analyzed_comments.py ve places_api.py içindeki otelin yorumlarıdır
+HOTEL_REVIEWS_PLACE_ID = 'ChIJu7meXwiQwxQRf_D18DMeZIk'
+# Otel adı da place_id'si de olmayan yorumlar
+UNNAMED = '(otel adı yok)'
+
+
+def text_id(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class Rows:
+    """Column lists in SCHEMA order, filled one review at a time"""
+
+    def __init__(self, hotels, places, allow_unlinked=False):
+        self.columns = {name: [] for name, _ in SCHEMA}
+        self.hotels = hotels
+        self.hotel_names = dict(hotels)
+        self.places = places
+        self.place_hotels = {place_id: hotel_id for hotel_id, place_id in places.items()}
+        self.allow_unlinked = allow_unlinked
+        self.links = {}
+        # {hotel key or place id: reviews} of the hotels that could not be linked
+        self.unlinked = Counter()
+        # Reviews read per source directory or spreadsheet, and the files that had none
+        self.read = Counter()
+        self.empty_files = []
+
+    def count(self, source, path, reviews):
+        self.read[source] += reviews
+        if not reviews:
+            self.empty_files.append(os.path.relpath(path))
+
+    def hotel_id(self, key):
+        if key not in self.links:
+            self.links[key] = link_hotels([key], self.hotels)[0].get(key)
+        return self.links[key]
+
+    def add(self, hotel=None, place_id=None, scores=None, **values):
+        key = name_key(hotel) if isinstance(hotel, str) else ''
+        hotel_id = self.hotel_id(key) if key else None
+        if hotel_id is None:
+            hotel_id = self.place_hotels.get(place_id)
+        if hotel_id is None:
+            self.unlinked[key or place_id or UNNAMED] += 1
+            if not self.allow_unlinked:
+                return
+        else:
+            # Aynı otelin farklı adlarla gelen yorumları tek bölüme yazılır
+            key = name_key(self.hotel_names[hotel_id])
+        values.update(hotel=key or None,
+                      hotel_id=hotel_id,
+                      place_id=place_id or self.places.get(hotel_id))
+        for name, value in zip(SCORE_COLUMNS, scores or ()):
+            values[name] = value
+        for name, column in self.columns.items():
+            column.append(values.get(name))
+
+    def __len__(self):
+        return len(self.columns['review_id'])
+
+
+def read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def text_corpora(rows, root, scores_dir):
+    """comments1 + translated_comments joined per review, final_results per category"""
+    reviews = defaultdict(dict)
+    for source, column in (('comments1', 'original_text'), ('translated_comments', 'translated_text')):
+        for path in sorted(glob.glob(os.path.join(root, source, '*.txt'))):
+            found = split_reviews(read_text(path))
+            rows.count(source, path, len(found))
+            for review_id, _, text in found:
+                reviews[hotel_key(path), review_id][column] = text
+    category_reviews = []
+    for path in sorted(glob.glob(os.path.join(root, 'final_results', '*.txt'))):
+        found = split_reviews(read_text(path))
+        rows.count('final_results', path, len(found))
+        for review_id, _, text in found:
+            category_reviews.append((hotel_key(path), review_id, text))
+
+    scores = {}
+    for hotel in {hotel for hotel, _ in reviews} | {hotel for hotel, _, _ in category_reviews}:
+        table = load_table(os.path.join(scores_dir, hotel + '.npz'))
+        if table is not None:
+            for i, (review_id, source) in enumerate(zip(table['review_id'], table['source'])):
+                scores[hotel, source, review_id] = [float(table[column][i]) for column in SCORE_COLUMNS]
+
+    for (hotel, review_id), texts in reviews.items():
+        rows.add(hotel=hotel, review_id=review_id, scores=scores.get((hotel, 'translated_comments', review_id)),
+                 **texts)
+    for hotel, review_id, text in category_reviews:
+        rows.add(hotel=hotel, review_id=review_id, translated_text=text,
+                 scores=scores.get((hotel, 'final_results', review_id)))
+
+
+def harvested(rows, harvest_dir):
+    for path in sorted(glob.glob(os.path.join(harvest_dir, '*.jsonl'))):
+        found = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    review = json.loads(line)
+                except ValueError:
+                    continue
+                found += 1
+                rows.add(hotel=review.get('hotel'), place_id=review['place_id'],
+                         review_id=f"{review['author']}@{review['time']}", date=review.get('date'),
+                         rating=review.get('rating'), original_text=review.get('text', ''))
+        rows.count('harvested_reviews', path, found)
+
+
+def spreadsheets(rows, root):
+    path = os.path.join(root, 'hotel_reviews.xlsx')
+    if os.path.exists(path):
+        table = pd.read_excel(path)[['Date', 'Rating', 'Review']]
+        rows.count(os.path.basename(path), path, len(table))
+        for date, rating, text in table.itertuples(index=False):
+            rows.add(place_id=HOTEL_REVIEWS_PLACE_ID, review_id=text_id(str(text)), date=str(date)[:10],
+                     rating=float(rating), original_text=str(text))
+    # Rating sütunu otelin puanıdır, yorumun değil
+    for name in ('results_with_reviews.xlsx', 'yeni.xlsx'):
+        path = os.path.join(root, name)
+        if os.path.exists(path):
+            table = pd.read_excel(path)[['Name', 'Reviews']].dropna()
+            rows.count(name, path, len(table))
+            for hotel, text in table.itertuples(index=False):
+                rows.add(hotel=hotel, review_id=text_id(str(text)), original_text=str(text))
+    path = os.path.join(root, 'google_reviews_100.xlsx')
+    if os.path.exists(path):
+        texts = pd.read_excel(path)['Review2'].dropna()
+        rows.count(os.path.basename(path), path, len(texts))
+        for text in texts:
+            rows.add(review_id=text_id(str(text)), original_text=str(text))
+
+
+def place_ids(path, hotels):
+    """{hotel_id: place_id}; the place id table has one row per hotel_list.xlsx row"""
+    table = pd.read_excel(path)
+    names = [name_key(str(name)) for name in table['Hotel Name']]
+    linked, _ = link_hotels(names, hotels)
+    return {linked[key]: place_id for key, place_id in zip(names, table['Place ID'])
+            if key in linked and isinstance(place_id, str) and place_id != 'N/A'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import review files into the columnar review store")
+    parser.add_argument('--root', default=ROOT, help="Directory with the review files")
+    parser.add_argument('--store', default=os.path.join(ROOT, 'review_store'))
+    parser.add_argument('--scores', default=os.path.join(ROOT, 'sentiment_scores'))
+    parser.add_argument('--harvested', default=os.path.join(ROOT, 'harvested_reviews'))
+    parser.add_argument('--allow-unlinked', action='store_true',
+                        help="Also import reviews whose hotel is not in hotel_list.xlsx, without a hotel_id")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    hotels = read_hotel_list(os.path.join(args.root, 'hotel_list.xlsx'))
+    rows = Rows(hotels, place_ids(os.path.join(args.root, 'hotel_place_ids.xlsx'), hotels), args.allow_unlinked)
+    text_corpora(rows, args.root, args.scores)
+    harvested(rows, args.harvested)
+    spreadsheets(rows, args.root)
+
+    print("Okunan yorumlar:")
+    for source, count in sorted(rows.read.items()):
+        print(f"  {source}: {count} yorum")
+    if rows.empty_files:
+        print(f"Uyarı: {len(rows.empty_files)} dosyada yorum bulunamadı, biçimi tanınmadı:")
+        for path in rows.empty_files:
+            print(f"  {path}")
+    if rows.unlinked:
+        action = "hotel_id olmadan yazılacak" if args.allow_unlinked else "atlandı"
+        print(f"Uyarı: {len(rows.unlinked)} otel hotel_list.xlsx ile eşleşmedi, "
+              f"{sum(rows.unlinked.values())} yorumu {action} (hotel_matching.ALIASES'a eklenebilir):")
+        for name, count in sorted(rows.unlinked.items()):
+            print(f"  {name}: {count} yorum")
+    written, duplicates = ReviewStore(args.store).append(rows.columns)
+    print(f"{len(rows)} yorum okundu: {written} yazıldı, {duplicates} zaten vardı "
+          f"({time.perf_counter() - started:.1f} sn)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import threading
+from contextlib import nullcontext
+import networkx as nx
+
+
+def graph_version(G):
+    """Return the mutation counter kept on the graph"""
+    return G.graph.get('version', 0)
+
+
+def bump_graph_version(G):
+    """Mark the graph as changed so derived structures get refreshed"""
+    G.graph['version'] = graph_version(G) + 1
+    return G.graph['version']
+
+
+def normalize_scores(scores, scale=10):
+    """Scale scores so the highest one equals `scale`"""
+    max_score = max(scores.values()) if scores else 0
+    if not max_score:
+        return {node: 0.0 for node in scores}
+    return {node: (score / max_score) * scale for node, score in scores.items()}
+
+
+class PageRankStore:
+    """
+    Weighted PageRank cached per graph version.
+
+    Scores are computed once when the store is created and only recomputed
+    after the graph version changes. With background=True the recomputation
+    runs in a worker thread and the previous scores keep being served until
+    the new ones are ready. Recomputations are warm-started from the previous
+    vector, so a small change converges in a few iterations.
+
+    scores=(scores, normalized) seeds the store with precomputed values for
+    the current graph version instead of computing them. With a graph_lock
+    (graph_writer.GraphLock) background refreshes read the graph under its
+    read side, so writes never change it mid-iteration.
+    """
+
+    def __init__(self, G, weight='rating', background=True, scores=None, graph_lock=None):
+        self.G = G
+        self.weight = weight
+        self.background = background
+        self.graph_lock = graph_lock
+        self._lock = threading.Lock()
+        self._worker = None
+        # (version, scores, normalized) is swapped as a single tuple so readers
+        # never see scores and normalized values from different versions
+        self._state = (None, {}, {})
+        if scores is not None:
+            self._state = (graph_version(G),) + tuple(scores)
+        else:
+            self.refresh()
+
+    @property
+    def version(self):
+        return self._state[0]
+
+    def refresh(self):
+        """Recompute PageRank synchronously for the current graph version"""
+        version = graph_version(self.G)
+        _, previous, _ = self._state
+        nstart = None
+        if previous:
+            # New nodes start from the uniform value; nstart is renormalized by networkx
+            default = 1.0 / max(len(self.G), 1)
+            nstart = {node: previous.get(node, default) for node in self.G}
+        scores = nx.pagerank(self.G, weight=self.weight, nstart=nstart)
+        self._state = (version, scores, normalize_scores(scores))
+
+    def _refresh_worker(self):
+        try:
+            with self.graph_lock.read() if self.graph_lock is not None else nullcontext():
+                self.refresh()
+        except Exception as e:
+            print(f"PageRank refresh error: {str(e)}")
+
+    def schedule_refresh(self):
+        """Start a background refresh unless one is already running"""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._refresh_worker, daemon=True)
+            self._worker.start()
+
+    def current(self):
+        """Return (scores, normalized_scores), refreshing them if the graph changed"""
+        if self._state[0] != graph_version(self.G):
+            if self.background:
+                self.schedule_refresh()
+            else:
+                self.refresh()
+        _, scores, normalized = self._state
+        return scores, normalized
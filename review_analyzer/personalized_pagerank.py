@@ -0,0 +1,124 @@
+"""
+Personalized PageRank of every hotel for each Experience node.
+
+The vectors are computed offline when the graph snapshot is compiled and kept
+in it as a float32 experiences x hotels matrix. A request combines the rows of
+the experiences it asks for, weighted by their importance, with a single small
+dense product, so a hotel's graph score depends on what the user is looking for.
+"""
+import numpy as np
+import networkx as nx
+from scipy import sparse
+
+
+def transition_matrix(G, nodelist, weight='rating'):
+    """Row-normalized weighted adjacency of G and the dangling-node mask"""
+    position = {node: i for i, node in enumerate(nodelist)}
+    rows, cols, values = [], [], []
+    for u, v, w in G.edges(data=weight, default=1):
+        rows.extend((position[u], position[v]))
+        cols.extend((position[v], position[u]))
+        values.extend((w, w))
+    n = len(nodelist)
+    A = sparse.csr_matrix((np.asarray(values, dtype=np.float64), (rows, cols)), shape=(n, n))
+    out_weight = np.asarray(A.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+    return sparse.diags(inverse) @ A, dangling
+
+
+def personalized_pagerank(G, sources, weight='rating', alpha=0.85, max_iter=100, tol=1.0e-06):
+    """
+    PageRank of G personalized on each node in sources, as a len(sources) x len(G)
+    array in graph node order. Same iteration as networkx.pagerank with
+    personalization={source: 1}, run for all sources at once.
+    """
+    nodelist = list(G)
+    n = len(nodelist)
+    position = {node: i for i, node in enumerate(nodelist)}
+    A, dangling = transition_matrix(G, nodelist, weight)
+    AT = A.T.tocsr()
+
+    # Restart (and dangling) distribution of every source
+    P = np.zeros((len(sources), n))
+    P[np.arange(len(sources)), [position[source] for source in sources]] = 1.0
+    X = np.full((len(sources), n), 1.0 / n)
+    for _ in range(max_iter):
+        previous = X
+        X = alpha * ((AT @ X.T).T + X[:, dangling].sum(axis=1, keepdims=True) * P) + (1 - alpha) * P
+        if (np.abs(X - previous).sum(axis=1) < n * tol).all():
+            return X
+    raise nx.PowerIterationFailedConvergence(max_iter)
+
+
+class ExperiencePageRank:
+    """
+    Experience x hotel personalized PageRank matrix.
+
+    Computed offline from the graph; hotels added afterwards through the write
+    endpoints score 0 until the matrix is recompiled with the snapshot.
+    """
+
+    def __init__(self, experiences, hotels, matrix, positions=None):
+        self.experiences = experiences
+        self.hotels = hotels
+        self.matrix = matrix
+        if positions is None:
+            positions = tuple({node: i for i, node in enumerate(nodes)} for nodes in (experiences, hotels))
+        self.experience_row, self.hotel_col = positions
+
+    @classmethod
+    def from_graph(cls, G, index, weight='rating'):
+        experiences = list(index.nodes_by_type['Experience'])
+        hotels = list(index.nodes_by_type['Hotel'])
+        if not experiences:
+            return cls(experiences, hotels, np.zeros((0, len(hotels)), dtype=np.float32))
+        scores = personalized_pagerank(G, experiences, weight)
+        position = {node: i for i, node in enumerate(G)}
+        return cls(experiences, hotels, scores[:, [position[hotel] for hotel in hotels]].astype(np.float32))
+
+    def _combined(self, experience_weights):
+        """Importance-weighted sum of the experience rows and its maximum"""
+        rows, weights = [], []
+        for exp_node, importance in experience_weights.items():
+            row = self.experience_row.get(exp_node)
+            if row is not None:
+                rows.append(row)
+                weights.append(importance)
+        combined = np.asarray(weights, dtype=np.float32) @ self.matrix[rows] if rows else None
+        max_score = combined.max() if combined is not None and len(combined) else 0
+        return combined, max_score
+
+    def scores(self, experience_weights, hotel_nodes, scale=10):
+        """
+        Importance-weighted personalized PageRank of each hotel in hotel_nodes,
+        scaled so the best hotel overall scores `scale`.
+        experience_weights: {experience_node: importance}
+        """
+        combined, max_score = self._combined(experience_weights)
+        if not max_score:
+            return dict.fromkeys(hotel_nodes, 0.0)
+
+        n = len(combined)
+        known = [h for h in hotel_nodes if self.hotel_col.get(h, n) < n]
+        values = combined[[self.hotel_col[h] for h in known]] / max_score * scale
+        scores = dict.fromkeys(hotel_nodes, 0.0)
+        scores.update(zip(known, values.tolist()))
+        return scores
+
+    def columns(self, hotel_nodes):
+        """Matrix column of each hotel, -1 for hotels added after the matrix was computed"""
+        columns = np.fromiter((self.hotel_col.get(h, -1) for h in hotel_nodes),
+                              dtype=np.int64, count=len(hotel_nodes))
+        columns[columns >= self.matrix.shape[1]] = -1
+        return columns
+
+    def score_array(self, experience_weights, columns, scale=10):
+        """Same values as scores(), as a float64 array over hotels given by their columns()"""
+        combined, max_score = self._combined(experience_weights)
+        values = np.zeros(len(columns))
+        if not max_score:
+            return values
+        known = columns >= 0
+        values[known] = combined[columns[known]] / max_score * scale
+        return values
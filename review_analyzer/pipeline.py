@@ -0,0 +1,384 @@
+"""
+End-to-end review pipeline: raw reviews in comments1/ -> one table per hotel.
+
+Reviews stream through the stages as generators, one review at a time:
+
+    read -> clean -> translate -> correct -> preprocess -> score
+
+Every stage keeps a checkpoint per hotel (<work>/<stage>/<hotel>.jsonl) that
+maps the SHA-256 of its input to its output, appended as results come in.
+A rerun, or a run after a crash, takes everything it has seen before from
+the checkpoints and only runs the stages on new or changed reviews; hotels
+whose raw file did not change at all are skipped. Hotels run in parallel on
+a process pool and the run ends with the throughput of every stage.
+
+preprocess keeps its result next to the text instead of replacing it: VADER
+needs the casing, punctuation and full words that preprocessing removes, so
+score reads the corrected text.
+
+The result is <output>/<hotel>.npz with the columns review_id, hash, text,
+processed, neg, neu, pos and compound.
+
+Usage: python pipeline.py --workers 4 --backend google
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from translator import (TranslationCache, TranslationService, clean_text, load_backend, split_text,
+                        write_atomic)
+from word_correction import CorrectionCache, correct_line, known_words
+from preprocessing import Preprocessor
+from sentiment import SCORE_COLUMNS, hotel_key, save_table
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+STAGES = ('clean', 'translate', 'correct', 'preprocess', 'score')
+REVIEW_START = re.compile(r'^(\d+)\. (?:Comment|Yorum):\s*')
+
+Review = namedtuple('Review', ['review_id', 'hash', 'text', 'processed', 'scores'])
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_reviews(path):
+    """Reviews of a raw file, read line by line; every review starts with 'N. Yorum:'"""
+    review_id, lines = None, []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = REVIEW_START.match(line)
+            if match:
+                if review_id is not None:
+                    text = ''.join(lines).strip()
+                    yield Review(review_id, text_hash(text), text, None, None)
+                review_id, lines = match.group(1), [line[match.end():]]
+            elif review_id is not None:
+                lines.append(line)
+    if review_id is not None:
+        text = ''.join(lines).strip()
+        yield Review(review_id, text_hash(text), text, None, None)
+
+
+class Checkpoint:
+    """
+    Outputs of one stage for one hotel, keyed by the SHA-256 of the stage input.
+    New outputs are appended as JSON lines right away; close() rewrites the
+    file with only the entries used by this run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.previous = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut off by a crash
+                        continue
+                    self.previous[entry['key']] = entry['value']
+        self.current = {}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def get(self, key):
+        return self.current.get(key, self.previous.get(key))
+
+    def keep(self, key, value):
+        self.current[key] = value
+
+    def put(self, key, value):
+        self.current[key] = value
+        self._file.write(json.dumps({'key': key, 'value': value}, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self, compact=True):
+        self._file.close()
+        if compact:
+            write_atomic(self.path, ''.join(
+                json.dumps({'key': key, 'value': value}, ensure_ascii=False) + '\n'
+                for key, value in self.current.items()
+            ))
+
+
+class Stage:
+    """
+    One pipeline step from review field `source` to review field `target`.
+    submit() may start the work in the background; result() waits for it.
+    Up to `window` reviews are submitted before the first result is needed.
+    """
+
+    source = 'text'
+    target = 'text'
+    window = 1
+
+    def process(self, value):
+        raise NotImplementedError
+
+    def submit(self, value):
+        return self.process(value)
+
+    def result(self, handle):
+        return handle
+
+
+class CleanStage(Stage):
+    name = 'clean'
+
+    def process(self, text):
+        return clean_text(text)
+
+
+class TranslateStage(Stage):
+    name = 'translate'
+    window = 32
+
+    def __init__(self, service):
+        self.service = service
+
+    def submit(self, text):
+        return [self.service.submit(chunk) for chunk in split_text(text)]
+
+    def result(self, futures):
+        return ''.join(future.result() for future in futures)
+
+
+class CorrectStage(Stage):
+    """Memoized spell correction; words corrected here are reported in `learned`"""
+
+    name = 'correct'
+
+    def __init__(self, corrections, language='en', distance=2):
+        self.corrections = corrections
+        self.language = language
+        self.distance = distance
+        self.learned = {}
+        self._spell = None
+
+    def process(self, text):
+        missing = {word for word in text.split() if word not in self.corrections}
+        if missing:
+            if self._spell is None:
+                from spellchecker import SpellChecker
+                self._spell = SpellChecker(language=self.language, distance=self.distance)
+            known = known_words(self._spell, missing)
+            for word in missing:
+                correction = word if word in known else self._spell.correction(word)
+                self.corrections[word] = self.learned[word] = correction
+        return correct_line(text, self.corrections)
+
+
+class PreprocessStage(Stage):
+    name = 'preprocess'
+    target = 'processed'
+
+    def __init__(self):
+        self.preprocessor = Preprocessor()
+
+    def process(self, text):
+        return self.preprocessor.process(text)
+
+
+class ScoreStage(Stage):
+    name = 'score'
+    target = 'scores'
+
+    def __init__(self):
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        self.analyzer = SentimentIntensityAnalyzer()
+
+    def process(self, text):
+        score = self.analyzer.polarity_scores(text)
+        return [score[column] for column in SCORE_COLUMNS]
+
+
+def run_stage(stage, reviews, checkpoint, stats):
+    """Apply stage to a stream of reviews; inputs seen before are answered from the checkpoint"""
+    pending = deque()
+
+    def finish(review, key, handle):
+        if handle is None:
+            value = checkpoint.get(key)
+            checkpoint.keep(key, value)
+            stats[1] += 1
+        else:
+            started = time.perf_counter()
+            value = stage.result(handle)
+            stats[2] += time.perf_counter() - started
+            checkpoint.put(key, value)
+        stats[0] += 1
+        return review._replace(**{stage.target: value})
+
+    for review in reviews:
+        key = text_hash(getattr(review, stage.source))
+        handle = None
+        if checkpoint.get(key) is None:
+            started = time.perf_counter()
+            handle = stage.submit(getattr(review, stage.source))
+            stats[2] += time.perf_counter() - started
+        pending.append((review, key, handle))
+        if len(pending) >= stage.window:
+            yield finish(*pending.popleft())
+    while pending:
+        yield finish(*pending.popleft())
+
+
+# Stages live once per pool process
+_stages = None
+
+def _init_worker(config):
+    global _stages
+    backend = load_backend(config['backend'])
+    service = TranslationService(
+        backend, TranslationCache(config['translation_cache'], backend.name, config['source'], config['target']),
+        source=config['source'], target=config['target'], workers=config['translation_workers'],
+        rate=config['rate'], retries=config['retries']
+    )
+    corrections = CorrectionCache(config['spell_cache'], config['language'], config['distance']).corrections
+    _stages = [CleanStage(), TranslateStage(service), CorrectStage(corrections, config['language'],
+               config['distance']), PreprocessStage(), ScoreStage()]
+
+
+def run_hotel(hotel, path, work_dir, output_dir):
+    """
+    Stream one hotel through all stages and write its table.
+    Returns (hotel, {stage: [reviews, from checkpoint, seconds]}, newly learned corrections).
+    """
+    stats = {stage.name: [0, 0, 0.0] for stage in _stages}
+    checkpoints = [Checkpoint(os.path.join(work_dir, stage.name, hotel + '.jsonl')) for stage in _stages]
+    reviews = read_reviews(path)
+    completed = False
+    try:
+        for stage, checkpoint in zip(_stages, checkpoints):
+            reviews = run_stage(stage, reviews, checkpoint, stats[stage.name])
+        reviews = list(reviews)
+        completed = True
+    finally:
+        # After a failure the partial checkpoints are kept as they are for the next run
+        for checkpoint in checkpoints:
+            checkpoint.close(compact=completed)
+
+    table = {
+        'review_id': np.array([review.review_id for review in reviews], dtype=str),
+        'hash': np.array([review.hash for review in reviews], dtype=str),
+        'text': np.array([review.text for review in reviews], dtype=str),
+        'processed': np.array([review.processed for review in reviews], dtype=str),
+    }
+    scores = np.array([review.scores for review in reviews], dtype=np.float64).reshape(len(reviews), -1)
+    for i, column in enumerate(SCORE_COLUMNS):
+        table[column] = scores[:, i] if len(reviews) else np.empty(0)
+    save_table(os.path.join(output_dir, hotel + '.npz'), table)
+
+    learned = _stages[2].learned
+    _stages[2].learned = {}
+    return hotel, stats, learned
+
+
+def run_pipeline(input_dir, work_dir, output_dir, config, workers=None, force=False):
+    """Run every changed hotel of input_dir; returns ({stage: [reviews, cached, seconds]}, {hotel: error})"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(work_dir, 'manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    jobs = {}
+    for name in sorted(os.listdir(input_dir)):
+        if not name.endswith('.txt'):
+            continue
+        path = os.path.join(input_dir, name)
+        hotel = hotel_key(name)
+        digest = file_hash(path)
+        if (not force and manifest.get(hotel) == digest and
+                os.path.exists(os.path.join(output_dir, hotel + '.npz'))):
+            continue
+        jobs[hotel] = (path, digest)
+
+    totals = {name: [0, 0, 0.0] for name in STAGES}
+    failed = {}
+    spell_cache = CorrectionCache(config['spell_cache'], config['language'], config['distance'])
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+            futures = {pool.submit(run_hotel, hotel, path, work_dir, output_dir): hotel
+                       for hotel, (path, _) in jobs.items()}
+            for future in as_completed(futures):
+                hotel = futures[future]
+                try:
+                    _, stats, learned = future.result()
+                except Exception as e:
+                    failed[hotel] = str(e)
+                    print(f"Hata: {hotel} işlenemedi: {e}")
+                    continue
+                for name, values in stats.items():
+                    totals[name] = [a + b for a, b in zip(totals[name], values)]
+                spell_cache.corrections.update(learned)
+                manifest[hotel] = jobs[hotel][1]
+                print(f"{hotel}: {stats['score'][0]} yorum")
+        spell_cache.save()
+        write_atomic(manifest_path, json.dumps(manifest, indent=1))
+    return totals, failed, len(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the review pipeline with per-stage checkpoints")
+    root = os.path.join(BASE_PATH, '..')
+    parser.add_argument('--input', default=os.path.join(root, 'comments1'))
+    parser.add_argument('--work-dir', default=os.path.join(root, '.pipeline'))
+    parser.add_argument('--output', default=os.path.join(root, 'pipeline_results'))
+    parser.add_argument('--workers', type=int, default=None, help="Hotels processed in parallel")
+    parser.add_argument('--backend', default='google', help="Translation backend: google, echo or module:Class")
+    parser.add_argument('--source', default='auto')
+    parser.add_argument('--target', default='en')
+    parser.add_argument('--rate', type=float, default=5.0, help="Translation requests per second, all workers together")
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--language', default='en', help="Spell checker language")
+    parser.add_argument('--distance', type=int, default=2)
+    parser.add_argument('--force', action='store_true', help="Also rerun hotels whose input did not change")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count()
+    config = {
+        'backend': args.backend,
+        'source': args.source,
+        'target': args.target,
+        'translation_cache': os.path.join(root, '.translation_cache'),
+        'translation_workers': 4,
+        # Every process gets its share of the translation rate limit
+        'rate': args.rate / workers,
+        'retries': args.retries,
+        'spell_cache': os.path.join(root, '.spell_cache'),
+        'language': args.language,
+        'distance': args.distance,
+    }
+    started = time.perf_counter()
+    totals, failed, hotels = run_pipeline(args.input, args.work_dir, args.output, config, workers, args.force)
+    elapsed = time.perf_counter() - started
+
+    print(f"{'stage':<12} {'reviews':>8} {'cached':>8} {'seconds':>8} {'reviews/s':>10}")
+    for name in STAGES:
+        reviews, cached, seconds = totals[name]
+        rate = (reviews - cached) / seconds if seconds else 0.0
+        print(f"{name:<12} {reviews:>8} {cached:>8} {seconds:>8.2f} {rate:>10.1f}")
+    print(f"{hotels - len(failed)}/{hotels} otel ({elapsed:.1f} sn)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,35 +1,133 @@
+"""
+Text preprocessing: lowercase, strip punctuation, drop stopwords, stem and lemmatize.
+
+Importing this module is free: nltk is only imported, and its corpora only
+loaded, when the first text is processed. The corpora are read from a local
+directory (NLTK_DATA, by default ../.nltk_data) and never downloaded
+implicitly; fetch them once with
+
+    python preprocessing.py --download
+
+Stem + lemma results are cached per word, so repeated words cost a dict lookup.
+
+Usage: python preprocessing.py palde_hotel.txt --output palde_hotel_processed.txt
+"""
+import argparse
+import os
 import re
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer, WordNetLemmatizer
-import nltk
+import sys
+import threading
+from functools import lru_cache
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get('NLTK_DATA', os.path.join(BASE_PATH, '..', '.nltk_data'))
+RESOURCES = ('stopwords', 'wordnet', 'omw-1.4')
+NON_WORD = re.compile(r'[^\w\s]')
+WHITESPACE = re.compile(r'\s+')
+
+
+class Preprocessor:
+    """
+    Reusable preprocessing engine. Stopwords, stemmer and lemmatizer are built
+    once, on first use; the instance can be shared between threads.
+    """
+
+    def __init__(self, language='turkish', data_dir=DATA_DIR, cache_size=200000):
+        self.language = language
+        self.data_dir = data_dir
+        self._resources = None
+        self._lock = threading.Lock()
+        self.root = lru_cache(maxsize=cache_size)(self._root)
+
+    def _load(self):
+        with self._lock:
+            if self._resources is None:
+                import nltk
+                from nltk.corpus import stopwords
+                from nltk.stem import PorterStemmer, WordNetLemmatizer
+                if self.data_dir not in nltk.data.path:
+                    nltk.data.path.insert(0, self.data_dir)
+                stop_words = self._require('stopwords', lambda: frozenset(stopwords.words(self.language)))
+                lemmatizer = WordNetLemmatizer()
+                # WordNet normalde ilk lemmatize çağrısında yüklenir; eksikse burada aynı mesajla hata verilir
+                self._require('wordnet', lambda: lemmatizer.lemmatize('test'))
+                self._resources = (stop_words, PorterStemmer(), lemmatizer)
+        return self._resources
+
+    def _require(self, resource, load):
+        try:
+            return load()
+        except LookupError as e:
+            raise LookupError(
+                f"NLTK corpus '{resource}' not found in {self.data_dir}; run 'python preprocessing.py --download'"
+            ) from e
+
+    def _root(self, word):
+        _, stemmer, lemmatizer = self._resources or self._load()
+        return lemmatizer.lemmatize(stemmer.stem(word))
+
+    def process(self, text):
+        # 1. Küçük harfe dönüştürme, 2. noktalama işaretlerini ve özel karakterleri kaldırma
+        words = NON_WORD.sub('', text.lower()).split()
+        # 3. Durdurma kelimelerini çıkarma
+        stop_words = (self._resources or self._load())[0]
+        # 4. Kök bulma (Stemming) ve lemmatization
+        root = self.root
+        text = ' '.join([root(word) for word in words if word not in stop_words])
+        # 5. Fazladan boşlukları temizleme
+        return WHITESPACE.sub(' ', text).strip()
+
+    def process_many(self, texts):
+        """Preprocess a batch of texts; the word cache is shared across the batch"""
+        return [self.process(text) for text in texts]
+
+
+_default = None
+
+def default_preprocessor():
+    global _default
+    if _default is None:
+        _default = Preprocessor()
+    return _default
 
-# Gerekli NLTK veri setlerini indir
-nltk.download('stopwords')
-nltk.download('wordnet')
 
 def preprocess_text(text):
-    # 1. Küçük harfe dönüştürme
-    text = text.lower()
-    
-    # 2. Noktalama işaretlerini ve özel karakterleri kaldırma
-    text = re.sub(r'[^\w\s]', '', text)
-    
-    # 3. Durdurma kelimelerini çıkarma
-    stop_words = set(stopwords.words('turkish'))
-    text = ' '.join([word for word in text.split() if word not in stop_words])
-    
-    # 4. Kök bulma (Stemming) ve lemmatization
-    stemmer = PorterStemmer()
-    lemmatizer = WordNetLemmatizer()
-    text = ' '.join([lemmatizer.lemmatize(stemmer.stem(word)) for word in text.split()])
-    
-    # 5. Fazladan boşlukları temizleme
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text
-# Örnek kullanım
-with open('palde_hotel.txt', 'r', encoding='utf-8') as file:  # encoding parametresi eklendi
-    sample_text = file.read()
-processed_text = preprocess_text(sample_text)
-with open('palde_hotel.txt', 'w', encoding='utf-8') as file:  # encoding parametresi eklendi
-    file.write(processed_text)
+    return default_preprocessor().process(text)
+
+
+def download(data_dir=DATA_DIR):
+    """Fetch the NLTK corpora into data_dir; the only place that uses the network"""
+    import nltk
+    for resource in RESOURCES:
+        if not nltk.download(resource, download_dir=data_dir):
+            raise RuntimeError(f"Could not download {resource}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocess a text file")
+    parser.add_argument('input', nargs='?', help="Text file to preprocess")
+    parser.add_argument('--output', help="Output file, defaults to stdout")
+    parser.add_argument('--language', default='turkish', help="Stopword language")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="Local NLTK corpus directory")
+    parser.add_argument('--download', action='store_true', help="Download the NLTK corpora into --data-dir")
+    args = parser.parse_args()
+
+    if args.download:
+        download(args.data_dir)
+        print(f"NLTK verileri indirildi: {args.data_dir}")
+    if args.input is None:
+        return 0 if args.download else parser.error("an input file is required")
+
+    preprocessor = Preprocessor(args.language, args.data_dir)
+    with open(args.input, 'r', encoding='utf-8') as file:
+        processed_text = preprocessor.process(file.read())
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(processed_text)
+    else:
+        print(processed_text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class ResultCache:
+    """
+    In-process LRU cache with a TTL, tied to the graph version.
+
+    Entries stored for an older graph version are treated as misses, and
+    identical misses that arrive while a value is being computed wait for
+    that one computation instead of starting their own.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (version, expires_at, value)
+        self._inflight = {}  # (key, version) -> asyncio.Future
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key, version):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        entry_version, expires_at, value = entry
+        if entry_version != version or expires_at <= self.clock():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, version, value):
+        self._entries[key] = (version, self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        """Drop every entry, e.g. after the graph changed"""
+        self._entries.clear()
+
+    async def get_or_compute(self, key, version, compute):
+        """Return the cached value for key, or await compute() once for all concurrent callers"""
+        inflight_key = (key, version)
+        while True:
+            value = self._lookup(key, version)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+
+            future = self._inflight.get(inflight_key)
+            if future is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Only the leader was cancelled (e.g. its client went away); the
+                # waiters try again and one of them computes the value instead
+                if not future.cancelled():
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[inflight_key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            self.put(key, version, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[inflight_key]
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,254 @@
+"""
+Partitioned, append-only columnar store for reviews.
+
+    <root>/<hotel>/part-<timestamp>-<id>/meta.json     row count and min/max of STAT_COLUMNS
+    <root>/<hotel>/part-.../<column>.npy               int, float and date columns
+    <root>/<hotel>/part-.../<column>.offsets.npy       text columns: utf-8 bytes and row offsets
+    <root>/<hotel>/part-.../<column>.data.npy
+
+Partitions are hotel keys (sentiment.name_key; 'unknown' when the hotel is
+not known). Every append writes new parts and never touches existing ones;
+rows whose review_id is already in the partition are skipped. All files are
+memory-mapped on read, so a scan only pages in the columns it needs, and
+filters prune partitions by hotel and parts by their min/max statistics
+before any row is looked at.
+
+    store = ReviewStore(path)
+    store.scan(['review_id', 'rating'], [('hotel_id', '==', 299), ('rating', '>=', 4)])
+
+Missing values are -1 for hotel_id, NaN for ratings and scores, NaT for
+dates and '' for text.
+"""
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+from sentiment import name_key
+
+SCHEMA = (
+    ('hotel', 'str'),
+    ('hotel_id', 'int'),
+    ('place_id', 'str'),
+    ('review_id', 'str'),
+    ('date', 'date'),
+    ('rating', 'float'),
+    ('original_text', 'str'),
+    ('translated_text', 'str'),
+    ('neg', 'float'),
+    ('neu', 'float'),
+    ('pos', 'float'),
+    ('compound', 'float'),
+)
+COLUMNS = dict(SCHEMA)
+# The partition column is not stored; it is the partition directory name
+PARTITION_COLUMN = 'hotel'
+STAT_COLUMNS = ('hotel_id', 'date', 'rating', 'compound')
+UNKNOWN_HOTEL = 'unknown'
+
+OPERATORS = {
+    '==': np.equal, '!=': np.not_equal, '<': np.less, '<=': np.less_equal,
+    '>': np.greater, '>=': np.greater_equal,
+    'in': lambda values, allowed: np.isin(values, list(allowed)),
+}
+
+
+def column_array(kind, values):
+    if kind == 'int':
+        return np.array([-1 if value is None else value for value in values], dtype=np.int64)
+    if kind == 'float':
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    if kind == 'date':
+        return np.array([np.datetime64('NaT') if value is None else value for value in values],
+                        dtype='datetime64[D]')
+    return np.array(['' if value is None else str(value) for value in values], dtype=object)
+
+
+def filter_value(kind, operator, value):
+    if kind == 'date':
+        return [np.datetime64(v, 'D') for v in value] if operator == 'in' else np.datetime64(value, 'D')
+    return value
+
+
+def may_match(stats, column, operator, value):
+    """False when the min/max of a part rule out every row for the filter"""
+    if column not in stats:
+        return True
+    low, high = stats[column]
+    if low is None:
+        # Sütunda hiç değer yok; karşılaştırmaların hepsi yanlış
+        return operator == '!='
+    if COLUMNS[column] == 'date':
+        low, high = np.datetime64(low, 'D'), np.datetime64(high, 'D')
+    if operator == '==':
+        return low <= value <= high
+    if operator == '<':
+        return low < value
+    if operator == '<=':
+        return low <= value
+    if operator == '>':
+        return high > value
+    if operator == '>=':
+        return high >= value
+    if operator == 'in':
+        return any(low <= v <= high for v in value)
+    return True
+
+
+class Part:
+    """One immutable set of rows; columns are memory-mapped on first use"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self._columns = {}
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+
+    def column(self, name, rows=None):
+        """Values of a column, optionally only at the row positions in rows"""
+        if COLUMNS[name] == 'str':
+            if name not in self._columns:
+                self._columns[name] = (self._load(name + '.offsets'), self._load(name + '.data'))
+            offsets, data = self._columns[name]
+            positions = range(self.rows) if rows is None else rows
+            return np.array([bytes(data[offsets[i]:offsets[i + 1]]).decode('utf-8') for i in positions],
+                            dtype=object)
+        if name not in self._columns:
+            self._columns[name] = self._load(name)
+        values = self._columns[name]
+        return np.array(values if rows is None else values[rows])
+
+    @staticmethod
+    def write(path, table):
+        """Write {column: array} (all stored columns, same length) as a new part at path"""
+        tmp_path = path + '.tmp'
+        os.makedirs(tmp_path)
+        try:
+            stats = {}
+            for name, kind in SCHEMA:
+                if name == PARTITION_COLUMN:
+                    continue
+                values = table[name]
+                if kind == 'str':
+                    encoded = [value.encode('utf-8') for value in values]
+                    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+                    np.save(os.path.join(tmp_path, name + '.offsets.npy'), offsets)
+                    np.save(os.path.join(tmp_path, name + '.data.npy'),
+                            np.frombuffer(b''.join(encoded), dtype=np.uint8))
+                else:
+                    np.save(os.path.join(tmp_path, name + '.npy'), values)
+                if name in STAT_COLUMNS:
+                    present = values[values != -1] if kind == 'int' else values[~np.isnan(values)]
+                    stats[name] = ([str(present.min()), str(present.max())] if kind == 'date' else
+                                   [present.min().item(), present.max().item()]) if len(present) else [None, None]
+            with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({'rows': len(table['review_id']), 'stats': stats}, f)
+            # Yeni bölüm tek adımda görünür olur; okuyucular yarım yazılmış bir bölüm görmez
+            os.replace(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+
+class ReviewStore:
+    def __init__(self, root):
+        self.root = root
+
+    def partitions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def parts(self, partition):
+        path = os.path.join(self.root, partition)
+        return [Part(os.path.join(path, name)) for name in sorted(os.listdir(path))
+                if name.startswith('part-') and not name.endswith('.tmp')]
+
+    def review_ids(self, partition):
+        ids = set()
+        if os.path.isdir(os.path.join(self.root, partition)):
+            for part in self.parts(partition):
+                ids.update(part.column('review_id'))
+        return ids
+
+    def append(self, rows):
+        """
+        Append rows ({column: list of values}; hotel is the partition, review_id is required).
+        Rows whose review_id is already in their partition, or earlier in rows, are skipped.
+        Returns (rows written, duplicates skipped).
+        """
+        count = len(rows['review_id'])
+        hotels = [name_key(hotel) if isinstance(hotel, str) else '' for hotel in rows.get('hotel', [None] * count)]
+        hotels = [hotel or UNKNOWN_HOTEL for hotel in hotels]
+        by_partition = {}
+        for i, hotel in enumerate(hotels):
+            by_partition.setdefault(hotel, []).append(i)
+
+        written = 0
+        for partition, positions in by_partition.items():
+            seen = self.review_ids(partition)
+            keep = []
+            for i in positions:
+                review_id = str(rows['review_id'][i])
+                if review_id not in seen:
+                    seen.add(review_id)
+                    keep.append(i)
+            if not keep:
+                continue
+            table = {}
+            for name, kind in SCHEMA:
+                values = rows.get(name)
+                table[name] = column_array(kind, [None if values is None else values[i] for i in keep])
+            os.makedirs(os.path.join(self.root, partition), exist_ok=True)
+            name = f'part-{time.strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}'
+            Part.write(os.path.join(self.root, partition, name), table)
+            written += len(keep)
+        return written, count - written
+
+    def scan(self, columns=None, filters=()):
+        """
+        {column: array} of the rows matching every (column, operator, value) filter.
+        Operators: ==, !=, <, <=, >, >=, in. Only the requested and filtered columns are read.
+        """
+        columns = list(columns or COLUMNS)
+        filters = [(column, op, filter_value(COLUMNS[column], op, value)) for column, op, value in filters]
+        result = {name: [] for name in columns}
+        for partition in self.partitions():
+            # Bölüm adı otel anahtarıdır; otel filtresi dizinleri hiç açmadan eler
+            if not all(OPERATORS[op](np.array([partition], dtype=object), value)[0]
+                       for column, op, value in filters if column == PARTITION_COLUMN):
+                continue
+            for part in self.parts(partition):
+                if not all(may_match(part.meta['stats'], column, op, value)
+                           for column, op, value in filters if column != PARTITION_COLUMN):
+                    continue
+                mask = np.ones(part.rows, dtype=bool)
+                for column, op, value in filters:
+                    if column != PARTITION_COLUMN:
+                        mask &= OPERATORS[op](part.column(column), value)
+                rows = np.flatnonzero(mask)
+                if not len(rows):
+                    continue
+                for name in columns:
+                    if name == PARTITION_COLUMN:
+                        result[name].append(np.full(len(rows), partition, dtype=object))
+                    else:
+                        result[name].append(part.column(name, rows))
+        return {
+            name: np.concatenate(arrays) if arrays else column_array(COLUMNS[name], [])
+            for name, arrays in result.items()
+        }
+
+    def to_frame(self, columns=None, filters=()):
+        """scan() as a pandas DataFrame"""
+        import pandas as pd
+        return pd.DataFrame(self.scan(columns, filters))
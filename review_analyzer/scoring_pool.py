@@ -0,0 +1,95 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class ScoringPoolBusy(Exception):
+    """Raised when the pool already holds as many jobs as it may run and queue"""
+
+
+class ScoringTimeout(Exception):
+    """Raised when a job does not finish within the per-request timeout"""
+
+
+class ScoringPool:
+    """
+    Runs CPU-bound scoring off the asyncio event loop.
+
+    At most max_workers jobs run at once and at most max_queue more wait for a
+    worker; anything beyond that is rejected immediately with ScoringPoolBusy
+    instead of piling up. Jobs that take longer than timeout seconds raise
+    ScoringTimeout for the caller (the worker itself cannot be interrupted, so
+    it keeps counting against the limits until it finishes).
+
+    kind='process' forks worker processes that see the graph as it was when
+    the pool was (re)started; call restart() after the graph changes.
+    """
+
+    def __init__(self, kind='thread', max_workers=4, max_queue=32, timeout=10.0):
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unknown scoring pool kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._executor = self._create_executor()
+
+    def _create_executor(self):
+        if self.kind == 'process':
+            return ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('fork')
+            )
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scoring')
+
+    def restart(self):
+        """Replace process workers so they pick up the current graph"""
+        if self.kind != 'process':
+            return
+        old_executor, self._executor = self._executor, self._create_executor()
+        old_executor.shutdown(wait=False)
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool, enforcing the queue limit and the timeout"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ScoringPoolBusy("Recommendation service is busy, try again later")
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise ScoringTimeout(f"Scoring did not finish within {self.timeout:g} seconds")
+
+    def stats(self):
+        return {
+            'kind': self.kind,
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'timeout': self.timeout,
+            'pending': self._pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+        }
@@ -0,0 +1,438 @@
+"""
+BM25 full-text index over the review corpora.
+
+Every review of final_results/ and translated_comments/ (as split by
+sentiment.split_reviews) is one document. The index is a directory of
+segments, each a set of memory-mappable .npy arrays:
+
+    <index_root>/manifest.json          format and active segment names
+    <index_root>/<segment>/meta.json    hotels, source files and their sha256, doc and token counts
+    <segment>/terms.npy                 sorted utf-8 terms (the term dictionary)
+    <segment>/term_df.npy               documents per term
+    <segment>/term_offsets.npy          byte offset of each term's postings in postings.npy
+    <segment>/term_max_tf.npy           highest tf per term and shortest document
+    <segment>/term_min_length.npy       containing it, for score upper bounds
+    <segment>/postings.npy              doc id gaps of all terms, varint encoded
+    <segment>/frequencies.npy           term frequency of every posting
+    <segment>/doc_hotel/length/source/review.npy   per-review document table
+
+An update only indexes hotel files that are new since the last run into a
+new segment; when a file changed or disappeared, the segment that held it is
+rebuilt together with the new files. Many small segments are merged back
+into one once there are more than MAX_SEGMENTS.
+
+Queries are ranked per hotel by its best matching review, with MaxScore
+early termination: once the k-th best hotel score exceeds what the
+remaining query terms could add, reviews that cannot reach it are no longer
+scored.
+
+Usage: python search_index.py [--rebuild]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+import numpy as np
+from hotel_matching import HOTEL_LIST_PATH, link_hotels, read_hotel_list
+from sentiment import hotel_key, split_reviews
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+# 2: "Yorum:" reviews of final_results are indexed; older segments are missing them
+INDEX_FORMAT = 2
+MANIFEST_FILE = 'manifest.json'
+MAX_SEGMENTS = 8
+MAX_TERM_BYTES = 64
+TOKEN = re.compile(r'\w+')
+
+SEGMENT_ARRAYS = ('terms', 'term_df', 'term_offsets', 'term_max_tf', 'term_min_length',
+                  'postings', 'frequencies', 'doc_hotel', 'doc_length', 'doc_source', 'doc_review')
+
+
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.lower()) if len(token.encode('utf-8')) <= MAX_TERM_BYTES]
+
+
+def encode_varints(values):
+    """Unsigned integers as little-endian base-128 varints (uint8 array)"""
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    for bits in (7, 14, 21, 28, 35):
+        sizes += values >= (1 << bits)
+    starts = np.cumsum(sizes) - sizes
+    position = np.arange(sizes.sum()) - np.repeat(starts, sizes)
+    encoded = (np.repeat(values, sizes) >> (7 * position).astype(np.uint64)) & np.uint64(0x7f)
+    # Every byte but the last of a value has the continuation bit set
+    encoded[position < np.repeat(sizes, sizes) - 1] |= np.uint64(0x80)
+    return encoded.astype(np.uint8)
+
+
+def decode_varints(data):
+    data = np.asarray(data)
+    if not len(data):
+        return np.empty(0, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    values = (data & 0x7f).astype(np.int64) << (7 * position)
+    return np.add.reduceat(values, starts)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def display_name(filename):
+    name = os.path.splitext(os.path.basename(filename))[0]
+    if name.startswith('translated_'):
+        name = name[len('translated_'):]
+    return name.replace('_', ' ')
+
+
+def file_id(path, source):
+    return f'{source}/{os.path.basename(path)}'
+
+
+def corpus_files(input_dirs):
+    """{path: source} of every .txt file in the corpus directories"""
+    files = {}
+    for input_dir in input_dirs:
+        source = os.path.basename(os.path.normpath(input_dir))
+        for name in sorted(os.listdir(input_dir)):
+            if name.endswith('.txt'):
+                files[os.path.join(input_dir, name)] = source
+    return files
+
+
+def write_segment(path, files, shas):
+    """Index files ({path: source}) into a new segment directory at path"""
+    hotels, hotel_names = {}, []
+    sources = sorted(set(files.values()))
+    postings = defaultdict(list)
+    doc_hotel, doc_length, doc_source, doc_review = [], [], [], []
+    for file_path, source in files.items():
+        key = hotel_key(file_path)
+        if key not in hotels:
+            hotels[key] = len(hotels)
+            hotel_names.append(display_name(file_path))
+        with open(file_path, 'r', encoding='utf-8') as f:
+            reviews = split_reviews(f.read())
+        if not reviews:
+            print(f"Uyarı: {file_id(file_path, source)} dosyasında yorum bulunamadı, indekse girmedi")
+        for review_id, _, text in reviews:
+            tokens = tokenize(text)
+            doc = len(doc_length)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc, tf))
+            doc_hotel.append(hotels[key])
+            doc_length.append(len(tokens))
+            doc_source.append(sources.index(source))
+            doc_review.append(review_id.encode('utf-8'))
+
+    doc_length = np.array(doc_length, dtype=np.int32)
+    terms = sorted(postings, key=lambda term: term.encode('utf-8'))
+    gaps, frequencies, offsets, df, max_tf, min_length = [], [], [0], [], [], []
+    size = 0
+    for term in terms:
+        docs, tfs = zip(*postings[term])
+        docs = np.array(docs, dtype=np.int64)
+        encoded = encode_varints(np.diff(docs, prepend=0))
+        gaps.append(encoded)
+        frequencies.append(tfs)
+        size += len(encoded)
+        offsets.append(size)
+        df.append(len(docs))
+        max_tf.append(max(tfs))
+        min_length.append(doc_length[docs].min())
+
+    arrays = {
+        'terms': np.array([term.encode('utf-8') for term in terms], dtype=bytes),
+        'term_df': np.array(df, dtype=np.int32),
+        'term_offsets': np.array(offsets, dtype=np.int64),
+        'term_max_tf': np.array(max_tf, dtype=np.int32),
+        'term_min_length': np.array(min_length, dtype=np.int32),
+        'postings': np.concatenate(gaps) if gaps else np.empty(0, dtype=np.uint8),
+        'frequencies': np.array([tf for tfs in frequencies for tf in tfs], dtype=np.uint16),
+        'doc_hotel': np.array(doc_hotel, dtype=np.int32),
+        'doc_length': doc_length,
+        'doc_source': np.array(doc_source, dtype=np.int8),
+        'doc_review': np.array(doc_review, dtype=bytes),
+    }
+    os.makedirs(path)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, name + '.npy'), array)
+    meta = {
+        'hotels': list(hotels),
+        'hotel_names': hotel_names,
+        'sources': sources,
+        'files': {file_id(file_path, source): shas[file_path] for file_path, source in files.items()},
+        'documents': len(doc_length),
+        'tokens': int(doc_length.sum()),
+    }
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return meta
+
+
+def read_manifest(index_root):
+    path = os.path.join(index_root, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return manifest if manifest.get('format') == INDEX_FORMAT else None
+
+
+def update_index(input_dirs, index_root, rebuild=False):
+    """
+    Bring the index up to date with the corpus files.
+    Returns (files indexed now, segments kept unchanged).
+    """
+    os.makedirs(index_root, exist_ok=True)
+    files = corpus_files(input_dirs)
+    shas = {path: file_sha256(path) for path in files}
+    by_name = {file_id(path, source): path for path, source in files.items()}
+    manifest = read_manifest(index_root)
+    segments = [] if rebuild or manifest is None else manifest['segments']
+
+    kept, indexed = [], set()
+    for segment in segments:
+        with open(os.path.join(index_root, segment, 'meta.json'), 'r', encoding='utf-8') as f:
+            recorded = json.load(f)['files']
+        if all(name in by_name and shas[by_name[name]] == sha for name, sha in recorded.items()):
+            kept.append(segment)
+            indexed.update(by_name[name] for name in recorded)
+    # A hotel whose files changed is rebuilt together with everything else in its old segment
+    pending = {path: source for path, source in files.items() if path not in indexed}
+    if len(kept) >= MAX_SEGMENTS:
+        kept, pending = [], files
+
+    new_segments = []
+    if pending:
+        name = f'{time.strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        write_segment(os.path.join(index_root, name), pending, shas)
+        new_segments.append(name)
+
+    if new_segments or segments != kept:
+        tmp_path = os.path.join(index_root, MANIFEST_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'format': INDEX_FORMAT, 'segments': kept + new_segments}, f)
+        os.replace(tmp_path, os.path.join(index_root, MANIFEST_FILE))
+        # Readers that opened the old manifest keep their mapped files until they reopen
+        for segment in os.listdir(index_root):
+            path = os.path.join(index_root, segment)
+            if os.path.isdir(path) and segment not in kept + new_segments:
+                shutil.rmtree(path, ignore_errors=True)
+    return len(pending), len(kept)
+
+
+class Segment:
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        for name in SEGMENT_ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))
+        # Position of each term's first frequency in frequencies.npy
+        self.term_start = np.concatenate(([0], np.cumsum(self.term_df, dtype=np.int64)))
+
+    def lookup(self, term):
+        """Position of term in the dictionary, or None"""
+        encoded = term.encode('utf-8')
+        i = int(np.searchsorted(self.terms, encoded))
+        if i < len(self.terms) and self.terms[i] == encoded:
+            return i
+        return None
+
+    def postings_of(self, i):
+        """(doc ids, term frequencies) of dictionary entry i"""
+        docs = np.cumsum(decode_varints(self.postings[self.term_offsets[i]:self.term_offsets[i + 1]]))
+        return docs, np.asarray(self.frequencies[self.term_start[i]:self.term_start[i + 1]], dtype=np.float64)
+
+
+class SearchIndex:
+    """
+    Read-only view of an index directory. reopen() picks up a newer manifest;
+    it is cheap to call before every query.
+    """
+
+    def __init__(self, index_root, k1=1.2, b=0.75):
+        self.index_root = index_root
+        self.k1 = k1
+        self.b = b
+        self._manifest_mtime = None
+        self._state = None
+        if self.reopen() is None:
+            raise FileNotFoundError(f"No search index in {index_root}")
+
+    def reopen(self):
+        path = os.path.join(self.index_root, MANIFEST_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return self._state
+        if mtime == self._manifest_mtime:
+            return self._state
+        manifest = read_manifest(self.index_root)
+        if manifest is None:
+            return self._state
+        segments = []
+        for name in manifest['segments']:
+            segments.append(Segment(os.path.join(self.index_root, name)))
+        hotels, names = {}, []
+        for segment in segments:
+            slots = []
+            for key, name in zip(segment.meta['hotels'], segment.meta['hotel_names']):
+                if key not in hotels:
+                    hotels[key] = len(hotels)
+                    names.append(name)
+                slots.append(hotels[key])
+            # Segment-local hotel numbers -> global hotel slots
+            segment.hotel_slots = np.array(slots, dtype=np.int64)
+        documents = sum(segment.meta['documents'] for segment in segments)
+        tokens = sum(segment.meta['tokens'] for segment in segments)
+        self._state = (segments, list(hotels), names, documents, tokens / documents if documents else 0.0)
+        self._manifest_mtime = mtime
+        return self._state
+
+    @property
+    def hotels(self):
+        return self._state[1]
+
+    def search(self, query, k=10, hotels=None):
+        """
+        Top k hotels for the query as [(hotel_key, name, score, source, review_id)],
+        best first. hotels, if given, restricts the result to those hotel keys.
+        """
+        segments, hotel_keys, names, documents, average_length = self._state
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not documents or k <= 0:
+            return []
+        allowed = None
+        if hotels is not None:
+            allowed = np.zeros(len(hotel_keys), dtype=bool)
+            allowed[[i for i, key in enumerate(hotel_keys) if key in hotels]] = True
+            if not allowed.any():
+                return []
+
+        k1, b = self.k1, self.b
+        positions = [[segment.lookup(term) for term in terms] for segment in segments]
+        df = np.array([sum(int(segment.term_df[i]) for segment, i in zip(segments, column) if i is not None)
+                       for column in zip(*positions)], dtype=np.float64)
+        idf = np.log(1 + (documents - df + 0.5) / (df + 0.5))
+
+        best = np.zeros(len(hotel_keys))
+        best_doc = np.full(len(hotel_keys), -1, dtype=np.int64)
+        best_segment = np.zeros(len(hotel_keys), dtype=np.int64)
+        for s, (segment, lookups) in enumerate(zip(segments, positions)):
+            present = [(t, i) for t, i in enumerate(lookups) if i is not None]
+            if not present:
+                continue
+            doc_slots = segment.hotel_slots[segment.doc_hotel]
+            doc_allowed = None if allowed is None else allowed[doc_slots]
+            norm = k1 * (1 - b + b * np.asarray(segment.doc_length, dtype=np.float64) / average_length)
+
+            # Highest contribution each term can make in this segment, best terms first
+            bounds = []
+            for t, i in present:
+                tf = float(segment.term_max_tf[i])
+                shortest = k1 * (1 - b + b * float(segment.term_min_length[i]) / average_length)
+                bounds.append(idf[t] * tf * (k1 + 1) / (tf + shortest))
+            order = np.argsort(bounds)[::-1]
+            remaining = np.cumsum(np.array(bounds)[order][::-1])[::-1]
+
+            scores = np.zeros(len(norm))
+            candidates = None
+            for step, j in enumerate(order):
+                t, i = present[j]
+                threshold = self._kth(best, scores, doc_slots, doc_allowed, k)
+                if candidates is None and remaining[step] < threshold:
+                    # Reviews not matched yet can no longer reach the top k
+                    matched = scores > 0
+                    if doc_allowed is not None:
+                        matched &= doc_allowed
+                    candidates = np.flatnonzero(matched)
+                if candidates is not None:
+                    candidates = candidates[scores[candidates] + remaining[step] >= threshold]
+                    if not len(candidates):
+                        break
+                docs, tfs = segment.postings_of(i)
+                if candidates is not None:
+                    hit = np.searchsorted(docs, candidates)
+                    hit[hit == len(docs)] = 0
+                    found = docs[hit] == candidates
+                    docs, tfs = candidates[found], tfs[hit[found]]
+                scores[docs] += idf[t] * tfs * (k1 + 1) / (tfs + norm[docs])
+
+            if doc_allowed is not None:
+                scores[~doc_allowed] = 0
+            matched = np.flatnonzero(scores > 0)
+            # Best review per hotel: sort by score and keep the first row of every hotel
+            matched = matched[np.lexsort((-scores[matched], doc_slots[matched]))]
+            slots = doc_slots[matched]
+            first = np.concatenate(([True], slots[1:] != slots[:-1])) if len(slots) else slots.astype(bool)
+            matched, slots = matched[first], slots[first]
+            better = scores[matched] > best[slots]
+            best[slots[better]] = scores[matched[better]]
+            best_doc[slots[better]] = matched[better]
+            best_segment[slots[better]] = s
+
+        ranked = np.flatnonzero(best > 0)
+        ranked = ranked[np.argsort(-best[ranked], kind='stable')][:k]
+        results = []
+        for slot in ranked:
+            segment = segments[best_segment[slot]]
+            doc = best_doc[slot]
+            results.append((
+                hotel_keys[slot], names[slot], float(best[slot]),
+                segment.meta['sources'][segment.doc_source[doc]], segment.doc_review[doc].decode('utf-8')
+            ))
+        return results
+
+    @staticmethod
+    def _kth(best, scores, doc_slots, doc_allowed, k):
+        """Lower bound of the k-th best hotel score, from finished segments and the current partial scores"""
+        current = best.copy()
+        matched = scores > 0
+        if doc_allowed is not None:
+            matched &= doc_allowed
+        np.maximum.at(current, doc_slots[matched], scores[matched])
+        if np.count_nonzero(current) < k:
+            return 0.0
+        return float(np.partition(current, len(current) - k)[len(current) - k])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the BM25 review search index")
+    parser.add_argument('--inputs', nargs='+', default=[
+        os.path.join(BASE_PATH, '..', 'final_results'),
+        os.path.join(BASE_PATH, '..', 'translated_comments'),
+    ])
+    parser.add_argument('--index', default=os.path.join(BASE_PATH, '..', 'search_index'))
+    parser.add_argument('--rebuild', action='store_true', help="Index every file again from scratch")
+    parser.add_argument('--hotels', default=HOTEL_LIST_PATH, help="Hotel list the review files are linked to")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    indexed, kept = update_index(args.inputs, args.index, args.rebuild)
+    index = SearchIndex(args.index)
+    segments, hotels, _, documents, _ = index.reopen()
+    print(f"{indexed} dosya indekslendi, {kept} segment değişmedi; {len(segments)} segment, "
+          f"{len(hotels)} otel, {documents} yorum ({time.perf_counter() - started:.1f} sn)")
+    # Eşleşmeyen oteller /hotels/search sonuçlarında yer almaz
+    _, unlinked = link_hotels(hotels, read_hotel_list(args.hotels))
+    if unlinked:
+        print(f"Uyarı: {len(unlinked)} otel {args.hotels} ile eşleşmedi, aramada çıkmayacak "
+              f"(hotel_matching.ALIASES'a eklenebilir): {', '.join(unlinked)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
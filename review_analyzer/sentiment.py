@@ -1,7 +1,195 @@
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+"""
+Per-review VADER sentiment for every hotel.
 
-analyzer = SentimentIntensityAnalyzer()
-with open("corrected_example.txt", "r", encoding='utf-8') as file:
-    text = file.read()
-score = analyzer.polarity_scores(text)
-print(score)  # {'neg': 0.0, 'neu': 0.353, 'pos': 0.647, 'compound': 0.8316}
+Reviews are split out of translated_comments/ ("1. Comment: ..." numbered
+reviews) and final_results/ ("Comment: ..." reviews under each category),
+scored in batches on a process pool and written as one columnar table per
+hotel: <output>/<hotel>.npz with the columns review_id, source, category,
+hash, neg, neu, pos and compound.
+
+A review is identified by the SHA-256 of its text; on later runs scores of
+reviews whose hash is already in one of the tables are reused and only new
+or changed reviews are scored again.
+
+Usage: python sentiment.py --workers 4
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+SCORE_COLUMNS = ('neg', 'neu', 'pos', 'compound')
+TEXT_COLUMNS = ('review_id', 'source', 'category', 'hash')
+
+# "12. Comment: ..." (older translations kept the Turkish "Yorum")
+NUMBERED_REVIEW = re.compile(r'(?:^|\s)(\d+)\. (?:Comment|Yorum):\s*')
+CATEGORY_SECTION = re.compile(r'^All results text for (.+?): (.*?)(?=\n\s*\nRating for |\Z)', re.M | re.S)
+CATEGORY_REVIEW = re.compile(r'(?:^|\s)(?:Comment|Yorum):\s*')
+
+
+def name_key(name):
+    """'Aska Lara' -> 'aska_lara'; hotel names and file names meet on this key"""
+    return re.sub(r'[^0-9a-z]+', '_', name.lower()).strip('_')
+
+
+def hotel_key(filename):
+    """'translated_aska_lara.txt' and 'Aska Lara.txt' both belong to 'aska_lara'"""
+    name = os.path.splitext(os.path.basename(filename))[0]
+    if name.startswith('translated_'):
+        name = name[len('translated_'):]
+    return name_key(name)
+
+
+def split_reviews(text):
+    """[(review_id, category, review_text), ...] of one corpus file"""
+    reviews = []
+    sections = CATEGORY_SECTION.findall(text)
+    if sections:
+        for category, section in sections:
+            parts = CATEGORY_REVIEW.split(section)
+            for i, review in enumerate(part.strip() for part in parts[1:]):
+                if review:
+                    reviews.append((f'{category}#{i + 1}', category, review))
+        return reviews
+
+    parts = NUMBERED_REVIEW.split(text)
+    seen = defaultdict(int)
+    # parts = [prefix, number, text, number, text, ...]
+    for number, review in zip(parts[1::2], parts[2::2]):
+        review = review.strip()
+        if not review:
+            continue
+        seen[number] += 1
+        review_id = number if seen[number] == 1 else f'{number}-{seen[number]}'
+        reviews.append((review_id, '', review))
+    return reviews
+
+
+def review_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# Every pool process builds its own analyzer once
+_analyzer = None
+
+def _init_worker():
+    global _analyzer
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    _analyzer = SentimentIntensityAnalyzer()
+
+def _score_batch(texts):
+    scores = [_analyzer.polarity_scores(text) for text in texts]
+    return [[score[column] for column in SCORE_COLUMNS] for score in scores]
+
+
+def load_table(path):
+    """{column: array} of a hotel table, None if there is none"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as table:
+        return {name: table[name] for name in table.files}
+
+
+def save_table(path, table):
+    """Write the table through a temporary file, so readers never see half of it"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npz')
+    os.close(fd)
+    try:
+        np.savez(tmp_path, **table)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def collect_reviews(input_dirs):
+    """{hotel: [(review_id, source, category, hash, text), ...]} over all input directories"""
+    hotels = defaultdict(list)
+    for input_dir in input_dirs:
+        source = os.path.basename(os.path.normpath(input_dir))
+        for name in sorted(os.listdir(input_dir)):
+            if not name.endswith('.txt'):
+                continue
+            with open(os.path.join(input_dir, name), 'r', encoding='utf-8') as f:
+                text = f.read()
+            reviews = split_reviews(text)
+            # Tanınmayan bir biçim sessizce otelin bütün yorumlarını düşürmesin
+            if not reviews:
+                print(f"Uyarı: {source}/{name} dosyasında yorum bulunamadı")
+            for review_id, category, review in reviews:
+                hotels[hotel_key(name)].append((review_id, source, category, review_hash(review), review))
+    return hotels
+
+
+def score_reviews(input_dirs, output_dir, workers=None, batch_size=256):
+    """Score all reviews, reusing previous scores by hash. Returns {hotel: (reviews, scored, mean compound)}"""
+    os.makedirs(output_dir, exist_ok=True)
+    hotels = collect_reviews(input_dirs)
+
+    # Scores already known from the previous tables; identical reviews share them across hotels
+    known = {}
+    for hotel in hotels:
+        table = load_table(os.path.join(output_dir, hotel + '.npz'))
+        if table is not None:
+            scores = np.column_stack([table[column] for column in SCORE_COLUMNS])
+            known.update(zip(table['hash'].tolist(), scores.tolist()))
+    pending = {}
+    for reviews in hotels.values():
+        for _, _, _, digest, text in reviews:
+            if digest not in known:
+                pending.setdefault(digest, text)
+
+    # Only new or changed reviews go to the pool, in batches to keep IPC cheap
+    digests = list(pending)
+    batches = [digests[i:i + batch_size] for i in range(0, len(digests), batch_size)]
+    new_scores = {}
+    if batches:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            results = pool.map(_score_batch, [[pending[d] for d in batch] for batch in batches])
+            for batch, scores in zip(batches, results):
+                new_scores.update(zip(batch, scores))
+
+    summary = {}
+    for hotel, reviews in hotels.items():
+        digests = [digest for _, _, _, digest, _ in reviews]
+        scores = [known[digest] if digest in known else new_scores[digest] for digest in digests]
+        table = {column: np.array([review[i] for review in reviews], dtype=str)
+                 for i, column in enumerate(TEXT_COLUMNS)}
+        score_matrix = np.array(scores, dtype=np.float64).reshape(len(reviews), len(SCORE_COLUMNS))
+        for i, column in enumerate(SCORE_COLUMNS):
+            table[column] = score_matrix[:, i]
+        save_table(os.path.join(output_dir, hotel + '.npz'), table)
+        scored = sum(1 for digest in digests if digest not in known)
+        summary[hotel] = (len(reviews), scored, float(score_matrix[:, 3].mean()) if len(reviews) else 0.0)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every review with VADER into per-hotel tables")
+    parser.add_argument('--inputs', nargs='+', default=[
+        os.path.join(BASE_PATH, '..', 'translated_comments'),
+        os.path.join(BASE_PATH, '..', 'final_results'),
+    ])
+    parser.add_argument('--output', default=os.path.join(BASE_PATH, '..', 'sentiment_scores'))
+    parser.add_argument('--workers', type=int, default=None, help="Pool size, defaults to the CPU count")
+    parser.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    summary = score_reviews(args.inputs, args.output, args.workers, args.batch_size)
+    for hotel, (reviews, scored, compound) in sorted(summary.items()):
+        print(f"{hotel}: {reviews} yorum, {scored} yeniden puanlandı, ortalama compound {compound:.3f}")
+    total = sum(reviews for reviews, _, _ in summary.values())
+    scored = sum(scored for _, scored, _ in summary.values())
+    print(f"{len(summary)} otel, {total} yorum, {scored} puanlandı ({time.perf_counter() - started:.1f} sn)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
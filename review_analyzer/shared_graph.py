@@ -0,0 +1,466 @@
+"""
+Read-only graph served straight from the memory-mapped snapshot arrays.
+
+With several uvicorn workers every process used to build its own networkx
+graph, index, PageRank dict and rating matrices. Here every worker maps the
+same snapshot files instead, so the OS page cache holds a single copy that all
+workers share, and nothing is turned into Python objects until a request
+actually touches it.
+
+A new snapshot is picked up by pointing <snapshot_root>/CURRENT at it (which
+compile_snapshot does atomically); SnapshotWatcher notices the change and the
+API swaps the whole GraphState in one assignment.
+"""
+import fcntl
+import os
+import threading
+import time
+from collections import namedtuple
+from collections.abc import Mapping
+from contextlib import contextmanager
+import numpy as np
+from scipy import sparse
+from graph_index import GraphIndex
+from graph_snapshot import (GraphSnapshot, COLLABORATIVE_MATRICES, GROUP_INDEXES, ID_INDEXES,
+                            compile_snapshot, current_snapshot_path, load_snapshot)
+from pagerank_store import PageRankStore
+from collaborative import CollaborativeModel
+from personalized_pagerank import ExperiencePageRank
+from hotel_features import HotelFeatures
+
+# Everything a request reads, swapped as one object
+GraphState = namedtuple('GraphState', ['G', 'index', 'pagerank_store', 'collaborative_model',
+                                       'experience_pagerank', 'hotel_features'])
+
+
+class ArrayMapping(Mapping):
+    """
+    Read-only {key: value} over a key array, looked up by binary search.
+    With values=None every key maps to its position in the key array.
+    """
+
+    def __init__(self, keys, values=None, order=None):
+        self.keys_array = keys
+        self.values_array = values
+        self.order = order if order is not None else np.argsort(keys, kind='stable')
+
+    def position(self, key):
+        i = int(self.keys_array.searchsorted(key, sorter=self.order))
+        if i < len(self.order):
+            p = int(self.order[i])
+            if self.keys_array[p] == key:
+                return p
+        raise KeyError(key)
+
+    def positions(self, keys):
+        """Positions of many keys that are known to be present"""
+        return self.order[np.searchsorted(self.keys_array, keys, sorter=self.order)]
+
+    def __getitem__(self, key):
+        p = self.position(key)
+        return p if self.values_array is None else self.values_array[p].item()
+
+    def __iter__(self):
+        return iter(self.keys_array.tolist())
+
+    def __len__(self):
+        return len(self.keys_array)
+
+
+class StringArrayMapping(Mapping):
+    """Read-only {str: value} over a UTF-8 blob, looked up by binary search"""
+
+    def __init__(self, blob, offsets, values, order):
+        self.blob = blob
+        self.offsets = offsets
+        self.values_array = values
+        self.order = order
+
+    def _key(self, p):
+        return self.blob[self.offsets[p]:self.offsets[p + 1]].tobytes().decode('utf-8')
+
+    def __getitem__(self, key):
+        lo, hi = 0, len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(self.order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.order) and self._key(self.order[lo]) == key:
+            return self.values_array[self.order[lo]].item()
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (self._key(p) for p in range(len(self.values_array)))
+
+    def __len__(self):
+        return len(self.values_array)
+
+
+class GroupMapping(Mapping):
+    """Read-only {node: [nodes]} over CSR arrays"""
+
+    def __init__(self, keys, indptr, values, order):
+        self.keys = ArrayMapping(keys, order=order)
+        self.indptr = indptr
+        self.values_array = values
+
+    def group(self, key):
+        """The group of key as an array, empty when key has none"""
+        try:
+            p = self.keys.position(key)
+        except KeyError:
+            return self.values_array[:0]
+        return self.values_array[self.indptr[p]:self.indptr[p + 1]]
+
+    def __getitem__(self, key):
+        p = self.keys.position(key)
+        return self.values_array[self.indptr[p]:self.indptr[p + 1]].tolist()
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class _NodeData(Mapping):
+    """Attributes of one node, read column by column on access"""
+
+    def __init__(self, graph, p):
+        self._graph = graph
+        self._p = p
+
+    def __getitem__(self, name):
+        return self._graph._attribute(self._p, name)
+
+    def __iter__(self):
+        for name in self._graph._attribute_columns:
+            if self._graph.arrays[self._graph._attribute_columns[name][0] + '.mask'][self._p]:
+                yield name
+        if self._graph._type_code(self._p) >= 0:
+            yield 'type'
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class _NodeView:
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, node):
+        return _NodeData(self._graph, self._graph._position(node))
+
+    def __call__(self, data=False):
+        if not data:
+            return iter(self._graph)
+        return ((node, _NodeData(self._graph, p)) for p, node in enumerate(self._graph))
+
+    def __iter__(self):
+        return iter(self._graph)
+
+    def __len__(self):
+        return len(self._graph)
+
+    def __contains__(self, node):
+        return node in self._graph
+
+
+class _AdjacencyView(Mapping):
+    """{neighbor: edge attributes} of one node, in networkx neighbor order"""
+
+    def __init__(self, graph, p):
+        self._graph = graph
+        self._start = int(graph.arrays['adj_indptr'][p])
+        self._end = int(graph.arrays['adj_indptr'][p + 1])
+
+    def _edge(self, i):
+        arrays = self._graph.arrays
+        return {
+            'relationship_type': self._graph._relationship_types[arrays['adj_rel'][i]],
+            'rating': arrays['adj_rating'][i].item(),
+        }
+
+    def _find(self, node):
+        try:
+            q = self._graph._position(node)
+        except KeyError:
+            return None
+        hits = self._graph.arrays['adj_indices'][self._start:self._end] == q
+        i = int(hits.argmax()) if len(hits) else 0
+        return self._start + i if len(hits) and hits[i] else None
+
+    def __getitem__(self, node):
+        i = self._find(node)
+        if i is None:
+            raise KeyError(node)
+        return self._edge(i)
+
+    def __contains__(self, node):
+        return self._find(node) is not None
+
+    def __iter__(self):
+        ids = self._graph.arrays['node_ids']
+        return iter(ids[self._graph.arrays['adj_indices'][self._start:self._end]].tolist())
+
+    def __len__(self):
+        return self._end - self._start
+
+    def items(self):
+        ids = self._graph.arrays['node_ids']
+        neighbors = ids[self._graph.arrays['adj_indices'][self._start:self._end]].tolist()
+        return [(node, self._edge(self._start + i)) for i, node in enumerate(neighbors)]
+
+
+class SharedGraph:
+    """
+    The part of the networkx Graph API the recommender reads, backed by snapshot arrays.
+
+    Node and neighbor order match the networkx graph the snapshot was compiled
+    from, so rankings and ties are identical. The graph cannot be modified.
+    """
+
+    read_only = True
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.arrays = snapshot.arrays
+        self.graph = {}
+        self._ids = ArrayMapping(self.arrays['node_ids'], order=self.arrays['node_order'])
+        self._node_types = snapshot.manifest['node_types']
+        self._relationship_types = snapshot.manifest['relationship_types']
+        self._attribute_columns = {
+            name: (f'attr{i}', kind) for i, (name, kind) in enumerate(snapshot.manifest['attributes'])
+        }
+        self.nodes = _NodeView(self)
+
+    def _position(self, node):
+        return self._ids.position(node)
+
+    def _type_code(self, p):
+        return int(self.arrays['node_types'][p])
+
+    def _attribute(self, p, name):
+        if name == 'type':
+            code = self._type_code(p)
+            if code < 0:
+                raise KeyError(name)
+            return self._node_types[code]
+        column, kind = self._attribute_columns[name]
+        if not self.arrays[column + '.mask'][p]:
+            raise KeyError(name)
+        if kind == 'str':
+            offsets = self.arrays[column + '.offsets']
+            return self.arrays[column + '.blob'][offsets[p]:offsets[p + 1]].tobytes().decode('utf-8')
+        return self.arrays[column + '.values'][p].item()
+
+    def __iter__(self):
+        return iter(self.arrays['node_ids'].tolist())
+
+    def __len__(self):
+        return len(self.arrays['node_ids'])
+
+    def __contains__(self, node):
+        try:
+            self._position(node)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __getitem__(self, node):
+        return _AdjacencyView(self, self._position(node))
+
+    def neighbors(self, node):
+        return iter(self[node])
+
+    def has_edge(self, u, v):
+        try:
+            return v in self[u]
+        except KeyError:
+            return False
+
+    def number_of_nodes(self):
+        return len(self)
+
+    def number_of_edges(self):
+        return self.snapshot.manifest['edges']
+
+
+class SharedGraphIndex(GraphIndex):
+    """GraphIndex whose tables are searched in the snapshot arrays instead of copied into dicts"""
+
+    def __init__(self, snapshot, version=0):
+        super().__init__()
+        arrays = snapshot.arrays
+        for code, node_type in enumerate(snapshot.manifest['node_types']):
+            self.nodes_by_type[node_type] = arrays[f'type{code}.nodes']
+        hotel_code = snapshot.manifest['node_types'].index('Hotel')
+        self.hotel_position = ArrayMapping(arrays[f'type{hotel_code}.nodes'],
+                                           order=arrays[f'type{hotel_code}.order'])
+        for name in ID_INDEXES + ('hotel_location',):
+            setattr(self, name, ArrayMapping(arrays[f'index.{name}.keys'], arrays[f'index.{name}.nodes'],
+                                             arrays[f'index.{name}.order']))
+        self.user_by_email = StringArrayMapping(
+            arrays['index.user_by_email.blob'], arrays['index.user_by_email.offsets'],
+            arrays['index.user_by_email.nodes'], arrays['index.user_by_email.order'])
+        for name in GROUP_INDEXES:
+            setattr(self, name, GroupMapping(arrays[f'index.{name}.keys'], arrays[f'index.{name}.indptr'],
+                                             arrays[f'index.{name}.nodes'], arrays[f'index.{name}.order']))
+        self.version = version
+
+    def add_node(self, node, data):
+        raise TypeError("SharedGraphIndex is read-only")
+
+    def add_hotel_edge(self, G, hotel, neighbor):
+        raise TypeError("SharedGraphIndex is read-only")
+
+    def hotels_for_experiences(self, experience_nodes, location_node=None):
+        """Hotels linked to any of the experiences, optionally within a location, in graph order"""
+        groups = [self.experience_hotels.group(exp_node) for exp_node in experience_nodes]
+        candidates = np.unique(np.concatenate(groups)) if groups else np.empty(0, dtype=np.int64)
+        if location_node is not None:
+            candidates = np.intersect1d(candidates, self.location_hotels.group(location_node))
+        order = np.argsort(self.hotel_position.positions(candidates), kind='stable')
+        return candidates[order].tolist()
+
+
+def shared_collaborative_model(snapshot, version=0):
+    """CollaborativeModel over the snapshot's CSR arrays; scipy wraps them without copying"""
+    arrays = snapshot.arrays
+    node_types = snapshot.manifest['node_types']
+    shapes = snapshot.manifest['collaborative_shapes']
+    matrices = [
+        sparse.csr_matrix((arrays[f'collaborative.{name}.data'], arrays[f'collaborative.{name}.indices'],
+                           arrays[f'collaborative.{name}.indptr']), shape=tuple(shapes[name]), copy=False)
+        for name in COLLABORATIVE_MATRICES
+    ]
+    nodes = [
+        ArrayMapping(arrays[f'type{code}.nodes'], order=arrays[f'type{code}.order'])
+        for code in map(node_types.index, ('User', 'Hotel', 'Experience'))
+    ]
+    return CollaborativeModel(
+        *(mapping.keys_array for mapping in nodes), *matrices,
+        version=version, positions=tuple(nodes)
+    )
+
+
+def shared_experience_pagerank(snapshot):
+    """ExperiencePageRank over the snapshot's matrix, with array-backed row/column lookups"""
+    arrays = snapshot.arrays
+    node_types = snapshot.manifest['node_types']
+    nodes = [
+        ArrayMapping(arrays[f'type{code}.nodes'], order=arrays[f'type{code}.order'])
+        for code in map(node_types.index, ('Experience', 'Hotel'))
+    ]
+    return ExperiencePageRank(*(mapping.keys_array for mapping in nodes), arrays['ppr.matrix'],
+                              positions=tuple(nodes))
+
+
+def shared_hotel_features(snapshot, index):
+    """HotelFeatures read straight from the snapshot's adjacency and attribute arrays"""
+    arrays = snapshot.arrays
+    node_types = snapshot.manifest['node_types']
+    types = arrays['node_types']
+    hotel_nodes = np.flatnonzero(types == node_types.index('Hotel'))
+    experience_nodes = np.flatnonzero(types == node_types.index('Experience'))
+
+    # Every adjacency entry of every hotel, tagged with the hotel's position
+    indptr = arrays['adj_indptr']
+    lengths = indptr[hotel_nodes + 1] - indptr[hotel_nodes]
+    owner = np.repeat(np.arange(len(hotel_nodes)), lengths)
+    entries = np.repeat(indptr[hotel_nodes] - (np.cumsum(lengths) - lengths), lengths) + np.arange(len(owner))
+    experience_col = np.full(len(types), -1, dtype=np.int64)
+    experience_col[experience_nodes] = np.arange(len(experience_nodes))
+    cols = experience_col[arrays['adj_indices'][entries]]
+    linked = cols >= 0
+    cols, hotels, ratings = cols[linked], owner[linked], arrays['adj_rating'][entries[linked]]
+    order = np.lexsort((hotels, cols))
+    bounds = np.searchsorted(cols[order], np.arange(len(experience_nodes) + 1))
+    columns = [(hotels[order[a:b]], ratings[order[a:b]]) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    hotel_ratings = np.zeros(len(hotel_nodes))
+    for i, (name, kind) in enumerate(snapshot.manifest['attributes']):
+        if name == 'rating':
+            present = arrays[f'attr{i}.mask'][hotel_nodes]
+            hotel_ratings[present] = arrays[f'attr{i}.values'][hotel_nodes][present]
+
+    groups = index.location_hotels
+    locations = {
+        location: index.hotel_position.positions(groups.group(location))
+        for location in groups.keys.keys_array.tolist()
+    }
+    return HotelFeatures(index.nodes_by_type['Hotel'], index.nodes_by_type['Experience'].tolist(), columns,
+                         hotel_ratings, locations, index.hotel_position)
+
+
+def open_shared_graph(path, version=0):
+    """GraphState for the snapshot directory at path"""
+    snapshot = GraphSnapshot(path)
+    G = SharedGraph(snapshot)
+    G.graph['version'] = version
+    ids = G._ids
+    pagerank_store = PageRankStore(G, scores=(
+        ArrayMapping(ids.keys_array, snapshot.arrays['pagerank.scores'], ids.order),
+        ArrayMapping(ids.keys_array, snapshot.arrays['pagerank.normalized'], ids.order),
+    ))
+    index = SharedGraphIndex(snapshot, version)
+    return GraphState(G, index, pagerank_store, shared_collaborative_model(snapshot, version),
+                      shared_experience_pagerank(snapshot), shared_hotel_features(snapshot, index))
+
+
+@contextmanager
+def snapshot_lock(snapshot_root):
+    """Exclusive lock so only one worker compiles a missing snapshot"""
+    os.makedirs(snapshot_root, exist_ok=True)
+    with open(os.path.join(snapshot_root, '.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def attach_shared_graph(snapshot_root, data_path):
+    """
+    Open the CURRENT snapshot for data_path, compiling it first if it is
+    missing or stale. Returns (snapshot directory, GraphState).
+    """
+    with snapshot_lock(snapshot_root):
+        snapshot = load_snapshot(snapshot_root, data_path)
+        path = snapshot.path if snapshot is not None else compile_snapshot(data_path, snapshot_root)
+    return path, open_shared_graph(path)
+
+
+class SnapshotWatcher:
+    """Polls <snapshot_root>/CURRENT and calls on_change(path) when it points to a new snapshot"""
+
+    def __init__(self, snapshot_root, path, on_change, interval=5.0):
+        self.snapshot_root = snapshot_root
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self._thread = None
+
+    def check(self):
+        path = current_snapshot_path(self.snapshot_root)
+        if path is None or os.path.realpath(path) == os.path.realpath(self.path):
+            return False
+        self.on_change(path)
+        self.path = path
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                # A half-written or broken snapshot; keep serving the current one
+                print(f"Snapshot reload error: {str(e)}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
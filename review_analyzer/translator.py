@@ -1,8 +1,44 @@
+"""
+Translate the review corpus (comments1/*.txt -> translated_comments/translated_*.txt).
+
+Every file is split into its numbered reviews ("N. Yorum: ..."). The cleaned
+reviews are packed as "N. Comment: <review>" lines into chunks of at most
+5000 characters, so a file takes a few requests instead of one per review;
+a longer review is cut into chunks of its own. The translations are split
+back on the markers (a chunk whose markers did not survive is translated
+again review by review) and written as "N. Comment: <translation>", so
+sentiment.split_reviews finds the same reviews in the output. Chunks of all
+files are translated concurrently, under a shared rate limit, and retried
+with exponential backoff. Each translated chunk is stored in a
+content-addressed cache (<cache>/<backend>/<source>-<target>/<sha256>.txt)
+as soon as it arrives, so a rerun or a run after a crash only pays for the
+chunks it has not seen yet. An output file is only written when all of its
+chunks were translated; failed files are reported and the exit code is 1.
+
+Backends are pluggable: anything with a translate(text, source, target)
+method works. 'echo' returns the text unchanged and needs no network.
+
+Usage: python translator.py --workers 4 --rate 5 --source auto --target en
+"""
+import argparse
+import hashlib
+import importlib
+import os
+import random
 import re
-from deep_translator import GoogleTranslator
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sentiment import NUMBERED_REVIEW, split_reviews
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+MAX_CHUNK_LENGTH = 5000
+
 
 # Metni 5000 karakterlik parçalara bölen bir fonksiyon
-def split_text(text, max_length=5000):
+def split_text(text, max_length=MAX_CHUNK_LENGTH):
     chunks = []
     while len(text) > max_length:
         # En son boşluktan keserek bölme işlemi yap
@@ -14,36 +50,326 @@ def split_text(text, max_length=5000):
     chunks.append(text)
     return chunks
 
+
+def pack_reviews(reviews, max_length=MAX_CHUNK_LENGTH):
+    """
+    Group the (number, text) reviews of a file into chunks for translation.
+    Consecutive reviews are packed as "N. Comment: text" lines into chunks of at
+    most max_length characters; a review too long for one chunk gets a group of
+    its own, cut by split_text and without marker.
+    Returns [(numbers, texts, chunks, marked)].
+    """
+    groups, numbers, texts, lines, length = [], [], [], [], 0
+    for number, text in reviews:
+        line = f"{number}. Comment: {text}"
+        if numbers and length + 1 + len(line) > max_length:
+            groups.append((numbers, texts, ['\n'.join(lines)], True))
+            numbers, texts, lines, length = [], [], [], 0
+        if len(line) > max_length:
+            groups.append(([number], [text], split_text(text, max_length), False))
+            continue
+        numbers.append(number)
+        texts.append(text)
+        lines.append(line)
+        length += len(line) + (1 if len(lines) > 1 else 0)
+    if numbers:
+        groups.append((numbers, texts, ['\n'.join(lines)], True))
+    return groups
+
+
+def unpack_reviews(service, numbers, texts, futures, marked):
+    """[(number, translation)] of a group of pack_reviews, from the futures of its chunks"""
+    translated = ''.join(future.result() for future in futures)
+    if not marked:
+        return [(numbers[0], translated.strip())]
+    parts = NUMBERED_REVIEW.split(translated)
+    if parts[1::2] == [str(number) for number in numbers]:
+        return [(number, part.strip()) for number, part in zip(numbers, parts[2::2])]
+    # Çeviri işaretleri bozduysa bu paketin yorumları tek tek çevrilir
+    singles = [[service.submit(chunk) for chunk in split_text(text)] for text in texts]
+    return [
+        (number, ''.join(future.result() for future in futures).strip())
+        for number, futures in zip(numbers, singles)
+    ]
+
 # Metinden özel karakterleri temizleme fonksiyonu
 def clean_text(text):
     # Özel karakterleri ve emojileri temizler
     cleaned_text = re.sub(r'[^\w\s,.!?]', '', text)
     return cleaned_text
 
-# Dosyayı aç ve oku
-with open('aska_lara.txt', 'r', encoding='utf-8') as file:
-    turkce_metin = file.read()
 
-# Metni temizle
-cleaned_turkce_metin = clean_text(turkce_metin)
+class GoogleBackend:
+    """Google Translate through deep_translator"""
+
+    name = 'google'
+
+    def __init__(self):
+        from deep_translator import GoogleTranslator
+        self._translator_class = GoogleTranslator
+        self._local = threading.local()
+
+    def translate(self, text, source, target):
+        # GoogleTranslator keeps per-request state, so every thread gets its own
+        translators = getattr(self._local, 'translators', None)
+        if translators is None:
+            translators = self._local.translators = {}
+        if (source, target) not in translators:
+            translators[source, target] = self._translator_class(source=source, target=target)
+        translated = translators[source, target].translate(text)
+        if translated is None:
+            raise ValueError("Empty translation")
+        return translated
+
+
+class EchoBackend:
+    """Returns the text unchanged; a local stand-in for tests and dry runs"""
+
+    name = 'echo'
+
+    def translate(self, text, source, target):
+        return text
+
+
+BACKENDS = {'google': GoogleBackend, 'echo': EchoBackend}
+
+
+def load_backend(name):
+    """Backend by registered name, or any class given as 'module:Class'"""
+    if name in BACKENDS:
+        return BACKENDS[name]()
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown translation backend: {name}")
+    backend = getattr(importlib.import_module(module_name), class_name)()
+    if not getattr(backend, 'name', None):
+        backend.name = class_name.lower()
+    return backend
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads; rate is requests per second"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
 
-# Metni parçalara böl
-chunks = split_text(cleaned_turkce_metin)
+class TranslationCache:
+    """Translated chunks on disk, addressed by the SHA-256 of the source chunk"""
 
-# Parçaları sırayla çevir ve birleştir
-translated_text = ''
-translator = GoogleTranslator(source='tr', target='en')
-for chunk in chunks:
+    def __init__(self, cache_dir, backend_name, source, target):
+        self.path = os.path.join(cache_dir, backend_name, f'{source}-{target}')
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def key(chunk):
+        return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + '.txt')
+
+    def get(self, key):
+        try:
+            with open(self._file(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, translated):
+        write_atomic(self._file(key), translated)
+
+
+def write_atomic(path, text):
+    """Write through a temporary file, so a crash never leaves a half-written file behind"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
     try:
-        translated_text += translator.translate(chunk)
-    except Exception as e:
-        print(f"Hata: {e} - Parça çevrilemiyor: {chunk}")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class TranslationService:
+    """
+    Translates chunks concurrently with a rate limit, retries and a persistent cache.
+    Identical chunks are translated once, also when they are requested at the same time.
+    """
+
+    def __init__(self, backend, cache, source='auto', target='en', workers=4, rate=5.0,
+                 retries=5, backoff=1.0, max_backoff=60.0):
+        self.backend = backend
+        self.cache = cache
+        self.source = source
+        self.target = target
+        self.rate_limiter = RateLimiter(rate, burst=max(1, workers))
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.stats = {'cached': 0, 'translated': 0, 'retries': 0, 'failed': 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _translate(self, key, chunk):
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                translated = self.backend.translate(chunk, self.source, self.target)
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    self._count('failed')
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+                print(f"Hata: {e} - {delay:.1f} sn sonra tekrar denenecek ({attempt + 1}/{self.retries})")
+                self._count('retries')
+                time.sleep(delay)
+        self.cache.put(key, translated)
+        self._count('translated')
+        return translated
+
+    def submit(self, chunk):
+        """Future with the translation of chunk"""
+        key = self.cache.key(chunk)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            future = self.executor.submit(self._lookup, key, chunk)
+            self._pending[key] = future
+        # Sonuç artık önbellekte; biten future bellekte tutulmaz, başarısız parça tekrar istenebilir
+        future.add_done_callback(lambda _, key=key: self._forget(key))
+        return future
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
 
-# Çevirilen metni yazdır
-print("Çevrilen metin:\n", translated_text)
+    def _lookup(self, key, chunk):
+        # Boş parçalar çevrilmez
+        if not chunk.strip():
+            return chunk
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count('cached')
+            return cached
+        return self._translate(key, chunk)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def output_path(output_dir, input_file):
+    return os.path.join(output_dir, 'translated_' + os.path.basename(input_file))
+
+
+def is_up_to_date(input_file, output_file):
+    return (os.path.exists(output_file) and
+            os.path.getmtime(output_file) >= os.path.getmtime(input_file))
+
+
+def translate_corpus(service, input_dir, output_dir, force=False):
+    """
+    Translate every .txt file of input_dir into output_dir.
+    Returns ({file: error} for the files that failed, number of files written).
+    """
+    files = sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir) if name.endswith('.txt')
+    )
+    jobs = []
+    for input_file in files:
+        if not force and is_up_to_date(input_file, output_path(output_dir, input_file)):
+            continue
+        with open(input_file, 'r', encoding='utf-8') as f:
+            reviews = split_reviews(f.read())
+        # Yalnızca emojiden oluşan yorumlar temizlenince boş kalır; sayıları değişmesin diye olduğu gibi gönderilir
+        groups = pack_reviews([
+            (review_id.split('-')[0], clean_text(text).strip() or text) for review_id, _, text in reviews
+        ])
+        # Bütün dosyaların parçaları aynı anda kuyruğa alınır
+        jobs.append((input_file, len(reviews), [
+            (numbers, texts, [service.submit(chunk) for chunk in chunks], marked)
+            for numbers, texts, chunks, marked in groups
+        ]))
+
+    failed = {}
+    for input_file, count, groups in jobs:
+        try:
+            # "N. Comment:" işaretleri temizlenmiş metnin dışında tutulur, sentiment.py yorumları bunlarla ayırır
+            translated_text = ' '.join(
+                f"{number}. Comment: {translated}"
+                for group in groups
+                for number, translated in unpack_reviews(service, *group)
+            )
+            # Yorum kaybolduysa dosya yazılmaz; yazılırsa sonraki aşamalar yorum kaybeder
+            found = len(split_reviews(translated_text))
+            if found != count:
+                raise ValueError(f"Çeviride {found} yorum bulundu, {count} bekleniyordu")
+        except Exception as e:
+            failed[input_file] = str(e)
+            print(f"Hata: {e} - Dosya çevrilemedi: {input_file}")
+            continue
+        write_atomic(output_path(output_dir, input_file), translated_text)
+        print(f"Çevrildi: {os.path.basename(input_file)} ({count} yorum)")
+    return failed, len(jobs) - len(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translate the review corpus with a persistent chunk cache")
+    parser.add_argument('--input', default=os.path.join(BASE_PATH, '..', 'comments1'))
+    parser.add_argument('--output', default=os.path.join(BASE_PATH, '..', 'translated_comments'))
+    parser.add_argument('--cache-dir', default=os.path.join(BASE_PATH, '..', '.translation_cache'))
+    # Yorumlar farklı dillerde, kaynak dil varsayılan olarak otomatik algılanır
+    parser.add_argument('--source', default='auto')
+    parser.add_argument('--target', default='en')
+    parser.add_argument('--backend', default='google', help="google, echo or module:Class")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=5.0, help="Requests per second, 0 for no limit")
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--backoff', type=float, default=1.0, help="First retry delay in seconds")
+    parser.add_argument('--force', action='store_true', help="Also redo files whose output is up to date")
+    args = parser.parse_args()
+
+    backend = load_backend(args.backend)
+    service = TranslationService(
+        backend, TranslationCache(args.cache_dir, backend.name, args.source, args.target),
+        source=args.source, target=args.target, workers=args.workers, rate=args.rate,
+        retries=args.retries, backoff=args.backoff
+    )
+    started = time.perf_counter()
+    try:
+        failed, written = translate_corpus(service, args.input, args.output, force=args.force)
+    finally:
+        service.shutdown()
+    print(f"{written} dosya yazıldı, {len(failed)} hatalı; {service.stats} "
+          f"({time.perf_counter() - started:.1f} sn)")
+    return 1 if failed else 0
 
-# Çevirilen metni bir dosyaya yaz
-with open('cevrilen_metin.txt', 'w', encoding='utf-8') as output_file:
-    output_file.write(translated_text)
 
-print("Çevirilen metin 'cevrilen_metin.txt' dosyasına kaydedildi.")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,165 @@
-from spellchecker import SpellChecker
+"""
+Spell correction over a whole corpus, one decision per distinct word.
 
-# İngilizce için SpellChecker'ı başlatıyoruz
-spell = SpellChecker()
+The same misspellings repeat thousands of times across the reviews, so
+instead of calling SpellChecker.correction on every token:
 
-# Dosya yollarını belirtin
-input_file = 'palde_hotel.txt'  # Girdi dosyası
-output_file = 'corrected_example.txt'  # Çıktı dosyası
+1. the unique vocabulary of all input files is collected in one streaming pass,
+2. words the dictionary knows are kept as they are, checked in bulk,
+3. only the remaining unknown words are corrected, spread over worker processes,
+4. word -> correction is stored in a persistent cache shared between runs,
+5. every file is rewritten line by line from the map.
 
-# Yanlış yazılan kelimeleri düzelten fonksiyon
-def correct_file(input_path, output_path):
-    with open(input_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+As before, a word SpellChecker has no correction for is dropped.
 
-    corrected_content = []
-    for word in content.split():
-        # Her kelimeyi kontrol edip düzeltiyoruz
-        corrected_word = spell.correction(word)
-        corrected_content.append(corrected_word)
+Usage: python word_correction.py --input ../translated_comments --output ../corrected_comments
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
-    # Düzeltilmiş içeriği yeni dosyaya kaydediyoruz
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(' '.join(filter(None, corrected_content)))  # None değerlerini filtrele
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
 
-    print(f"Corrected file saved as: {output_path}")
 
-# Programı çalıştırıyoruz
-correct_file(input_file, output_file)
+def input_files(path):
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.txt')]
+    return [path]
+
+
+def build_vocabulary(files):
+    """Counter of every whitespace token in the files, read line by line"""
+    vocabulary = Counter()
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                vocabulary.update(line.split())
+    return vocabulary
+
+
+class CorrectionCache:
+    """Persistent {word: correction or None} per language and edit distance"""
+
+    def __init__(self, cache_dir, language, distance):
+        self.path = os.path.join(cache_dir, f'{language}-d{distance}.json')
+        self.corrections = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.corrections = json.load(f)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.corrections, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def known_words(spell, words):
+    """The words the dictionary knows; correction() returns those unchanged"""
+    known = spell.known(words)
+    return {word for word in words if word in known or word.lower() in known}
+
+
+def correct_line(line, corrections):
+    # None değerleri (düzeltilemeyen kelimeler) atlanır
+    return ' '.join(filter(None, map(corrections.get, line.split())))
+
+
+# SpellChecker her işlemde bir kez başlatılır
+_spell = None
+
+def _init_worker(language, distance):
+    global _spell
+    from spellchecker import SpellChecker
+    _spell = SpellChecker(language=language, distance=distance)
+
+def _correct_batch(words):
+    return [_spell.correction(word) for word in words]
+
+
+def correct_vocabulary(vocabulary, cache, language='en', distance=2, workers=None, batch_size=500):
+    """
+    Fill cache.corrections for every word of the vocabulary.
+    Returns (known words, words taken from the cache, words corrected now).
+    """
+    from spellchecker import SpellChecker
+    corrections = cache.corrections
+    new_words = [word for word in vocabulary if word not in corrections]
+
+    # Bilinen kelimeler toplu olarak kontrol edilir ve olduğu gibi kalır
+    known = known_words(SpellChecker(language=language, distance=distance), new_words)
+    unknown = []
+    for word in new_words:
+        if word in known:
+            corrections[word] = word
+        else:
+            unknown.append(word)
+
+    # Sık geçen kelimeler önce düzeltilir; kesilen bir çalışma en faydalı kısmı kaydetmiş olur
+    unknown.sort(key=vocabulary.__getitem__, reverse=True)
+    batches = [unknown[i:i + batch_size] for i in range(0, len(unknown), batch_size)]
+    if batches:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(language, distance)) as pool:
+            for i, (batch, corrected) in enumerate(zip(batches, pool.map(_correct_batch, batches))):
+                corrections.update(zip(batch, corrected))
+                if i % 20 == 19:
+                    cache.save()
+    cache.save()
+    return len(new_words) - len(unknown), len(vocabulary) - len(new_words), len(unknown)
+
+
+def rewrite_file(input_path, output_path, corrections):
+    """Stream input_path through the correction map into output_path"""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path), suffix='.tmp')
+    try:
+        with open(input_path, 'r', encoding='utf-8') as source, os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for line in source:
+                f.write(correct_line(line, corrections) + '\n')
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spell-correct a corpus with a shared word -> correction cache")
+    parser.add_argument('--input', default=os.path.join(BASE_PATH, '..', 'translated_comments'),
+                        help="A .txt file or a directory of them")
+    parser.add_argument('--output', default=os.path.join(BASE_PATH, '..', 'corrected_comments'),
+                        help="Output directory")
+    parser.add_argument('--cache-dir', default=os.path.join(BASE_PATH, '..', '.spell_cache'))
+    parser.add_argument('--language', default='en')
+    parser.add_argument('--distance', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=None, help="Pool size, defaults to the CPU count")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    files = input_files(args.input)
+    vocabulary = build_vocabulary(files)
+    cache = CorrectionCache(args.cache_dir, args.language, args.distance)
+    known, cached, corrected = correct_vocabulary(
+        vocabulary, cache, args.language, args.distance, args.workers
+    )
+    print(f"{sum(vocabulary.values())} kelime, {len(vocabulary)} farklı: "
+          f"{known} bilinen, {cached} önbellekten, {corrected} düzeltildi")
+
+    for path in files:
+        rewrite_file(path, os.path.join(args.output, os.path.basename(path)), cache.corrections)
+        print(f"Corrected file saved as: {os.path.join(args.output, os.path.basename(path))}")
+    print(f"{len(files)} dosya ({time.perf_counter() - started:.1f} sn)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
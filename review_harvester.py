@@ -0,0 +1,212 @@
+"""
+Harvest Google reviews for every place in hotel_place_ids.xlsx.
+
+Many places are fetched at the same time: while one place waits the two
+seconds a next_page_token needs before it becomes valid, the others keep
+using the connection pool. All requests share one requests-per-second limit
+and the retry rules of getPlaceIDs.py.
+
+Reviews are deduplicated by (author, time) and appended to
+<output>/<place_id>.jsonl as each page arrives. <output>/state.json keeps a
+high-water mark per place, the newest review time seen; later runs ask for
+the newest reviews first and stop paging at the first review that is not
+newer than the mark.
+
+Usage: python review_harvester.py --concurrency 16 --rate 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+import httpx
+import pandas as pd
+from getPlaceIDs import (API_KEY, BASE_URL, RETRY_STATUSES, AsyncRateLimiter, places_get,
+                         with_retries)
+
+# Sayfa jetonu hemen geçerli olmaz; bu sürede INVALID_REQUEST döner
+PAGE_TOKEN_DELAY = 2.0
+
+
+def review_key(review):
+    return review.get('author_name', ''), review.get('time', 0)
+
+
+def read_place_ids(path):
+    """[(place_id, hotel name)] from the place id table, without N/A and repeated ids"""
+    table = pd.read_excel(path)
+    places = {}
+    for name, place_id in zip(table['Hotel Name'], table['Place ID']):
+        if isinstance(place_id, str) and place_id and place_id != 'N/A':
+            places.setdefault(place_id, name)
+    return list(places.items())
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def stored_keys(path):
+    """(author, time) of every review already written for a place"""
+    keys = set()
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    review = json.loads(line)
+                except ValueError:
+                    continue
+                keys.add((review['author'], review['time']))
+    return keys
+
+
+class ReviewHarvester:
+    """Place Details paging for many places over one client, rate limiter and retry policy"""
+
+    def __init__(self, client, api_key, output_dir, base_url=BASE_URL, rate=10.0, language='tr',
+                 retries=5, backoff=1.0, page_token_delay=PAGE_TOKEN_DELAY):
+        self.client = client
+        self.api_key = api_key
+        self.output_dir = output_dir
+        self.url = base_url.rstrip('/') + '/details/json'
+        self.rate_limiter = AsyncRateLimiter(rate, burst=max(1, int(rate)))
+        self.language = language
+        self.retries = retries
+        self.backoff = backoff
+        self.page_token_delay = page_token_delay
+        self.stats = {'places': 0, 'pages': 0, 'reviews': 0, 'duplicates': 0, 'retries': 0, 'failed': 0}
+
+    async def _page(self, place_id, params, retry_statuses=RETRY_STATUSES):
+        params = dict(params, key=self.api_key, language=self.language)
+        return await with_retries(
+            lambda: places_get(self.client, self.rate_limiter, self.url, params, retry_statuses),
+            place_id, self.stats, self.retries, self.backoff
+        )
+
+    async def harvest(self, place_id, hotel, mark):
+        """
+        Fetch the reviews of one place newer than mark, appending them to its file.
+        Returns the new high-water mark.
+        """
+        path = os.path.join(self.output_dir, place_id + '.jsonl')
+        seen = stored_keys(path)
+        newest = mark
+        data = await self._page(place_id, {'place_id': place_id, 'reviews_sort': 'newest'})
+        with open(path, 'a', encoding='utf-8') as f:
+            while True:
+                self.stats['pages'] += 1
+                reached_mark = False
+                for review in (data.get('result') or {}).get('reviews', []):
+                    key = review_key(review)
+                    if mark is not None and key[1] <= mark:
+                        reached_mark = True
+                        # Aynı saniyedeki farklı yazarların yorumları kaçırılmaz
+                        if key[1] < mark:
+                            continue
+                    if key in seen:
+                        self.stats['duplicates'] += 1
+                        continue
+                    seen.add(key)
+                    newest = key[1] if newest is None else max(newest, key[1])
+                    f.write(json.dumps({
+                        'place_id': place_id,
+                        'hotel': hotel,
+                        'author': key[0],
+                        'time': key[1],
+                        'date': datetime.fromtimestamp(key[1]).strftime('%Y-%m-%d'),
+                        'rating': review.get('rating'),
+                        'language': review.get('language'),
+                        'text': review.get('text', ''),
+                    }, ensure_ascii=False) + '\n')
+                    self.stats['reviews'] += 1
+                f.flush()
+
+                token = data.get('next_page_token')
+                if not token or reached_mark:
+                    break
+                # Bekleme sırasında diğer otellerin istekleri devam eder
+                await asyncio.sleep(self.page_token_delay)
+                data = await self._page(place_id, {'pagetoken': token},
+                                        retry_statuses=RETRY_STATUSES | {'INVALID_REQUEST'})
+        self.stats['places'] += 1
+        return newest
+
+
+async def harvest_all(places, output_dir, api_key, base_url=BASE_URL, concurrency=16, rate=10.0,
+                      language='tr', retries=5, backoff=1.0, page_token_delay=PAGE_TOKEN_DELAY, timeout=30.0):
+    """Harvest every (place_id, hotel); returns ({place_id: error}, harvester stats)"""
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, 'state.json')
+    state = load_state(state_path)
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        harvester = ReviewHarvester(client, api_key, output_dir, base_url, rate, language, retries, backoff,
+                                    page_token_delay)
+
+        async def harvest(place_id, hotel):
+            async with semaphore:
+                try:
+                    return place_id, await harvester.harvest(place_id, hotel, state.get(place_id)), None
+                except Exception as e:
+                    return place_id, None, e
+
+        for next_result in asyncio.as_completed([harvest(place_id, hotel) for place_id, hotel in places]):
+            place_id, mark, error = await next_result
+            if error is not None:
+                failed[place_id] = str(error)
+                print(f"Hata: {place_id} yorumları alınamadı: {error}")
+                continue
+            # İşaret yalnızca otelin bütün sayfaları yazıldıktan sonra ilerler
+            if mark is not None:
+                state[place_id] = mark
+                save_state(state_path, state)
+    return failed, harvester.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch new Google reviews for every known place id")
+    parser.add_argument('--input', default='hotel_place_ids.xlsx')
+    parser.add_argument('--output', default='harvested_reviews', help="Directory of per-place .jsonl files")
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--api-key', default=API_KEY, help="Defaults to GOOGLE_PLACES_API_KEY")
+    parser.add_argument('--language', default='tr')
+    parser.add_argument('--concurrency', type=int, default=16, help="Places fetched at the same time")
+    parser.add_argument('--rate', type=float, default=10.0, help="Requests per second, 0 for no limit")
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--backoff', type=float, default=1.0, help="First retry delay in seconds")
+    parser.add_argument('--page-token-delay', type=float, default=PAGE_TOKEN_DELAY)
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("no API key; set GOOGLE_PLACES_API_KEY or pass --api-key")
+
+    places = read_place_ids(args.input)
+    started = time.perf_counter()
+    failed, stats = asyncio.run(harvest_all(
+        places, args.output, args.api_key, args.base_url, args.concurrency, args.rate, args.language,
+        args.retries, args.backoff, args.page_token_delay
+    ))
+    print(f"{len(places)} otel: {stats}, {len(failed)} hatalı ({time.perf_counter() - started:.1f} sn)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())